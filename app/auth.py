@@ -1,13 +1,20 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 import re
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect as sa_inspect
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import models, schemas
+from app.subscriptions import effective_plan
 import os
 from dotenv import load_dotenv
 
@@ -39,6 +46,16 @@ COMMON_WEAK_PASSWORDS = {
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 AUTH_COOKIE_NAME = os.getenv("AUTH_COOKIE_NAME", "rilono_access_token").strip() or "rilono_access_token"
+# Resolved-user cache for DB-free authentication. Changes made through any ORM session
+# invalidate the local entry on commit; other instances pick them up within the TTL.
+AUTH_USER_CACHE_TTL_SECONDS = max(0, int(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30") or "0"))
+AUTH_USER_CACHE_MAX_ENTRIES = max(1, int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000") or "10000"))
+
+# bcrypt/PBKDF2 run on a dedicated pool so they never block the event loop or pile up
+# unbounded. Both release the GIL, so workers hash in parallel.
+PASSWORD_HASH_WORKERS = max(1, int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))) or "1"))
+PASSWORD_HASH_MAX_QUEUE = max(0, int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64") or "0"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = 2
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
@@ -66,6 +83,127 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class PasswordHashingPool:
+    """
+    Bounded CPU pool for password hashing and key derivation.
+
+    At most max_workers jobs run and max_queue wait; beyond that callers get a 503
+    with Retry-After instead of queueing behind a burst of logins.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self._max_workers = max_workers
+        self._max_pending = max_workers + max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="password-hash",
+            )
+        return self._executor
+
+    def _timed(self, fn, args, kwargs):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+                self._failed += int(failed)
+                self._busy_seconds += elapsed
+                self._max_seconds = max(self._max_seconds, elapsed)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._pending >= self._max_pending:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy. Please try again in a moment.",
+                    headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+                )
+            self._pending += 1
+            self._submitted += 1
+            try:
+                return self._get_executor().submit(self._timed, fn, args, kwargs)
+            except BaseException:
+                self._pending -= 1
+                raise
+
+    def run(self, fn, *args, **kwargs):
+        """Run on the pool from synchronous code (e.g. a sync route's worker thread)."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def arun(self, fn, *args, **kwargs):
+        """Run on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self._max_workers,
+                "max_pending": self._max_pending,
+                "in_flight": self._pending,
+                "submitted": self._submitted,
+                "completed": completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_ms": round(self._busy_seconds * 1000 / completed, 2) if completed else 0.0,
+                "max_ms": round(self._max_seconds * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hashing_pool = PasswordHashingPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+
+def verify_password_offloaded(plain_password: str, hashed_password: str) -> bool:
+    return password_hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hashing_pool.arun(verify_password, plain_password, hashed_password)
+
+
+def get_password_hash_offloaded(password: str) -> str:
+    return password_hashing_pool.run(get_password_hash, password)
+
+
+async def aget_password_hash(password: str) -> str:
+    return await password_hashing_pool.arun(get_password_hash, password)
+
+
+def get_password_hashing_stats() -> dict:
+    return password_hashing_pool.stats()
+
+
+def stop_password_hashing_pool() -> None:
+    password_hashing_pool.shutdown()
+
+
 def validate_password_strength(password: str, user_email: Optional[str] = None) -> Optional[str]:
     """Return an error message when password is weak; otherwise return None."""
     if not password:
@@ -120,50 +258,184 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
-def _decode_token_subject(token: str) -> Optional[str]:
+async def aauthenticate_user(db: Session, email: str, password: str):
+    """authenticate_user() with the bcrypt check on the password hashing pool."""
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if not user:
+        return False
+    if not await averify_password(password, user.hashed_password):
+        return False
+    return user
+
+def _decode_token_subject(token: str) -> tuple[Optional[str], Optional[int]]:
+    """Return (subject email, user id). Tokens issued before the uid claim carry no user id."""
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     email: str = payload.get("sub")
     if email is None:
-        return None
-    return email
+        return None, None
+    user_id = payload.get("uid")
+    return email, user_id if isinstance(user_id, int) else None
 
 
-def get_current_user(
-    request: Request,
-    token: Optional[str] = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-):
-    credentials_exception = HTTPException(
+class AuthenticatedUser:
+    """Read-only snapshot of the fields most endpoints need from the current user."""
+
+    __slots__ = (
+        "id",
+        "email",
+        "full_name",
+        "is_active",
+        "is_admin",
+        "is_developer",
+        "email_verified",
+        "plan",
+        "referral_reward_granted_at",
+    )
+
+    def __init__(self, user: models.User, plan: Optional[str]) -> None:
+        self.id = user.id
+        self.email = user.email
+        self.full_name = user.full_name
+        self.is_active = bool(user.is_active)
+        self.is_admin = bool(user.is_admin)
+        self.is_developer = bool(user.is_developer)
+        self.email_verified = bool(user.email_verified)
+        self.plan = plan
+        self.referral_reward_granted_at = user.referral_reward_granted_at
+
+
+class _AuthenticatedUserCache:
+    def __init__(self, ttl_seconds: int, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # (subject, uid) -> (snapshot, user version, expires_at)
+        self._entries: "OrderedDict[tuple[str, Optional[int]], tuple[AuthenticatedUser, int, float]]" = OrderedDict()
+        self._versions: dict[int, int] = {}
+
+    def get(self, subject: str, user_id: Optional[int]) -> Optional[AuthenticatedUser]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = (subject, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            snapshot, version, expires_at = entry
+            if expires_at <= time.monotonic() or version != self._versions.get(snapshot.id, 0):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def version(self, user_id: int) -> int:
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def put(self, subject: str, user_id: Optional[int], snapshot: AuthenticatedUser, version: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if version != self._versions.get(snapshot.id, 0):
+                # Invalidated while the snapshot was being loaded.
+                return
+            self._entries[(subject, user_id)] = (snapshot, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end((subject, user_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+_authenticated_user_cache = _AuthenticatedUserCache(AUTH_USER_CACHE_TTL_SECONDS, AUTH_USER_CACHE_MAX_ENTRIES)
+
+
+def invalidate_authenticated_user(user_id: Optional[int]) -> None:
+    if user_id is not None:
+        _authenticated_user_cache.invalidate(user_id)
+
+
+_SUBSCRIPTION_AUTH_FIELDS = ("plan", "status", "ends_at")
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_auth_invalidations(session, flush_context, instances) -> None:
+    user_ids = session.info.setdefault("auth_invalidate_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User):
+            user_ids.add(obj.id)
+        elif isinstance(obj, models.Subscription):
+            state = sa_inspect(obj)
+            if obj in session.deleted or any(state.attrs[field].history.has_changes() for field in _SUBSCRIPTION_AUTH_FIELDS):
+                user_ids.add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_auth_invalidations(session) -> None:
+    for user_id in session.info.pop("auth_invalidate_user_ids", ()):
+        invalidate_authenticated_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_auth_invalidations(session) -> None:
+    session.info.pop("auth_invalidate_user_ids", None)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _resolve_token_claims(request: Request, token: Optional[str]) -> tuple[str, Optional[int]]:
     cookie_token = (request.cookies.get(AUTH_COOKIE_NAME) or "").strip()
     header_token = (token or "").strip()
 
     # For browser sessions, prefer secure HttpOnly cookie over Authorization header.
     candidate_token = cookie_token or header_token
     if not candidate_token:
-        raise credentials_exception
+        raise _credentials_exception()
 
-    decoded_email: Optional[str] = None
     try:
-        decoded_email = _decode_token_subject(candidate_token)
+        decoded_email, user_id = _decode_token_subject(candidate_token)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
 
     email = (decoded_email or "").strip()
     if not email:
-        raise credentials_exception
+        raise _credentials_exception()
+    return email, user_id
+
+
+def _load_user_for_claims(db: Session, email: str, user_id: Optional[int]) -> Optional[models.User]:
+    if user_id is not None:
+        # Primary-key lookup; the subject must still match so an email change ends old sessions.
+        user = db.get(models.User, user_id)
+        if user is None or user.email != email:
+            return None
+        return user
 
     # Look up user by email (backward compatible: also check username for old tokens)
     user = db.query(models.User).filter(models.User.email == email).first()
     if user is None:
         # Fallback for old tokens that might have username
         user = db.query(models.User).filter(models.User.username == email).first()
+    return user
+
+
+def get_current_user(
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+):
+    email, user_id = _resolve_token_claims(request, token)
+    user = _load_user_for_claims(db, email, user_id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 def get_current_active_user(current_user: models.User = Depends(get_current_user)):
@@ -171,6 +443,42 @@ def get_current_active_user(current_user: models.User = Depends(get_current_user
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+
+def get_authenticated_user(
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> AuthenticatedUser:
+    """
+    Like get_current_user, but returns a cached AuthenticatedUser snapshot.
+    Repeat requests within AUTH_USER_CACHE_TTL_SECONDS do not touch the database.
+    Use get_current_user when the endpoint needs to modify the user row.
+    """
+    email, user_id = _resolve_token_claims(request, token)
+    cached = _authenticated_user_cache.get(email, user_id)
+    if cached is not None:
+        return cached
+
+    user = _load_user_for_claims(db, email, user_id)
+    if user is None:
+        raise _credentials_exception()
+    version = _authenticated_user_cache.version(user.id)
+    subscription_row = (
+        db.query(models.Subscription.plan, models.Subscription.ends_at)
+        .filter(models.Subscription.user_id == user.id)
+        .first()
+    )
+    plan = effective_plan(subscription_row.plan, subscription_row.ends_at) if subscription_row else None
+    snapshot = AuthenticatedUser(user, plan)
+    _authenticated_user_cache.put(email, user_id, snapshot, version)
+    return snapshot
+
+
+def get_active_authenticated_user(current_user: AuthenticatedUser = Depends(get_authenticated_user)) -> AuthenticatedUser:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
 def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)):
     """Require admin or developer access"""
     if not (current_user.is_admin or current_user.is_developer):
@@ -1,11 +1,23 @@
 from __future__ import annotations
 
-from typing import Any
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app import models
 
+# How often a worker re-checks the catalog version row before trusting its in-memory snapshot.
+DOCUMENT_CATALOG_VERSION_CHECK_SECONDS = max(
+    0.0, float(os.getenv("DOCUMENT_CATALOG_VERSION_CHECK_SECONDS", "30") or "30")
+)
+CATALOG_VERSION_ROW_ID = 1
+
 DEFAULT_JOURNEY_STAGES: list[dict[str, Any]] = [
     {
         "stage": 1,
@@ -381,6 +393,46 @@ REMOVED_DOCUMENT_TYPES = {
     "offer-letters",
 }
 
+_SCAN_FILE_KINDS = ["pdf", "image"]
+
+# Local pre-validation rules per document type (see app/services/document_prevalidation.py).
+# A catalog row's prevalidation_rules JSON overrides these key by key ("{}" keeps the
+# defaults, {"file_kinds": null} lifts a restriction); types without
+# rules accept any allowed file. Page limits are generous: they only catch uploads
+# that are clearly a different document.
+DEFAULT_PREVALIDATION_RULES: dict[str, dict[str, Any]] = {
+    "passport": {"file_kinds": _SCAN_FILE_KINDS},
+    "high-school-transcripts": {"file_kinds": _SCAN_FILE_KINDS},
+    "bachelors-transcript": {"file_kinds": _SCAN_FILE_KINDS},
+    "masters-transcript": {"file_kinds": _SCAN_FILE_KINDS},
+    "other-school-college-degree-certificates": {"file_kinds": _SCAN_FILE_KINDS},
+    "provisional-certificates": {"file_kinds": _SCAN_FILE_KINDS},
+    "standardized-test-scores": {"file_kinds": _SCAN_FILE_KINDS},
+    "standardized-test-scores-gre-gmat": {"file_kinds": _SCAN_FILE_KINDS},
+    "university-admission-letter": {"file_kinds": _SCAN_FILE_KINDS},
+    "university-offer-letter": {"file_kinds": _SCAN_FILE_KINDS},
+    "form-i20-signed": {"file_kinds": _SCAN_FILE_KINDS, "max_pages": 10},
+    "previous-i20s": {"file_kinds": _SCAN_FILE_KINDS},
+    "ds-160-confirmation": {"file_kinds": _SCAN_FILE_KINDS, "max_pages": 3},
+    "ds-160-application": {"file_kinds": _SCAN_FILE_KINDS},
+    "photograph-2x2": {"file_kinds": ["image"], "min_image_edge": 600},
+    "i901-sevis-fee-confirmation": {"file_kinds": _SCAN_FILE_KINDS, "max_pages": 3},
+    "visa-fee-receipt": {"file_kinds": _SCAN_FILE_KINDS, "max_pages": 5},
+    "biometric-appointment-confirmation": {"file_kinds": _SCAN_FILE_KINDS},
+    "consular-interview-confirmation": {"file_kinds": _SCAN_FILE_KINDS},
+    "us-visa-appointment-letter": {"file_kinds": _SCAN_FILE_KINDS},
+    "stamped-f1-visa": {"file_kinds": _SCAN_FILE_KINDS},
+    "immunization-vaccination-records": {"file_kinds": _SCAN_FILE_KINDS},
+    "bank-statement": {"file_kinds": _SCAN_FILE_KINDS},
+    "bank-balance-certificate": {"file_kinds": _SCAN_FILE_KINDS},
+    "loan-approval-letter": {"file_kinds": _SCAN_FILE_KINDS},
+    "loan-sanction-letter": {"file_kinds": _SCAN_FILE_KINDS},
+    "affidavit-of-support": {"file_kinds": _SCAN_FILE_KINDS},
+    "ca-statement": {"file_kinds": _SCAN_FILE_KINDS},
+    "sponsor-income-proof": {"file_kinds": _SCAN_FILE_KINDS},
+    "salary-slips": {"file_kinds": _SCAN_FILE_KINDS},
+}
+
 
 def ensure_default_document_type_catalog(db: Session) -> None:
     existing_rows = db.query(models.DocumentTypeCatalog).all()
@@ -648,7 +700,9 @@ def ensure_default_document_type_catalog(db: Session) -> None:
             has_changes = True
 
     if has_changes:
+        _bump_catalog_version_row(db)
         db.commit()
+        _drop_local_catalog_snapshot()
 
 
 def get_document_type_catalog(
@@ -661,25 +715,62 @@ def get_document_type_catalog(
     return query.order_by(models.DocumentTypeCatalog.sort_order.asc(), models.DocumentTypeCatalog.id.asc()).all()
 
 
+def _effective_prevalidation_rules(row: models.DocumentTypeCatalog) -> Optional[dict[str, Any]]:
+    """Built-in rules for the type, overridden key by key by the row's prevalidation_rules JSON."""
+    overrides: dict[str, Any] = {}
+    if row.prevalidation_rules:
+        try:
+            parsed = json.loads(row.prevalidation_rules)
+            if isinstance(parsed, dict):
+                overrides = parsed
+        except json.JSONDecodeError as exc:
+            print(f"Warning: Ignoring invalid prevalidation_rules for {row.document_type}: {str(exc)}")
+    return {**DEFAULT_PREVALIDATION_RULES.get(row.document_type, {}), **overrides} or None
+
+
+def _catalog_row_payload(row: models.DocumentTypeCatalog) -> dict[str, Any]:
+    return {
+        "value": row.document_type,
+        "label": row.label,
+        "description": row.description,
+        "sort_order": row.sort_order,
+        "is_active": row.is_active,
+        "is_required": row.is_required,
+        "journey_stage": row.journey_stage,
+        "stage_gate_required": row.stage_gate_required,
+        "stage_gate_requires_validation": row.stage_gate_requires_validation,
+        "stage_gate_group": row.stage_gate_group,
+        "prevalidation_rules": _effective_prevalidation_rules(row),
+    }
+
+
 def get_document_type_payload(
     db: Session,
     active_only: bool = True,
 ) -> list[dict[str, Any]]:
-    rows = get_document_type_catalog(db, active_only=active_only)
+    if active_only:
+        return [dict(row) for row in get_document_catalog_snapshot(db).document_types]
+    rows = get_document_type_catalog(db, active_only=False)
+    return [_catalog_row_payload(row) for row in rows]
+
+
+def default_document_type_payload() -> list[dict[str, Any]]:
+    """Catalog payload built from DEFAULT_DOCUMENT_TYPES, for when the DB catalog is unavailable."""
     return [
         {
-            "value": row.document_type,
-            "label": row.label,
-            "description": row.description,
-            "sort_order": row.sort_order,
-            "is_active": row.is_active,
-            "is_required": row.is_required,
-            "journey_stage": row.journey_stage,
-            "stage_gate_required": row.stage_gate_required,
-            "stage_gate_requires_validation": row.stage_gate_requires_validation,
-            "stage_gate_group": row.stage_gate_group,
+            "value": row["document_type"],
+            "label": row["label"],
+            "description": row.get("description"),
+            "sort_order": row["sort_order"],
+            "is_active": True,
+            "is_required": row.get("is_required", False),
+            "journey_stage": row.get("journey_stage"),
+            "stage_gate_required": row.get("stage_gate_required", False),
+            "stage_gate_requires_validation": row.get("stage_gate_requires_validation", False),
+            "stage_gate_group": row.get("stage_gate_group"),
+            "prevalidation_rules": DEFAULT_PREVALIDATION_RULES.get(row["document_type"]),
         }
-        for row in rows
+        for row in DEFAULT_DOCUMENT_TYPES
     ]
 
 
@@ -704,12 +795,107 @@ def build_journey_stages(document_types: list[dict[str, Any]]) -> list[dict[str,
     return [stage_map[key] for key in sorted(stage_map.keys())]
 
 
+class DocumentCatalogSnapshot:
+    """
+    Immutable view of the active catalog for one catalog version.
+    Built once per version and shared by every request in the process; callers
+    must treat the contained dicts as read-only.
+    """
+
+    def __init__(self, version: int, document_types: list[dict[str, Any]]) -> None:
+        self.version = version
+        self.document_types: tuple[dict[str, Any], ...] = tuple(document_types)
+        self.allowed_document_types = frozenset(row["value"] for row in self.document_types)
+        self.required_document_types: tuple[str, ...] = tuple(
+            row["value"] for row in self.document_types if row.get("is_required")
+        )
+        self.mandatory_document_types = frozenset(self.required_document_types)
+        self.labels: dict[str, str] = {row["value"]: row["label"] for row in self.document_types}
+        self.prevalidation_rules: dict[str, dict[str, Any]] = {
+            row["value"]: row.get("prevalidation_rules") or {} for row in self.document_types
+        }
+        self.journey_stages: tuple[dict[str, Any], ...] = tuple(build_journey_stages(list(self.document_types)))
+        self.response: dict[str, Any] = {
+            "document_types": list(self.document_types),
+            "required_document_types": list(self.required_document_types),
+            "journey_stages": list(self.journey_stages),
+        }
+        self.response_body = json.dumps(self.response, separators=(",", ":"), default=str).encode("utf-8")
+        self.etag = f'"catalog-{version}-{hashlib.sha256(self.response_body).hexdigest()[:16]}"'
+
+
+_catalog_lock = threading.Lock()
+_catalog_snapshot: Optional[DocumentCatalogSnapshot] = None
+_catalog_checked_at = 0.0
+
+
+def _read_catalog_version(db: Session) -> int:
+    version = (
+        db.query(models.DocumentCatalogVersion.version)
+        .filter(models.DocumentCatalogVersion.id == CATALOG_VERSION_ROW_ID)
+        .scalar()
+    )
+    return int(version or 0)
+
+
+def _bump_catalog_version_row(db: Session) -> None:
+    updated = (
+        db.query(models.DocumentCatalogVersion)
+        .filter(models.DocumentCatalogVersion.id == CATALOG_VERSION_ROW_ID)
+        .update(
+            {models.DocumentCatalogVersion.version: models.DocumentCatalogVersion.version + 1},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        db.add(models.DocumentCatalogVersion(id=CATALOG_VERSION_ROW_ID, version=1))
+
+
+def _drop_local_catalog_snapshot() -> None:
+    global _catalog_snapshot, _catalog_checked_at
+    with _catalog_lock:
+        _catalog_snapshot = None
+        _catalog_checked_at = 0.0
+
+
+def invalidate_document_catalog(db: Session) -> int:
+    """
+    Record a catalog edit: bump the shared version row so every worker reloads,
+    and drop this process's snapshot immediately. Returns the new version.
+    """
+    try:
+        _bump_catalog_version_row(db)
+        db.commit()
+    except IntegrityError:
+        # Concurrent first bump created the row; retry as an update.
+        db.rollback()
+        _bump_catalog_version_row(db)
+        db.commit()
+    _drop_local_catalog_snapshot()
+    return _read_catalog_version(db)
+
+
+def get_document_catalog_snapshot(db: Session) -> DocumentCatalogSnapshot:
+    """
+    Active catalog snapshot. The version row is consulted at most every
+    DOCUMENT_CATALOG_VERSION_CHECK_SECONDS; the table itself is only read when the version moved.
+    """
+    global _catalog_snapshot, _catalog_checked_at
+    snapshot = _catalog_snapshot
+    now = time.monotonic()
+    if snapshot is not None and now - _catalog_checked_at < DOCUMENT_CATALOG_VERSION_CHECK_SECONDS:
+        return snapshot
+
+    version = _read_catalog_version(db)
+    with _catalog_lock:
+        snapshot = _catalog_snapshot
+        if snapshot is None or snapshot.version != version:
+            rows = get_document_type_catalog(db, active_only=True)
+            snapshot = DocumentCatalogSnapshot(version, [_catalog_row_payload(row) for row in rows])
+            _catalog_snapshot = snapshot
+        _catalog_checked_at = now
+    return snapshot
+
+
 def build_document_catalog_response(db: Session) -> dict[str, Any]:
-    document_types = get_document_type_payload(db, active_only=True)
-    required_document_types = [row["value"] for row in document_types if row.get("is_required")]
-    journey_stages = build_journey_stages(document_types)
-    return {
-        "document_types": document_types,
-        "required_document_types": required_document_types,
-        "journey_stages": journey_stages,
-    }
+    return get_document_catalog_snapshot(db).response
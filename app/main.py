@@ -10,15 +10,25 @@ from app.services.daily_ai_notifications import (
     start_daily_ai_notification_scheduler,
     stop_daily_ai_notification_scheduler,
 )
+from app.services.document_validation import (
+    fail_interrupted_document_validations,
+    start_document_validation_sweeper,
+    stop_document_validation_workers,
+)
 from app.schema_patch import (
     ensure_coupon_percent_column,
     ensure_coupon_usage_limit_column,
+    ensure_daily_notification_run_columns,
     ensure_document_catalog_columns,
+    ensure_document_validation_status_column,
     ensure_subscription_payment_recurring_columns,
     ensure_subscription_usage_columns,
     ensure_user_legal_consent_column,
 )
 from app.document_catalog import ensure_default_document_type_catalog
+from app.auth import stop_password_hashing_pool
+from app.utils.object_storage import stop_object_storage_workers
+from app.utils.rate_limiter import start_rate_limit_sweeper, stop_rate_limit_sweeper
 from app.token_backfill import backfill_hashed_auth_tokens
 import os
 
@@ -131,22 +141,32 @@ def startup_backfill_subscriptions():
     ensure_subscription_usage_columns()
     ensure_subscription_payment_recurring_columns()
     ensure_document_catalog_columns()
+    ensure_document_validation_status_column()
     ensure_coupon_percent_column()
     ensure_coupon_usage_limit_column()
+    ensure_daily_notification_run_columns()
     db = SessionLocal()
     try:
         ensure_default_document_type_catalog(db)
         backfill_missing_subscriptions(db)
         backfill_missing_referral_codes(db)
         backfill_hashed_auth_tokens(db)
+        fail_interrupted_document_validations(db)
     finally:
         db.close()
     start_daily_ai_notification_scheduler()
+    start_document_validation_sweeper()
+    start_rate_limit_sweeper()
 
 
 @app.on_event("shutdown")
 def shutdown_background_services():
     stop_daily_ai_notification_scheduler()
+    stop_document_validation_workers()
+    ai_chat.stop_chat_stream_workers()
+    stop_object_storage_workers()
+    stop_rate_limit_sweeper()
+    stop_password_hashing_pool()
 
 # Serve static files
 static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
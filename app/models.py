@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text, Boolean, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Text, Boolean, Numeric, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -41,12 +41,15 @@ class User(Base):
     email_notifications_enabled = Column(Boolean, nullable=False, default=True)
     email_notifications_unsubscribed_at = Column(DateTime(timezone=True), nullable=True)
     email_notifications_unsubscribe_reason = Column(Text, nullable=True)
+    profile_version = Column(Integer, nullable=False, default=0)  # Bumped whenever student profile snapshot inputs change
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     documents = relationship("Document", back_populates="uploader", cascade="all, delete-orphan")
     subscription = relationship("Subscription", back_populates="user", uselist=False, cascade="all, delete-orphan")
     subscription_payments = relationship("SubscriptionPayment", back_populates="user", cascade="all, delete-orphan")
     notifications = relationship("UserNotification", back_populates="user", cascade="all, delete-orphan")
+    profile_snapshot = relationship("StudentProfileSnapshot", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    daily_notification_state = relationship("AIDailyNotificationState", back_populates="user", uselist=False, cascade="all, delete-orphan")
 
 class USUniversity(Base):
     __tablename__ = "us_universities"
@@ -82,6 +85,8 @@ class Document(Base):
     encrypted_file_key = Column(Text, nullable=True)  # File encryption key encrypted with user password (base64)
     is_valid = Column(Boolean, nullable=True)  # Whether document validation passed (from Gemini)
     validation_message = Column(Text, nullable=True)  # Validation message from Gemini (e.g., "Document validated successfully" or error message)
+    validation_status = Column(String, nullable=True, index=True)  # pending | processing | completed | failed (NULL = legacy, completed inline)
+    validation_heartbeat_at = Column(DateTime, nullable=True)  # Refreshed by the process that owns an in-flight validation
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -102,10 +107,19 @@ class DocumentTypeCatalog(Base):
     stage_gate_required = Column(Boolean, nullable=False, default=False)
     stage_gate_requires_validation = Column(Boolean, nullable=False, default=False)
     stage_gate_group = Column(String, nullable=True)
+    prevalidation_rules = Column(Text, nullable=True)  # JSON overrides for local pre-validation
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
+class DocumentCatalogVersion(Base):
+    __tablename__ = "document_catalog_version"
+
+    id = Column(Integer, primary_key=True)  # Single row (id=1)
+    version = Column(Integer, nullable=False, default=0)  # Bumped on every catalog edit so all workers reload
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
 
@@ -176,6 +190,18 @@ class UserNotification(Base):
     user = relationship("User", back_populates="notifications")
 
 
+class StudentProfileSnapshot(Base):
+    __tablename__ = "student_profile_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    profile_version = Column(Integer, nullable=False, default=0)  # users.profile_version this payload was rendered from
+    encrypted_payload = Column(Text, nullable=False)  # Artifact-encrypted STUDENT_PROFILE_AND_F1_VISA_STATUS.json
+    rendered_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    user = relationship("User", back_populates="profile_snapshot")
+
+
 class AIDailyNotificationRun(Base):
     __tablename__ = "ai_daily_notification_runs"
 
@@ -186,4 +212,55 @@ class AIDailyNotificationRun(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     users_scanned = Column(Integer, nullable=False, default=0)
     notifications_sent = Column(Integer, nullable=False, default=0)
+    users_total = Column(Integer, nullable=False, default=0)
+    users_failed = Column(Integer, nullable=False, default=0)
+    users_unchanged = Column(Integer, nullable=False, default=0)  # Skipped by the input fingerprint pre-filter
+    last_progress_at = Column(DateTime(timezone=True), nullable=True)  # Heartbeat; a stale value means the runner died
     error_message = Column(Text, nullable=True)
+
+    items = relationship("AIDailyNotificationRunItem", back_populates="run", cascade="all, delete-orphan")
+
+
+class AIDailyNotificationRunItem(Base):
+    """Per-user checkpoint of a daily notification run, so an interrupted run resumes instead of restarting."""
+    __tablename__ = "ai_daily_notification_run_items"
+    __table_args__ = (UniqueConstraint("run_id", "user_id", name="uq_ai_daily_notification_run_item"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("ai_daily_notification_runs.id"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # pending | processing | no_action | notified | unchanged | skipped | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error_message = Column(Text, nullable=True)
+    # Set when the in-app notification went out but the email did not; the item stays "notified".
+    email_error = Column(Text, nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    run = relationship("AIDailyNotificationRun", back_populates="items")
+
+
+class AIDailyNotificationState(Base):
+    """Last daily assistant decision per user and the input fingerprint it was made on."""
+    __tablename__ = "ai_daily_notification_states"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    input_fingerprint = Column(String(64), nullable=False)
+    notification_needed = Column(Boolean, nullable=False, default=False)
+    evaluated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    user = relationship("User", back_populates="daily_notification_state")
+
+
+class DocumentValidationCacheEntry(Base):
+    """Gemini validation result for a previously seen file, keyed by a user-scoped HMAC of its contents."""
+    __tablename__ = "document_validation_cache"
+
+    cache_key = Column(String(64), primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    document_type = Column(String, nullable=False)
+    encrypted_result = Column(Text, nullable=False)  # Artifact-encrypted validation JSON
+    size_bytes = Column(Integer, nullable=False, default=0)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -1,38 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app import models, schemas
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user, get_current_admin_user
 from app.subscriptions import get_or_create_user_subscription, get_plan_limits
-from app.utils.secure_artifacts import decrypt_artifact_bytes
+from app.services.chat_context import assemble_chat_context, get_prompt_budget_stats
+from app.services.student_profile import get_student_profile_snapshot
+from app.utils.artifact_cache import get_artifact_cache_stats, load_artifacts
+from app.utils.object_storage import get_document_storage
 # Import Gemini configuration
 from app.utils import gemini_service as gemini_utils
 from typing import Optional, List
+import asyncio
 import os
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import boto3
-from botocore.config import Config
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/ai-chat", tags=["ai-chat"])
 
-# R2 Configuration for documents
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID", "")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID", "")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "")
-R2_DOCUMENTS_BUCKET = os.getenv("R2_DOCUMENTS_BUCKET", "documents")
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL", f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com")
-
-# Initialize R2 client
-r2_client = boto3.client(
-    's3',
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name='auto',
-    config=Config(signature_version='s3v4')
-)
+# Shared, connection-pooled object storage for the documents bucket
+document_storage = get_document_storage()
+
+# Deadline for loading all extracted artifacts attached to a single chat prompt
+AI_CHAT_DOCUMENT_FETCH_TIMEOUT_SECONDS = float(os.getenv("AI_CHAT_DOCUMENT_FETCH_TIMEOUT_SECONDS", "8") or "8")
+UNAVAILABLE_DOCUMENT_CONTENT = "Extracted data for this document could not be loaded right now."
+AI_CHAT_MODEL_NAME = gemini_utils.GEMINI_MODEL_NAME
+# Comment lines sent while waiting on Gemini so proxies don't drop an idle SSE connection.
+AI_CHAT_STREAM_KEEPALIVE_SECONDS = max(1.0, float(os.getenv("AI_CHAT_STREAM_KEEPALIVE_SECONDS", "15") or "15"))
+# Threads reading upstream Gemini streams. Each stream holds one for the whole generation,
+# so they get their own pool rather than the loop's default executor used by to_thread().
+AI_CHAT_STREAM_WORKERS = max(1, int(os.getenv("AI_CHAT_STREAM_WORKERS", "32") or "32"))
+_stream_executor: Optional[ThreadPoolExecutor] = None
+_stream_executor_lock = threading.Lock()
+
+def _get_stream_executor() -> ThreadPoolExecutor:
+    global _stream_executor
+    with _stream_executor_lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(
+                max_workers=AI_CHAT_STREAM_WORKERS,
+                thread_name_prefix="ai-chat-stream",
+            )
+        return _stream_executor
+
+
+def stop_chat_stream_workers() -> None:
+    global _stream_executor
+    with _stream_executor_lock:
+        executor = _stream_executor
+        _stream_executor = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 class ChatMessage(BaseModel):
     message: str
@@ -43,20 +66,6 @@ class ChatResponse(BaseModel):
     response: str
 
 
-def get_student_profile_raw_text(user_id: int) -> str | None:
-    """
-    Fetch decrypted STUDENT_PROFILE_AND_F1_VISA_STATUS.json raw text from R2.
-    Returns raw JSON string or None if not found.
-    """
-    try:
-        r2_key = f"user_{user_id}/STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=r2_key)
-        encrypted_blob = response['Body'].read()
-        return decrypt_artifact_bytes(encrypted_blob).decode('utf-8')
-    except Exception:
-        return None
-
-
 def get_user_navigation_guide_text() -> str:
     """
     Read the user navigation guide that should be attached to Gemini prompts.
@@ -70,21 +79,6 @@ def get_user_navigation_guide_text() -> str:
         return "User navigation guide file could not be loaded."
 
 
-def get_student_profile_and_status(user_id: int) -> dict:
-    """
-    Fetch student's comprehensive profile and visa status from R2.
-    Returns the full profile dict or None if not found.
-    """
-    try:
-        r2_key = f"user_{user_id}/STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=r2_key)
-        encrypted_blob = response['Body'].read()
-        json_content = decrypt_artifact_bytes(encrypted_blob).decode('utf-8')
-        return json.loads(json_content)
-    except Exception:
-        return None
-
-
 def format_student_profile_context(profile_data: dict) -> str:
     """
     Format comprehensive student profile as context string for the AI.
@@ -158,6 +152,8 @@ def get_user_documents_context(user_id: int, db: Session) -> str:
 def get_user_document_files(user_id: int, db: Session) -> List[dict]:
     """
     Fetch user's document JSON files from R2 for attachment to Gemini prompt.
+    Cached artifacts are reused; misses are fetched in parallel under a shared deadline. Documents that fail
+    or time out are still listed with a placeholder so the prompt stays consistent.
     Returns a list of dicts with document_type, filename, and json_content.
     """
     document_files = []
@@ -167,80 +163,92 @@ def get_user_document_files(user_id: int, db: Session) -> List[dict]:
             models.Document.user_id == user_id,
             models.Document.extracted_text_file_url.isnot(None)
         ).all()
+        if not documents:
+            return []
+
+        batch = load_artifacts(
+            document_storage,
+            [doc.extracted_text_file_url for doc in documents],
+            timeout=AI_CHAT_DOCUMENT_FETCH_TIMEOUT_SECONDS,
+        )
+        for key, exc in batch.errors.items():
+            print(f"Warning: Failed to fetch document artifact {key}: {str(exc)}")
+        if batch.timed_out:
+            print(f"Warning: Timed out fetching {len(batch.timed_out)} document artifact(s) for user {user_id}")
         
         for doc in documents:
-            try:
-                # Get extracted text/JSON file from R2
-                response = r2_client.get_object(
-                    Bucket=R2_DOCUMENTS_BUCKET, 
-                    Key=doc.extracted_text_file_url
-                )
-                encrypted_blob = response['Body'].read()
-                extracted_content = decrypt_artifact_bytes(encrypted_blob).decode('utf-8')
-                
-                # Try to parse as JSON, otherwise use raw content
+            content = UNAVAILABLE_DOCUMENT_CONTENT
+            artifact_bytes = batch.objects.get(doc.extracted_text_file_url)
+            if artifact_bytes is not None:
                 try:
-                    json_data = json.loads(extracted_content)
-                    content = json.dumps(json_data, indent=2)
-                except json.JSONDecodeError:
+                    extracted_content = artifact_bytes.decode('utf-8')
+                    # JSON extracts are compacted when the prompt is assembled
                     content = extracted_content
-                
-                document_files.append({
-                    "document_type": doc.document_type or "document",
-                    "filename": doc.original_filename,
-                    "is_valid": doc.is_valid,
-                    "validation_message": doc.validation_message,
-                    "content": content
-                })
-            except Exception as e:
-                print(f"Warning: Failed to fetch document {doc.id}: {str(e)}")
-                continue
+                except Exception as e:
+                    print(f"Warning: Failed to decode document {doc.id}: {str(e)}")
+            
+            document_files.append({
+                "document_type": doc.document_type or "document",
+                "filename": doc.original_filename,
+                "is_valid": doc.is_valid,
+                "validation_message": doc.validation_message,
+                "content": content
+            })
         
         return document_files
     except Exception as e:
         print(f"Error fetching document files: {str(e)}")
         return []
 
-def generate_ai_response(
+def _get_chat_model():
+    """Cached Gemini model handle for chat, from Vertex AI or the Gemini API, whichever is configured."""
+    return gemini_utils.gemini_client.get_model(AI_CHAT_MODEL_NAME)
+
+def build_chat_prompt(
     user_message: str,
-    user_name: str,
     documents_context: str,
     student_profile_context: str,
     navigation_guide_text: str,
     document_files: List[dict] = None,
     conversation_history: Optional[List[dict]] = None,
 ) -> str:
-    """
-    Generate AI response using Gemini with system prompt, document context, attached document files, and comprehensive student profile.
-    """
-    try:
-        # Initialize model based on available service
-        if hasattr(gemini_utils, 'USE_VERTEX_AI') and gemini_utils.USE_VERTEX_AI and hasattr(gemini_utils, 'VERTEX_AI_AVAILABLE') and gemini_utils.VERTEX_AI_AVAILABLE:
-            from vertexai.generative_models import GenerativeModel
-            model = GenerativeModel('gemini-3-pro-preview')
-        elif hasattr(gemini_utils, 'GENAI_AVAILABLE') and gemini_utils.GENAI_AVAILABLE:
-            try:
-                import google.generativeai as genai
-                model = genai.GenerativeModel('gemini-3-pro-preview')
-            except:
-                raise Exception("Gemini API not properly configured")
-        else:
-            raise Exception("Gemini AI not available. Please configure service account or API key.")
-        
-        # Build attached documents section
-        attached_docs_text = ""
-        if document_files and len(document_files) > 0:
-            attached_docs_text = f"\n\n=== ATTACHED DOCUMENT FILES ({len(document_files)} documents) ===\nAll uploaded documents are attached below with their full extracted information for your reference.\n"
-            for i, doc_file in enumerate(document_files, 1):
-                validation_status = "VALID" if doc_file.get('is_valid') else "NEEDS REVIEW"
-                attached_docs_text += f"\n--- DOCUMENT {i}: {doc_file['document_type'].upper()} ({doc_file['filename']}) [{validation_status}] ---\n"
-                if doc_file.get('validation_message'):
-                    attached_docs_text += f"Validation Note: {doc_file['validation_message']}\n"
-                attached_docs_text += f"Extracted Data:\n{doc_file['content']}\n"
-            attached_docs_text += "\n=== END OF ATTACHED DOCUMENTS ===\n"
-        
-        # Attach the raw decrypted student profile JSON directly (no field-level extraction).
-        system_prompt = f"""You are Rilono AI, a F1 student visa expert assistant. You are guiding the student through the F1 student visa process and documentation.
+    """Full chat prompt: system prompt, student profile, documents, navigation guide and history, fitted to the token budget."""
+    budgeted = assemble_chat_context(
+        user_message,
+        student_profile_context,
+        documents_context,
+        navigation_guide_text,
+        document_files,
+        conversation_history,
+    )
+    student_profile_context = budgeted.student_profile_context
+    documents_context = budgeted.documents_context
+    navigation_guide_text = budgeted.navigation_guide_text
+    document_files = budgeted.document_files
+    omitted_documents_note = budgeted.omitted_documents_note
+    print(
+        f"AI chat prompt: ~{budgeted.total_tokens} tokens "
+        f"({', '.join(f'{name}={tokens}' for name, tokens in budgeted.section_tokens.items())}); "
+        f"documents attached={budgeted.documents_attached} truncated={budgeted.documents_truncated} "
+        f"omitted={budgeted.documents_omitted}"
+    )
+
+    # Build attached documents section (most relevant first)
+    attached_docs_text = ""
+    if document_files or omitted_documents_note:
+        attached_docs_text = f"\n\n=== ATTACHED DOCUMENT FILES ({len(document_files)} documents) ===\nUploaded documents are attached below with their extracted information, most relevant to the current message first.\n"
+        for i, doc_file in enumerate(document_files, 1):
+            validation_status = "VALID" if doc_file.get('is_valid') else "NEEDS REVIEW"
+            attached_docs_text += f"\n--- DOCUMENT {i}: {doc_file['document_type'].upper()} ({doc_file['filename']}) [{validation_status}] ---\n"
+            if doc_file.get('validation_message'):
+                attached_docs_text += f"Validation Note: {doc_file['validation_message']}\n"
+            attached_docs_text += f"Extracted Data:\n{doc_file['content']}\n"
+        if omitted_documents_note:
+            attached_docs_text += f"\n{omitted_documents_note}\n"
+        attached_docs_text += "\n=== END OF ATTACHED DOCUMENTS ===\n"
+    
+    # Attach the raw decrypted student profile JSON directly (no field-level extraction).
+    system_prompt = f"""You are Rilono AI, a F1 student visa expert assistant. You are guiding the student through the F1 student visa process and documentation.
 
 Your role:
 - Provide expert guidance on F1 student visa requirements and processes
@@ -274,27 +282,43 @@ Instructions:
 - When suggesting next steps, be specific about what documents they need to upload or actions to take
 - For app usage questions, rely on ATTACHED USER NAVIGATION GUIDE and provide concrete click-by-click steps
 
-Remember: You have access to the student's full raw profile file plus full uploaded document data. Use this information to provide highly personalized, stage-appropriate guidance."""
-
-        # Build conversation context
-        conversation_text = ""
-        if conversation_history:
-            for msg in conversation_history[-10:]:  # Last 10 messages for context
-                role = msg.get('role', 'user')
-                content = msg.get('content', '')
-                if role == 'user':
-                    conversation_text += f"User: {content}\n"
-                elif role == 'assistant':
-                    conversation_text += f"Assistant: {content}\n"
-        
-        # Build full prompt
-        full_prompt = f"""{system_prompt}
+Remember: You have access to the student's raw profile file plus the extracted data of the uploaded documents most relevant to this message. Documents listed as not attached were left out to fit the prompt budget; if the answer depends on one, ask the student to mention it by name. Use this information to provide highly personalized, stage-appropriate guidance."""
+
+    # Recent turns verbatim, older ones summarized
+    conversation_text = budgeted.conversation_text
+    
+    # Build full prompt
+    full_prompt = f"""{system_prompt}
 
 {conversation_text if conversation_text else ""}
 
 Current user message: {user_message}
 
 Please provide a helpful response to the user's question:"""
+    return full_prompt
+
+def generate_ai_response(
+    user_message: str,
+    user_name: str,
+    documents_context: str,
+    student_profile_context: str,
+    navigation_guide_text: str,
+    document_files: List[dict] = None,
+    conversation_history: Optional[List[dict]] = None,
+) -> str:
+    """
+    Generate AI response using Gemini with system prompt, document context, attached document files, and comprehensive student profile.
+    """
+    try:
+        model = _get_chat_model()
+        full_prompt = build_chat_prompt(
+            user_message,
+            documents_context,
+            student_profile_context,
+            navigation_guide_text,
+            document_files,
+            conversation_history,
+        )
         
         print("\n" + "="*80)
         print(f"🔵 GEMINI API CALL: generate_ai_response() - AI CHAT")
@@ -310,7 +334,7 @@ Please provide a helpful response to the user's question:"""
         print("⏳ Waiting for Gemini response...")
         
         # Generate response
-        response = model.generate_content(full_prompt)
+        response = gemini_utils.gemini_client.generate("chat", full_prompt, model=model)
         
         print("✅ RECEIVED RESPONSE FROM GEMINI:")
         print("-"*80)
@@ -328,43 +352,80 @@ Please provide a helpful response to the user's question:"""
             detail=f"Failed to generate AI response: {str(e)}"
         )
 
-def refresh_student_profile_if_stale(user: models.User, db: Session) -> dict:
+def _check_ai_message_quota(db: Session, user_id: int, count_toward_limit: bool) -> models.Subscription:
+    subscription = get_or_create_user_subscription(db, user_id)
+    limits = get_plan_limits(subscription.plan)
+    ai_limit = limits["ai_messages_limit"]
+    if count_toward_limit and ai_limit >= 0 and subscription.ai_messages_used >= ai_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=(
+                f"Free plan message limit reached ({ai_limit}). "
+                "Upgrade to Pro for unlimited Rilono AI messages."
+            )
+        )
+    return subscription
+
+
+def _load_chat_context(current_user: models.User, db: Session) -> dict:
+    """Profile, document and navigation context shared by the chat endpoints."""
+    # Keep profile file fresh when needed, then attach the full raw decrypted JSON directly.
+    # One snapshot read (served from cache when unchanged); a rebuild hands back its own bytes.
+    try:
+        student_profile_raw_text = get_student_profile_snapshot(current_user, db).raw_json
+    except Exception as e:
+        print(f"Warning: Failed to load student profile: {str(e)}")
+        student_profile_raw_text = None
+    if not student_profile_raw_text:
+        student_profile_raw_text = (
+            '{"note":"STUDENT_PROFILE_AND_F1_VISA_STATUS.json not found. '
+            'Ask user to open dashboard once or run /api/documents/visa-status/refresh."}'
+        )
+    return {
+        "student_profile_context": student_profile_raw_text,
+        "navigation_guide_text": get_user_navigation_guide_text(),
+        # Summary list of uploaded documents
+        "documents_context": get_user_documents_context(current_user.id, db),
+        # Document files (full JSON content) to attach to the prompt
+        "document_files": get_user_document_files(current_user.id, db),
+    }
+
+
+def _load_chat_context_isolated(user_id: int) -> dict:
     """
-    Check if the cached student profile is stale (document count mismatch) and refresh if needed.
-    Returns the up-to-date profile data.
+    _load_chat_context() on its own session, for use off the event loop. The DB reads,
+    profile snapshot render and R2 artifact fetches all block, and a Session must not
+    be shared across threads.
     """
-    from app.routers.documents import calculate_visa_journey_stage, save_student_profile_to_r2
-    
-    # Get actual document count from database
-    actual_documents = db.query(models.Document).filter(
-        models.Document.user_id == user.id
-    ).all()
-    actual_count = len(actual_documents)
-    
-    # Get cached profile
-    cached_profile = get_student_profile_and_status(user.id)
-    
-    if cached_profile:
-        cached_count = cached_profile.get('documents_summary', {}).get('total_documents_uploaded', 0)
-        
-        # If counts match, profile is up-to-date
-        if cached_count == actual_count:
-            return cached_profile
-        
-        # Profile is stale - refresh it
-        print(f"🔄 Refreshing stale profile for user {user.id}: cached={cached_count}, actual={actual_count}")
-    else:
-        print(f"🔄 Creating new profile for user {user.id}")
-    
-    # Refresh the profile
+    db = SessionLocal()
     try:
-        status_data = calculate_visa_journey_stage(actual_documents, db)
-        save_student_profile_to_r2(user, status_data, actual_documents, db=db)
-        # Return the fresh profile
-        return get_student_profile_and_status(user.id)
-    except Exception as e:
-        print(f"Warning: Failed to refresh profile: {str(e)}")
-        return cached_profile  # Fall back to cached if refresh fails
+        user = db.get(models.User, user_id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return _load_chat_context(user, db)
+    finally:
+        db.close()
+
+
+def _build_chat_prompt_isolated(user_id: int, user_message: str, conversation_history: Optional[List[dict]]) -> str:
+    return build_chat_prompt(
+        user_message,
+        conversation_history=conversation_history,
+        **_load_chat_context_isolated(user_id),
+    )
+
+
+def _record_ai_message_used(user_id: int) -> None:
+    """Count one AI message. Atomic, so concurrent streams never lose an increment."""
+    db = SessionLocal()
+    try:
+        db.query(models.Subscription).filter(models.Subscription.user_id == user_id).update(
+            {models.Subscription.ai_messages_used: models.Subscription.ai_messages_used + 1},
+            synchronize_session=False,
+        )
+        db.commit()
+    finally:
+        db.close()
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -380,53 +441,25 @@ async def chat_with_ai(
     try:
         source = (chat_message.source or "rilono_ai_chat").strip().lower()
         count_toward_rilono_chat_limit = source == "rilono_ai_chat"
-
-        subscription = get_or_create_user_subscription(db, current_user.id)
-        limits = get_plan_limits(subscription.plan)
-        ai_limit = limits["ai_messages_limit"]
-        if count_toward_rilono_chat_limit and ai_limit >= 0 and subscription.ai_messages_used >= ai_limit:
-            raise HTTPException(
-                status_code=403,
-                detail=(
-                    f"Free plan message limit reached ({ai_limit}). "
-                    "Upgrade to Pro for unlimited Rilono AI messages."
-                )
-            )
+        _check_ai_message_quota(db, current_user.id, count_toward_rilono_chat_limit)
 
         # Get user's name
         user_name = current_user.full_name or current_user.username or "Student"
-        
-        # Keep profile file fresh when needed, then attach the full raw decrypted JSON directly.
-        refresh_student_profile_if_stale(current_user, db)
-        student_profile_raw_text = get_student_profile_raw_text(current_user.id)
-        navigation_guide_text = get_user_navigation_guide_text()
-        if not student_profile_raw_text:
-            student_profile_raw_text = (
-                '{"note":"STUDENT_PROFILE_AND_F1_VISA_STATUS.json not found. '
-                'Ask user to open dashboard once or run /api/documents/visa-status/refresh."}'
-            )
-        
-        # Get documents context (summary list of uploaded documents)
-        documents_context = get_user_documents_context(current_user.id, db)
-        
-        # Get document files (full JSON content) to attach to the prompt
-        document_files = get_user_document_files(current_user.id, db)
+        # Context load (DB, profile snapshot, R2 artifacts) and generation both run off the event loop
+        context = await asyncio.to_thread(_load_chat_context_isolated, current_user.id)
         
         # Generate response with attached document files
-        response_text = generate_ai_response(
+        response_text = await asyncio.to_thread(
+            generate_ai_response,
             user_message=chat_message.message,
             user_name=user_name,
-            documents_context=documents_context,
-            student_profile_context=student_profile_raw_text,
-            navigation_guide_text=navigation_guide_text,
-            document_files=document_files,
-            conversation_history=chat_message.conversation_history
+            conversation_history=chat_message.conversation_history,
+            **context,
         )
 
         # Only the main Rilono AI chat consumes the free AI message quota.
         if count_toward_rilono_chat_limit:
-            subscription.ai_messages_used += 1
-            db.commit()
+            await asyncio.to_thread(_record_ai_message_used, current_user.id)
         
         return ChatResponse(response=response_text)
         
@@ -437,3 +470,180 @@ async def chat_with_ai(
             status_code=500,
             detail=f"An error occurred: {str(e)}"
         )
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _chunk_text(chunk) -> str:
+    # Chunks without text (e.g. safety or usage metadata only) raise on .text.
+    try:
+        return chunk.text or ""
+    except (ValueError, AttributeError, IndexError):
+        return ""
+
+
+class _UpstreamChatStream:
+    """
+    Runs a streaming generate_content() call on a worker thread and hands chunks to
+    the event loop. cancel() stops reading and closes the upstream stream, which
+    unblocks a worker waiting on the next chunk.
+    """
+
+    def __init__(self, model, prompt: str) -> None:
+        self._model = model
+        self._prompt = prompt
+        self._stream = None
+        self._cancelled = threading.Event()
+
+    def run(self, emit) -> None:
+        chunks = None
+        try:
+            self._stream, chunks = gemini_utils.gemini_client.stream("chat_stream", self._prompt, model=self._model)
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    return
+                text = _chunk_text(chunk)
+                if text:
+                    emit(("token", text))
+            emit(("done", None))
+        except Exception as exc:  # noqa: BLE001
+            if not self._cancelled.is_set():
+                emit(("error", exc))
+        finally:
+            if chunks is not None:
+                chunks.close()
+            self._close()
+
+    def _close(self) -> None:
+        stream = self._stream
+        if stream is None:
+            return
+        # Vertex AI returns a generator; google-generativeai wraps a gRPC call iterator.
+        for closer in (getattr(stream, "close", None), getattr(getattr(stream, "_iterator", None), "cancel", None)):
+            if closer is None:
+                continue
+            try:
+                closer()
+            except Exception:  # noqa: BLE001
+                pass
+
+    def cancel(self) -> None:
+        if not self._cancelled.is_set():
+            self._cancelled.set()
+            self._close()
+
+
+async def _stream_chat_events(prompt: str, model, user_id: int, count_toward_limit: bool):
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    upstream = _UpstreamChatStream(model, prompt)
+
+    def emit(item) -> None:
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed.
+            upstream.cancel()
+
+    started_at = time.perf_counter()
+    first_token_at = None
+    parts: list[str] = []
+    loop.run_in_executor(_get_stream_executor(), upstream.run, emit)
+    try:
+        while True:
+            try:
+                kind, payload = await asyncio.wait_for(queue.get(), timeout=AI_CHAT_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if kind == "token":
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    print(f"AI chat stream: user_id={user_id} first token after {(first_token_at - started_at) * 1000:.0f} ms")
+                parts.append(payload)
+                yield _sse_event("token", {"text": payload})
+            elif kind == "error":
+                print(f"Error streaming AI response: {str(payload)}")
+                yield _sse_event("error", {"detail": f"Failed to generate AI response: {str(payload)}"})
+                return
+            else:
+                # Quota is only consumed once the full answer has been produced.
+                if count_toward_limit:
+                    await asyncio.to_thread(_record_ai_message_used, user_id)
+                print(
+                    f"AI chat stream: user_id={user_id} completed in "
+                    f"{(time.perf_counter() - started_at) * 1000:.0f} ms ({len(parts)} chunks)"
+                )
+                yield _sse_event("done", {"response": "".join(parts)})
+                return
+    finally:
+        # Client disconnected or the stream ended: stop reading from Gemini.
+        upstream.cancel()
+
+
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    chat_message: ChatMessage,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Streaming variant of /chat over Server-Sent Events.
+    Emits "token" events ({"text"}) as Gemini produces them, then one "done" event
+    ({"response"}) or an "error" event ({"detail"}). Quota and plan errors are
+    returned as regular HTTP errors before the stream starts. The AI message is
+    only counted once the response completes; a client disconnect cancels the
+    upstream call.
+    """
+    source = (chat_message.source or "rilono_ai_chat").strip().lower()
+    count_toward_rilono_chat_limit = source == "rilono_ai_chat"
+    _check_ai_message_quota(db, current_user.id, count_toward_rilono_chat_limit)
+
+    try:
+        model = _get_chat_model()
+        # Built off the event loop: the context load blocks on the DB and R2.
+        prompt = await asyncio.to_thread(
+            _build_chat_prompt_isolated,
+            current_user.id,
+            chat_message.message,
+            chat_message.conversation_history,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate AI response: {str(e)}"
+        )
+
+    return StreamingResponse(
+        _stream_chat_events(prompt, model, current_user.id, count_toward_rilono_chat_limit),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/admin/artifact-cache-stats")
+def get_artifact_cache_statistics(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Hit/miss counters and size of the decrypted artifact cache (admin/developer only)."""
+    return get_artifact_cache_stats()
+
+
+@router.get("/admin/gemini-stats")
+def get_gemini_statistics(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Gemini call latency, token usage, retries and error rate per call site (admin/developer only)."""
+    return gemini_utils.get_gemini_stats()
+
+
+@router.get("/admin/prompt-budget-stats")
+def get_prompt_budget_statistics(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Average tokens per prompt section and document attach/truncate/omit counts (admin/developer only)."""
+    return get_prompt_budget_stats()
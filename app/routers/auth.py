@@ -6,10 +6,12 @@ from datetime import timedelta, datetime
 from app.database import get_db
 from app import models, schemas
 from app.auth import (
-    authenticate_user,
+    aauthenticate_user,
     create_access_token,
-    get_password_hash,
+    get_password_hash_offloaded,
     get_current_active_user,
+    get_current_admin_user,
+    get_password_hashing_stats,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     validate_password_strength,
 )
@@ -30,6 +32,7 @@ from app.referrals import (
 )
 from app.utils.rate_limiter import check_ip_rate_limit
 from app.utils.token_security import hash_token, token_matches
+from app.utils.security import unlock_sessions
 import os
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
@@ -255,7 +258,9 @@ def register(
     
     # Create new user with auto-filled university name
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = get_password_hash_offloaded(user.password)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Password hashing error: {str(e)}")
     except Exception as e:
@@ -352,7 +357,7 @@ async def login(
             )
     
     # Use username field as email (OAuth2PasswordRequestForm convention)
-    user = authenticate_user(db, username, password)
+    user = await aauthenticate_user(db, username, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -405,9 +410,9 @@ async def login(
         db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    # Store email in token instead of username
+    # Store email in token instead of username; uid allows a primary-key lookup
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": user.email, "uid": user.id}, expires_delta=access_token_expires
     )
     _set_auth_cookie(response, access_token, int(access_token_expires.total_seconds()))
     return {
@@ -432,6 +437,14 @@ def logout(response: Response):
     _clear_auth_cookie(response)
     return {"message": "Logged out successfully."}
 
+
+@router.get("/admin/password-hashing-stats")
+def password_hashing_stats(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Queue depth, throughput and latency of the password hashing pool."""
+    return get_password_hashing_stats()
+
 @router.post("/forgot-password")
 def forgot_password(
     payload: schemas.PasswordResetRequest,
@@ -529,7 +542,9 @@ def reset_password(request: schemas.PasswordReset, db: Session = Depends(get_db)
     
     # Hash new password
     try:
-        hashed_password = get_password_hash(new_password)
+        hashed_password = get_password_hash_offloaded(new_password)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="An error occurred while resetting your password.")
     
@@ -538,6 +553,7 @@ def reset_password(request: schemas.PasswordReset, db: Session = Depends(get_db)
     user.password_reset_token = None
     user.password_reset_token_expires = None
     db.commit()
+    unlock_sessions.revoke_user(user.id)
     
     return {
         "message": "Password reset successfully! You can now log in with your new password."
@@ -1,59 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form, Request, Response
 from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc
 from app.database import get_db
 from app import models, schemas
-from app.auth import get_current_active_user, get_current_admin_user, verify_password
+from app.auth import (
+    averify_password,
+    get_current_active_user,
+    get_current_admin_user,
+    password_hashing_pool,
+    verify_password_offloaded,
+)
 from app.utils.security import (
-    encrypt_file_with_user_password,
-    decrypt_file_with_user_password,
+    derive_key_from_password,
+    encrypt_stream_with_key_wrapping_key,
+    decrypt_stream_with_key_wrapping_key,
     generate_user_salt,
     encode_salt_for_storage,
-    decode_salt_from_storage
+    decode_salt_from_storage,
+    open_unlock_session,
+    unlock_sessions,
+)
+from app.utils.chunked_encryption import encrypted_size
+from app.utils.secure_artifacts import decrypt_artifact_bytes
+from app.utils.object_storage import get_document_storage
+from app.utils.artifact_cache import invalidate_user_artifacts, load_artifact
+from app.services.student_profile import (
+    StudentProfileSnapshot,
+    get_student_profile_snapshot,
+    mark_student_profile_stale,
+    store_student_profile_snapshot,
+)
+from app.services.document_validation import (
+    BUSY_VALIDATION_MESSAGE,
+    PENDING_VALIDATION_MESSAGE,
+    VALIDATION_STATUS_COMPLETED,
+    VALIDATION_STATUS_FAILED,
+    VALIDATION_STATUS_PENDING,
+    apply_cached_document_validation,
+    apply_prevalidation_flag,
+    document_validation_has_capacity,
+    submit_document_validation,
+)
+from app.services.document_prevalidation import (
+    DOCUMENT_PREVALIDATION_ENABLED,
+    PREVALIDATION_FLAG,
+    PREVALIDATION_REJECT,
+    get_prevalidation_stats,
+    prevalidate_document,
 )
-from app.utils.secure_artifacts import encrypt_artifact_bytes, decrypt_artifact_bytes
-from app.utils.gemini_service import extract_text_from_document, create_extracted_text_file, validate_and_extract_document
+from app.services.validation_cache import get_validation_cache_stats
 from app.subscriptions import get_or_create_user_subscription, get_plan_limits
+from app.services.journey_stages import (
+    compute_stages_for_users,
+    get_compiled_journey_rules,
+    load_journey_document_rows,
+)
 from app.document_catalog import (
-    build_document_catalog_response,
-    build_journey_stages,
-    ensure_default_document_type_catalog,
-    get_document_type_payload,
+    get_document_catalog_snapshot,
+    invalidate_document_catalog,
 )
-from typing import Optional, List
+from typing import Iterable, Optional, List
+import asyncio
 import os
 import uuid
 from pathlib import Path
-import boto3
-from botocore.config import Config
 from io import BytesIO
 import base64
 import json
+from itertools import chain
 from datetime import datetime
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
-# R2 Configuration for documents
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID", "")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID", "")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "")
-R2_DOCUMENTS_BUCKET = os.getenv("R2_DOCUMENTS_BUCKET", "documents")  # Separate bucket for documents
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL", f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com")
-R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "")
-
-# Initialize R2 client for documents
-if not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
-    raise ValueError("R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY must be set in environment variables")
-
-r2_client = boto3.client(
-    's3',
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name='auto',
-    config=Config(signature_version='s3v4')
-)
+# Shared, connection-pooled object storage for the documents bucket
+document_storage = get_document_storage()
 
 # Allowed document file types
 ALLOWED_DOCUMENT_EXTENSIONS = {
@@ -83,16 +104,15 @@ def get_content_type(filename: str) -> str:
     }
     return content_types.get(ext, "application/octet-stream")
 
-def upload_document_to_r2(file_contents: bytes, filename: str, content_type: str, encrypted: bool = False) -> str:
-    """Upload document to R2 and return the R2 key/path"""
+def upload_document_to_r2(file_contents: Iterable[bytes], filename: str, content_type: str, encrypted: bool = False) -> str:
+    """Upload document to R2 and return the R2 key/path. Large streams go up as a multipart upload."""
     try:
-        r2_client.put_object(
-            Bucket=R2_DOCUMENTS_BUCKET,
-            Key=filename,
-            Body=file_contents,
-            ContentType=content_type,
+        document_storage.put_stream(
+            filename,
+            file_contents,
+            content_type=content_type,
             # Set metadata for security
-            Metadata={
+            metadata={
                 'uploaded-by': 'rilono-system',
                 'encrypted': 'true' if encrypted else 'false'
             }
@@ -103,34 +123,97 @@ def upload_document_to_r2(file_contents: bytes, filename: str, content_type: str
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload document to R2: {str(e)}")
 
+def _open_decrypted_document_stream(r2_key: str, encrypted_file_key: bytes, key_wrapping_key: bytes):
+    """
+    Ranged-GET and decrypt a document chunk by chunk. The first chunk is decrypted
+    before returning so a bad key or corrupted header fails before the response starts.
+    """
+    plaintext = decrypt_stream_with_key_wrapping_key(
+        document_storage.iter_bytes(r2_key),
+        encrypted_file_key,
+        key_wrapping_key,
+    )
+    return chain([next(plaintext, b"")], plaintext)
+
 def get_presigned_url(r2_key: str, expiration: int = 3600) -> str:
     """Generate a presigned URL for secure document access"""
     try:
-        url = r2_client.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': R2_DOCUMENTS_BUCKET, 'Key': r2_key},
-            ExpiresIn=expiration
-        )
-        return url
+        return document_storage.presigned_url(r2_key, expires_in=expiration)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate presigned URL: {str(e)}")
 
 
 @router.get("/catalog", response_model=schemas.DocumentCatalogResponse)
-def get_document_catalog(db: Session = Depends(get_db)):
-    ensure_default_document_type_catalog(db)
-    payload = build_document_catalog_response(db)
-    return schemas.DocumentCatalogResponse(**payload)
+def get_document_catalog(request: Request, db: Session = Depends(get_db)):
+    """
+    Active document type catalog and journey stages.
+    Served from the in-memory catalog snapshot with an ETag; clients sending
+    a matching If-None-Match get 304 Not Modified.
+    """
+    snapshot = get_document_catalog_snapshot(db)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if snapshot.etag in {tag.strip() for tag in if_none_match.split(",")} or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.response_body, media_type="application/json", headers=headers)
+
+def _ensure_user_salt(db: Session, user: models.User) -> bytes:
+    if not user.encryption_salt:
+        # First time uploading - generate salt
+        salt_bytes = generate_user_salt()
+        user.encryption_salt = encode_salt_for_storage(salt_bytes)
+        db.commit()
+        return salt_bytes
+    return decode_salt_from_storage(user.encryption_salt)
+
+
+def _unlock_session_key(user: models.User, password: Optional[str], unlock_token: Optional[str]) -> Optional[bytes]:
+    """
+    Key-wrapping key from a live unlock session. Returns None when no session applies
+    and the caller should fall back to the password.
+    """
+    if not unlock_token:
+        return None
+    key_wrapping_key = unlock_sessions.get_key(unlock_token, user.id)
+    if key_wrapping_key is None and not password:
+        raise HTTPException(
+            status_code=401,
+            detail="Your document unlock session has expired. Please enter your password again.",
+        )
+    return key_wrapping_key
+
+
+@router.post("/unlock", response_model=schemas.DocumentUnlockResponse)
+async def unlock_documents(
+    password: str = Form(...),
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Verify the password once and open a short-lived unlock session.
+    Pass the returned unlock_token instead of the password to /upload and
+    /{document_id}/download until it expires.
+    """
+    if not await averify_password(password, current_user.hashed_password):
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect password. Please provide your login password to unlock your documents."
+        )
+    salt_bytes = _ensure_user_salt(db, current_user)
+    unlock_token = await password_hashing_pool.arun(open_unlock_session, current_user.id, password, salt_bytes)
+    return {"unlock_token": unlock_token, "expires_in": unlock_sessions.ttl_seconds}
 
 @router.post("/upload", response_model=schemas.DocumentUploadResponse, status_code=status.HTTP_201_CREATED)
-async def upload_document(
+def upload_document(
     file: UploadFile = File(...),
-    password: str = Form(...),  # User's password for Zero-Knowledge encryption
+    password: Optional[str] = Form(None),  # User's password for Zero-Knowledge encryption
+    unlock_token: Optional[str] = Form(None),  # Or a session from /unlock
     document_type: str = Form(...),  # Required - document type must be specified
     country: Optional[str] = Form(None),
     intake: Optional[str] = Form(None),
     year: Optional[int] = Form(None),
     description: Optional[str] = Form(None),
+    revalidate: bool = Form(False),  # Skip the memoized validation result for identical bytes
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -138,37 +221,38 @@ async def upload_document(
     Upload a document file to R2 storage with Zero-Knowledge encryption.
     Files are encrypted with a key derived from the user's password.
     Even admins cannot decrypt the files without the user's password.
+
+    Declared as a sync endpoint so the R2 upload runs in the threadpool instead of
+    the event loop; bcrypt and PBKDF2 run on the password hashing pool and are
+    skipped entirely with a valid unlock_token. Gemini validation is queued to the
+    background validation workers; poll /{document_id}/validation-status for the result.
+    Re-uploading identical bytes reuses the memoized validation and completes immediately
+    unless revalidate is set. Local pre-validation runs first: broken files are refused
+    with 400, and files that do not fit the document type complete as invalid without
+    a Gemini call.
     """
-    # Verify password is correct
-    if not verify_password(password, current_user.hashed_password):
+    key_wrapping_key = _unlock_session_key(current_user, password, unlock_token)
+    if key_wrapping_key is None and (
+        not password or not verify_password_offloaded(password, current_user.hashed_password)
+    ):
         raise HTTPException(
             status_code=401,
             detail="Incorrect password. Please provide your login password to encrypt the document."
         )
 
-    ensure_default_document_type_catalog(db)
-    catalog_items = get_document_type_payload(db, active_only=True)
-    allowed_document_types = {
-        item["value"] for item in catalog_items
-    }
-    mandatory_document_types = {
-        item["value"] for item in catalog_items if item.get("is_required")
-    }
-    if document_type not in allowed_document_types:
+    catalog = get_document_catalog_snapshot(db)
+    if document_type not in catalog.allowed_document_types:
         raise HTTPException(
             status_code=400,
             detail="Invalid document type. Please select a valid type from the list.",
         )
-    if document_type in mandatory_document_types:
+    if document_type in catalog.mandatory_document_types:
         existing_mandatory_doc = db.query(models.Document.id).filter(
             models.Document.user_id == current_user.id,
             models.Document.document_type == document_type,
         ).first()
         if existing_mandatory_doc:
-            document_label = next(
-                (item.get("label") for item in catalog_items if item.get("value") == document_type),
-                document_type,
-            )
+            document_label = catalog.labels.get(document_type, document_type)
             raise HTTPException(
                 status_code=409,
                 detail=(
@@ -206,29 +290,50 @@ async def upload_document(
             detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_DOCUMENT_EXTENSIONS)}"
         )
     
-    # Read file content
-    contents = await file.read()
-    
-    # Validate file size
-    if len(contents) > MAX_DOCUMENT_SIZE:
+    # Validate file size before reading it into memory
+    file.file.seek(0, os.SEEK_END)
+    if file.file.tell() > MAX_DOCUMENT_SIZE:
         raise HTTPException(
             status_code=400,
             detail=f"File too large. Maximum size is {MAX_DOCUMENT_SIZE_MB}MB"
         )
+    file.file.seek(0)
     
-    # Generate or get user's encryption salt
-    if not current_user.encryption_salt:
-        # First time uploading - generate salt
-        salt_bytes = generate_user_salt()
-        current_user.encryption_salt = encode_salt_for_storage(salt_bytes)
-        db.commit()
-    else:
-        salt_bytes = decode_salt_from_storage(current_user.encryption_salt)
+    # Read file content (the validation worker needs the plaintext)
+    contents = file.file.read()
+    
+    # Cheap local checks before any key derivation, storage or Gemini call
+    prevalidation = None
+    if DOCUMENT_PREVALIDATION_ENABLED:
+        prevalidation = prevalidate_document(
+            contents,
+            file.filename,
+            document_type,
+            rules=catalog.prevalidation_rules.get(document_type),
+            document_label=catalog.labels.get(document_type, document_type),
+        )
+        if prevalidation.outcome == PREVALIDATION_REJECT:
+            raise HTTPException(status_code=400, detail=prevalidation.message)
+    
+    # Shed load before storing anything when the validation queue is full; each queued
+    # job holds its plaintext in memory.
+    if (prevalidation is None or prevalidation.outcome != PREVALIDATION_FLAG) and not document_validation_has_capacity():
+        raise HTTPException(
+            status_code=503,
+            detail="Rilono AI is validating many documents right now. Please try again in a minute.",
+            headers={"Retry-After": "30"},
+        )
+    
+    if key_wrapping_key is None:
+        # Generate or get user's encryption salt
+        salt_bytes = _ensure_user_salt(db, current_user)
+        key_wrapping_key = password_hashing_pool.run(derive_key_from_password, password, salt_bytes)
     
-    # Encrypt the file using Zero-Knowledge encryption
+    # Encrypt the file using Zero-Knowledge encryption. Chunks are encrypted as they
+    # are uploaded, so no whole-file ciphertext is buffered.
     try:
-        encrypted_file_data, encrypted_file_key = encrypt_file_with_user_password(
-            contents, password, salt_bytes
+        encrypted_blocks, encrypted_file_key = encrypt_stream_with_key_wrapping_key(
+            [contents], key_wrapping_key
         )
     except Exception as e:
         raise HTTPException(
@@ -245,116 +350,117 @@ async def upload_document(
     content_type = get_content_type(file.filename)
     
     # Upload ENCRYPTED file to R2 (stored as encrypted blob)
-    r2_key = upload_document_to_r2(encrypted_file_data, unique_filename, content_type, encrypted=True)
+    r2_key = upload_document_to_r2(encrypted_blocks, unique_filename, content_type, encrypted=True)
     
-    # Process document with Gemini AI for validation and text extraction
-    extracted_text_file_url = None
-    is_processed = False
-    validation_result = None
-    validation_message = None
-    is_valid = True
-    
-    try:
-        # Validate document type and extract information
-        validation_result = validate_and_extract_document(
-            contents,
-            original_filename,
-            content_type,
-            document_type,  # Pass the document type for validation
-            current_date_for_evaluation=datetime.now().isoformat(),
-        )
-        
-        if validation_result:
-            # Check validation result
-            is_valid = validation_result.get("Document Validation", "No").upper() == "YES"
-            validation_message = validation_result.get("Message", "")
-            
-            # Create JSON file with validation and extracted information
-            import json
-            validation_json = json.dumps(validation_result, indent=2)
-            extracted_text_bytes = validation_json.encode('utf-8')
-            encrypted_extracted_text_bytes = encrypt_artifact_bytes(extracted_text_bytes)
-            
-            # Generate unique filename for extracted text file
-            extracted_text_filename = f"user_{current_user.id}/{uuid.uuid4()}_extracted.txt"
-            
-            # Upload extracted text file to R2 as encrypted artifact payload.
-            extracted_text_r2_key = upload_document_to_r2(
-                encrypted_extracted_text_bytes,
-                extracted_text_filename, 
-                "application/octet-stream",
-                encrypted=True
-            )
-            
-            extracted_text_file_url = extracted_text_r2_key
-            is_processed = True
-        else:
-            # If validation_result is None (Gemini returned None), mark as invalid
-            is_valid = False
-            validation_message = "Document uploaded but validation could not be completed. Please verify your document manually."
-    except Exception as e:
-        # Log error but don't fail the upload if Gemini processing fails
-        print(f"Warning: Failed to process document with Gemini: {str(e)}")
-        is_valid = False  # Mark as invalid when processing fails
-        validation_message = "Document uploaded but validation failed. Please verify your document manually."
-        # Continue with document upload even if Gemini processing fails
-    
-    # Create database record with encrypted key
+    # Create database record with encrypted key. Validation fields are filled in by the
+    # background validation worker once Gemini has processed the document.
     db_document = models.Document(
         user_id=current_user.id,
         filename=r2_key,
         original_filename=original_filename,
         file_url=r2_key,  # Store R2 key, we'll generate presigned URLs when needed
-        file_size=len(encrypted_file_data),  # Store encrypted size
+        file_size=encrypted_size(len(contents)),  # Store encrypted size
         file_type=content_type,
         document_type=document_type,
         country=country,
         intake=intake,
         year=year,
         description=description,
-        is_processed=is_processed,
-        extracted_text_file_url=extracted_text_file_url,  # R2 key for extracted text file
+        is_processed=False,
+        extracted_text_file_url=None,
         encrypted_file_key=base64.b64encode(encrypted_file_key).decode('utf-8'),  # Store encrypted key
-        is_valid=is_valid,  # Store validation status from Gemini
-        validation_message=validation_message  # Store validation message from Gemini
+        is_valid=None,
+        validation_message=PENDING_VALIDATION_MESSAGE,
+        validation_status=VALIDATION_STATUS_PENDING,
+        validation_heartbeat_at=datetime.utcnow(),
     )
     
+    flagged = prevalidation is not None and prevalidation.outcome == PREVALIDATION_FLAG
+    cached_validation, validation_cache_key = None, None
+    if flagged:
+        apply_prevalidation_flag(db_document, prevalidation)
+    else:
+        try:
+            cached_validation, validation_cache_key = apply_cached_document_validation(
+                db, db_document, contents, bypass_cache=revalidate
+            )
+        except Exception as e:
+            print(f"Warning: Validation cache lookup failed: {str(e)}")
+            db.rollback()
+            cached_validation, validation_cache_key = None, None
+
     db.add(db_document)
+
+    # Count this successful upload toward subscription usage.
+    subscription.document_uploads_used += 1
+    mark_student_profile_stale(db, current_user.id)
     db.commit()
     db.refresh(db_document)
-    
+
     # Note: We don't generate a presigned URL here because the file is encrypted
     # Users will need to provide password to decrypt when viewing/downloading
     db_document.file_url = ""  # Empty URL - requires password to decrypt
+    invalidate_user_artifacts(current_user.id)
+
+    if flagged:
+        return schemas.DocumentUploadResponse(
+            document=db_document,
+            validation=schemas.DocumentValidationResponse(
+                is_valid=False,
+                status=VALIDATION_STATUS_COMPLETED,
+                message=prevalidation.message,
+                details=prevalidation.as_validation_details(),
+            )
+        )
+
+    if cached_validation is not None:
+        return schemas.DocumentUploadResponse(
+            document=db_document,
+            validation=schemas.DocumentValidationResponse(
+                is_valid=db_document.is_valid,
+                status=VALIDATION_STATUS_COMPLETED,
+                message=db_document.validation_message,
+                details=cached_validation,
+            )
+        )
+
+    queued = submit_document_validation(
+        document_id=db_document.id,
+        user_id=current_user.id,
+        file_contents=contents,
+        filename=original_filename,
+        content_type=content_type,
+        document_type=document_type,
+        cache_key=validation_cache_key,
+    )
+    if not queued:
+        # The queue filled up after the capacity check above (concurrent uploads).
+        db_document.is_valid = False
+        db_document.validation_message = BUSY_VALIDATION_MESSAGE
+        db_document.validation_status = VALIDATION_STATUS_FAILED
+        db.commit()
+        db.refresh(db_document)
+        db_document.file_url = ""
+        return schemas.DocumentUploadResponse(
+            document=db_document,
+            validation=schemas.DocumentValidationResponse(
+                is_valid=False,
+                status=VALIDATION_STATUS_FAILED,
+                message=BUSY_VALIDATION_MESSAGE,
+                details=None,
+            )
+        )
     
-    # Refresh the student profile in R2 to include the new document
-    # This ensures the AI chat has accurate document counts
-    try:
-        all_documents = db.query(models.Document).filter(
-            models.Document.user_id == current_user.id
-        ).all()
-        status_data = calculate_visa_journey_stage(all_documents, db)
-        save_student_profile_to_r2(current_user, status_data, all_documents, db=db)
-    except Exception as e:
-        # Don't fail the upload if profile refresh fails
-        print(f"Warning: Failed to refresh student profile after upload: {str(e)}")
-    
-    # Prepare response with validation information
-    response_data = schemas.DocumentUploadResponse(
+    return schemas.DocumentUploadResponse(
         document=db_document,
         validation=schemas.DocumentValidationResponse(
-            is_valid=is_valid,
-            message=validation_message,
-            details=validation_result if validation_result else None
+            is_valid=None,
+            status=VALIDATION_STATUS_PENDING,
+            message=PENDING_VALIDATION_MESSAGE,
+            details=None,
         )
     )
 
-    # Count this successful upload toward subscription usage.
-    subscription.document_uploads_used += 1
-    db.commit()
-    
-    return response_data
-
 @router.get("/my-documents", response_model=List[schemas.DocumentResponse])
 async def get_my_documents(
     current_user: models.User = Depends(get_current_active_user),
@@ -384,129 +490,27 @@ async def get_my_documents(
 # ========== VISA JOURNEY STATUS ENDPOINTS ==========
 # NOTE: These must be defined BEFORE /{document_id} to avoid route conflicts
 
-def _is_stage_completed(
-    stage_number: int,
-    uploaded_doc_types: set[str],
-    validated_doc_types: set[str],
-    document_types: list[dict],
-) -> bool:
-    stage_gate_docs = [
-        row
-        for row in document_types
-        if row.get("journey_stage") == stage_number and row.get("stage_gate_required")
-    ]
-    if not stage_gate_docs:
-        return True
-
-    def _has_document_for_rule(rule: dict) -> bool:
-        if rule.get("stage_gate_requires_validation"):
-            return rule["value"] in validated_doc_types
-        return rule["value"] in uploaded_doc_types
-
-    direct_required = [row for row in stage_gate_docs if not row.get("stage_gate_group")]
-    if any(not _has_document_for_rule(rule) for rule in direct_required):
-        return False
-
-    grouped_rules: dict[str, list[dict]] = {}
-    for row in stage_gate_docs:
-        group_key = row.get("stage_gate_group")
-        if not group_key:
-            continue
-        grouped_rules.setdefault(group_key, []).append(row)
-
-    for group_rules in grouped_rules.values():
-        if not any(_has_document_for_rule(rule) for rule in group_rules):
-            return False
-
-    return True
-
-
 def calculate_visa_journey_stage(documents: List[models.Document], db: Optional[Session] = None) -> dict:
     """
     Calculate the current visa journey stage based on uploaded documents.
     Returns stage info and progress details.
-    """
-    if db is not None:
-        ensure_default_document_type_catalog(db)
-        document_type_catalog = get_document_type_payload(db, active_only=True)
-    else:
-        document_type_catalog = []
-
-    if not document_type_catalog:
-        # Fallback to built-in defaults if DB is unavailable.
-        from app.document_catalog import DEFAULT_DOCUMENT_TYPES
-
-        document_type_catalog = [
-            {
-                "value": row["document_type"],
-                "label": row["label"],
-                "description": row.get("description"),
-                "sort_order": row["sort_order"],
-                "is_active": True,
-                "is_required": row.get("is_required", False),
-                "journey_stage": row.get("journey_stage"),
-                "stage_gate_required": row.get("stage_gate_required", False),
-                "stage_gate_requires_validation": row.get("stage_gate_requires_validation", False),
-                "stage_gate_group": row.get("stage_gate_group"),
-            }
-            for row in DEFAULT_DOCUMENT_TYPES
-        ]
 
-    journey_stages = build_journey_stages(document_type_catalog)
+    `documents` only needs id, document_type, is_valid, original_filename and
+    created_at, so projection rows from load_journey_document_rows() work too.
+    """
+    rules = get_compiled_journey_rules(db)
+    journey_stages = rules.journey_stages
 
     # Get uploaded document types.
     uploaded_doc_types = set(
         doc.document_type for doc in documents if doc.document_type
     )
-    validated_doc_types = set(
-        doc.document_type for doc in documents if doc.document_type and doc.is_valid is True
-    )
 
-    # Calculate current stage sequentially from stage gate rules.
-    current_stage = 1
-    completion_map: dict[int, bool] = {}
-    ordered_stages = sorted(journey_stages, key=lambda row: row["stage"])
-    for stage in ordered_stages:
-        stage_number = stage["stage"]
-        completion_map[stage_number] = _is_stage_completed(
-            stage_number,
-            uploaded_doc_types,
-            validated_doc_types,
-            document_type_catalog,
-        )
-
-    for stage in ordered_stages:
-        stage_number = stage["stage"]
-        if stage_number <= 1:
-            continue
-
-        previous_stage_number = stage_number - 1
-        previous_completed = completion_map.get(previous_stage_number, True)
-        this_completed = completion_map.get(stage_number, False)
-
-        # Progress to stage N only when stage N-1 is completed and stage N requirements are also met.
-        if previous_completed and this_completed:
-            current_stage = stage_number
-            continue
-        break
-
-    # Get current stage info
-    stage_info = next(
-        (stage for stage in journey_stages if stage["stage"] == current_stage),
-        journey_stages[0] if journey_stages else {},
-    )
-
-    # Calculate progress percentage
-    total_stages = len(journey_stages) if journey_stages else 1
-    completed_stage_count = 0
-    for stage in ordered_stages:
-        stage_number = stage["stage"]
-        if completion_map.get(stage_number):
-            completed_stage_count += 1
-            continue
-        break
-
-    progress_percent = round((completed_stage_count / max(total_stages, 1)) * 100)
+    result = rules.evaluate(*rules.masks_for((doc.document_type, doc.is_valid) for doc in documents))
+    current_stage = result.current_stage
+    total_stages = rules.total_stages
+    stage_info = rules.stage_info(current_stage)
+    progress_percent = rules.progress_percent(result)
 
     # Get documents by stage
     documents_by_stage = {}
@@ -529,7 +533,8 @@ def calculate_visa_journey_stage(documents: List[models.Document], db: Optional[
         "all_stages": journey_stages,
         "uploaded_document_types": list(uploaded_doc_types),
         "documents_by_type": documents_by_stage,
-        "total_documents_uploaded": len(documents)
+        "total_documents_uploaded": len(documents),
+        "catalog_version": rules.catalog_version,
     }
 
 
@@ -596,16 +601,15 @@ def _build_subscription_snapshot_for_profile(user_id: int, db: Session) -> dict:
     }
 
 
-def save_student_profile_to_r2(
+def build_student_profile_payload(
     user: models.User,
     status_data: dict,
     documents: List[models.Document],
     db: Optional[Session] = None,
-) -> str:
+) -> dict:
     """
-    Save comprehensive student profile and visa status as a JSON file to R2.
-    This file contains all information about the student for LLM context.
-    Returns the R2 key of the saved file.
+    Build the comprehensive student profile and visa status dict.
+    This contains all information about the student for LLM context.
     """
     # Use user's stored documentation preferences (fallback to document values if not set)
     preferred_country = getattr(user, 'preferred_country', None) or "United States"
@@ -671,69 +675,29 @@ def save_student_profile_to_r2(
         
         # Metadata
         "last_updated": datetime.utcnow().isoformat(),
+        "profile_version": user.profile_version or 0,
+        "catalog_version": status_data.get("catalog_version"),
         "version": "2.0"
     }
-    
-    # Convert to JSON
-    json_content = json.dumps(comprehensive_data, indent=2, default=str)
-    json_bytes = json_content.encode('utf-8')
-    encrypted_json_bytes = encrypt_artifact_bytes(json_bytes)
-    
-    # Descriptive filename for LLM to understand
-    r2_key = f"user_{user.id}/STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
-    
-    try:
-        r2_client.put_object(
-            Bucket=R2_DOCUMENTS_BUCKET,
-            Key=r2_key,
-            Body=encrypted_json_bytes,
-            ContentType="application/octet-stream",
-            Metadata={
-                'type': 'student-profile-visa-status',
-                'user-id': str(user.id),
-                'student-name': user.full_name or 'Unknown',
-                'encrypted': 'true'
-            }
-        )
-        return r2_key
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to save student profile to R2: {str(e)}")
+    return comprehensive_data
 
 
-def refresh_student_profile_snapshot_for_user(
+def save_student_profile_snapshot(
     user: models.User,
+    status_data: dict,
+    documents: List[models.Document],
     db: Session,
-) -> str:
-    documents = db.query(models.Document).filter(
-        models.Document.user_id == user.id
-    ).all()
-    status_data = calculate_visa_journey_stage(documents, db)
-    return save_student_profile_to_r2(user, status_data, documents, db=db)
-
-
-def refresh_student_profile_snapshot_for_user_id(user_id: int, db: Session) -> Optional[str]:
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        return None
-    return refresh_student_profile_snapshot_for_user(user=user, db=db)
-
-
-def get_student_profile_from_r2(user_id: int) -> Optional[dict]:
+) -> StudentProfileSnapshot:
     """
-    Get the student profile and visa status JSON file from R2.
-    Returns None if not found.
+    Render the comprehensive student profile and visa status JSON and store it
+    in student_profile_snapshots.
     """
-    r2_key = f"user_{user_id}/STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
-    
+    payload = build_student_profile_payload(user, status_data, documents, db=db)
     try:
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=r2_key)
-        encrypted_blob = response['Body'].read()
-        json_content = decrypt_artifact_bytes(encrypted_blob).decode('utf-8')
-        return json.loads(json_content)
-    except r2_client.exceptions.NoSuchKey:
-        return None
-    except Exception:
-        return None
+        return store_student_profile_snapshot(db, user, payload)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save student profile snapshot: {str(e)}")
 
 
 @router.get("/visa-status")
@@ -743,42 +707,15 @@ async def get_visa_journey_status(
 ):
     """
     Get the current visa journey status for the user.
-    Reads from R2 if exists, otherwise creates it (for new users).
-    Does NOT write to R2 on every load - only reads.
+    Stage data is calculated fresh from the database. The AI profile snapshot is
+    rendered lazily by its consumers, so this endpoint never writes.
     """
-    # First, try to get existing profile from R2
-    existing_profile = get_student_profile_from_r2(current_user.id)
-    
-    if existing_profile:
-        # Profile exists in R2 - just return it (no write needed)
-        # Calculate fresh stage data for UI display
-        documents = db.query(models.Document).filter(
-            models.Document.user_id == current_user.id
-        ).all()
-        status_data = calculate_visa_journey_stage(documents, db)
-        
-        # Merge with existing profile data
-        status_data["r2_key"] = f"user_{current_user.id}/STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
-        status_data["user_email"] = current_user.email
-        status_data["user_name"] = current_user.full_name
-        status_data["from_cache"] = True
-        
-        return JSONResponse(content=status_data)
-    
-    # Profile doesn't exist in R2 - create it for the first time
-    documents = db.query(models.Document).filter(
-        models.Document.user_id == current_user.id
-    ).all()
-    
+    documents = load_journey_document_rows(db, current_user.id)
     status_data = calculate_visa_journey_stage(documents, db)
     
-    # Create the R2 file for the first time
-    r2_key = save_student_profile_to_r2(current_user, status_data, documents, db=db)
-    
-    status_data["r2_key"] = r2_key
     status_data["user_email"] = current_user.email
     status_data["user_name"] = current_user.full_name
-    status_data["from_cache"] = False
+    status_data["profile_version"] = current_user.profile_version or 0
     
     return JSONResponse(content=status_data)
 
@@ -789,22 +726,19 @@ async def refresh_visa_journey_status(
     db: Session = Depends(get_db)
 ):
     """
-    Force refresh the visa journey status and save comprehensive profile to R2.
-    Use this after uploading new documents.
+    Force re-render of the visa journey status and comprehensive student profile snapshot.
     """
     # Get user's documents
-    documents = db.query(models.Document).filter(
-        models.Document.user_id == current_user.id
-    ).all()
+    documents = load_journey_document_rows(db, current_user.id)
     
     # Calculate current journey status
     status_data = calculate_visa_journey_stage(documents, db)
     
-    # Save comprehensive student profile to R2
-    r2_key = save_student_profile_to_r2(current_user, status_data, documents, db=db)
+    # Render and store the comprehensive student profile snapshot
+    snapshot = save_student_profile_snapshot(current_user, status_data, documents, db=db)
     
     # Add metadata to response
-    status_data["r2_key"] = r2_key
+    status_data["profile_version"] = snapshot.version
     status_data["user_email"] = current_user.email
     status_data["user_name"] = current_user.full_name
     status_data["refreshed_at"] = datetime.utcnow().isoformat()
@@ -814,21 +748,25 @@ async def refresh_visa_journey_status(
 
 @router.get("/visa-status/history")
 async def get_visa_status_from_storage(
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
 ):
     """
-    Get the last saved student profile and visa status from R2 storage.
-    Returns the cached status without recalculating.
+    Get the student profile and visa status snapshot.
+    Served from the stored snapshot when it is current, otherwise re-rendered once.
     """
-    status_data = get_student_profile_from_r2(current_user.id)
+    try:
+        snapshot = get_student_profile_snapshot(current_user, db)
+    except Exception:
+        snapshot = None
     
-    if not status_data:
+    if not snapshot:
         raise HTTPException(
             status_code=404,
             detail="No student profile found. Please visit your dashboard to generate one."
         )
     
-    return JSONResponse(content=status_data)
+    return JSONResponse(content=snapshot.data)
 
 
 # ========== DOCUMENT BY ID ENDPOINTS ==========
@@ -866,13 +804,14 @@ async def get_document(
 @router.post("/{document_id}/download")
 async def download_document(
     document_id: int,
-    password: str = Form(...),  # User's password for decryption
+    password: Optional[str] = Form(None),  # User's password for decryption
+    unlock_token: Optional[str] = Form(None),  # Or a session from /unlock
     current_user: models.User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     Download a document file. Users can only download their own documents.
-    Requires password for Zero-Knowledge decryption.
+    Requires the password, or an unlock_token from /unlock, for Zero-Knowledge decryption.
     """
     document = db.query(models.Document).filter(models.Document.id == document_id).first()
     
@@ -883,8 +822,11 @@ async def download_document(
     if document.user_id != current_user.id and not (current_user.is_admin or current_user.is_developer):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Verify password
-    if not verify_password(password, current_user.hashed_password):
+    # Verify password unless an unlock session already holds the key
+    key_wrapping_key = _unlock_session_key(current_user, password, unlock_token)
+    if key_wrapping_key is None and (
+        not password or not await averify_password(password, current_user.hashed_password)
+    ):
         raise HTTPException(
             status_code=401,
             detail="Incorrect password. Please provide your login password to decrypt the document."
@@ -894,8 +836,7 @@ async def download_document(
     if not document.encrypted_file_key:
         # Legacy unencrypted document - download directly
         try:
-            response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.filename)
-            file_content = response['Body'].read()
+            file_content = await document_storage.aget_bytes(document.filename)
             
             return StreamingResponse(
                 BytesIO(file_content),
@@ -909,31 +850,29 @@ async def download_document(
     
     # Zero-Knowledge encrypted document - decrypt it
     try:
-        # Get encrypted file from R2
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.filename)
-        encrypted_file_data = response['Body'].read()
-        
-        # Get user's salt
-        if not current_user.encryption_salt:
-            raise HTTPException(
-                status_code=500,
-                detail="Encryption salt not found. Cannot decrypt document."
-            )
-        salt_bytes = decode_salt_from_storage(current_user.encryption_salt)
+        if key_wrapping_key is None:
+            # Get user's salt
+            if not current_user.encryption_salt:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Encryption salt not found. Cannot decrypt document."
+                )
+            salt_bytes = decode_salt_from_storage(current_user.encryption_salt)
+            key_wrapping_key = await password_hashing_pool.arun(derive_key_from_password, password, salt_bytes)
         
         # Decrypt the encrypted file key
         encrypted_file_key = base64.b64decode(document.encrypted_file_key.encode('utf-8'))
         
-        # Decrypt the file
-        decrypted_file_data = decrypt_file_with_user_password(
-            encrypted_file_data,
+        # Stream the file from R2 in ranges, decrypting one chunk at a time
+        decrypted_blocks = await asyncio.to_thread(
+            _open_decrypted_document_stream,
+            document.filename,
             encrypted_file_key,
-            password,
-            salt_bytes
+            key_wrapping_key,
         )
         
         return StreamingResponse(
-            BytesIO(decrypted_file_data),
+            decrypted_blocks,
             media_type=document.file_type or "application/octet-stream",
             headers={
                 "Content-Disposition": f'attachment; filename="{document.original_filename}"'
@@ -977,8 +916,7 @@ async def get_extracted_text(
     
     try:
         # Get extracted text file from R2 and decrypt artifact payload if needed.
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.extracted_text_file_url)
-        encrypted_blob = response['Body'].read()
+        encrypted_blob = await document_storage.aget_bytes(document.extracted_text_file_url)
         file_content = decrypt_artifact_bytes(encrypted_blob)
         
         return StreamingResponse(
@@ -991,8 +929,116 @@ async def get_extracted_text(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download extracted text: {str(e)}")
 
+@router.get("/{document_id}/validation-status", response_model=schemas.DocumentValidationStatusResponse)
+def get_document_validation_status(
+    document_id: int,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Poll the background validation result for a document.
+    Extracted details are only attached once validation has completed.
+    """
+    document = db.query(models.Document).filter(models.Document.id == document_id).first()
+
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # Security: Users can only access their own documents (unless admin)
+    if document.user_id != current_user.id and not (current_user.is_admin or current_user.is_developer):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    validation_status = document.validation_status or VALIDATION_STATUS_COMPLETED
+    details = None
+    if validation_status == VALIDATION_STATUS_COMPLETED and document.extracted_text_file_url:
+        try:
+            details = json.loads(load_artifact(document_storage, document.extracted_text_file_url).decode('utf-8'))
+        except Exception as e:
+            print(f"Warning: Failed to load validation details for document {document.id}: {str(e)}")
+
+    return schemas.DocumentValidationStatusResponse(
+        document_id=document.id,
+        validation_status=validation_status,
+        is_valid=document.is_valid,
+        is_processed=bool(document.is_processed),
+        message=document.validation_message,
+        details=details if isinstance(details, dict) else None,
+    )
+
 # ========== ADMIN/DEVELOPER ENDPOINTS ==========
 
+@router.get("/admin/validation-cache-stats")
+def get_validation_cache_statistics(
+    current_user: models.User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Hit/miss counters and size of the memoized document validation cache (admin/developer only)."""
+    return get_validation_cache_stats(db)
+
+@router.get("/admin/prevalidation-stats")
+def get_prevalidation_statistics(
+    current_user: models.User = Depends(get_current_admin_user),
+):
+    """Local pre-validation outcomes and the share of uploads that skipped Gemini (admin/developer only)."""
+    return get_prevalidation_stats()
+
+@router.post("/admin/catalog/refresh")
+def refresh_document_catalog_admin(
+    current_user: models.User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Publish document catalog edits (admin/developer only).
+    Bumps the catalog version so every worker reloads its in-memory catalog snapshot.
+    """
+    version = invalidate_document_catalog(db)
+    snapshot = get_document_catalog_snapshot(db)
+    return {
+        "catalog_version": version,
+        "etag": snapshot.etag,
+        "document_types": len(snapshot.document_types),
+    }
+
+@router.get("/admin/journey-stages")
+def get_journey_stage_overview_admin(
+    user_ids: Optional[List[int]] = Query(None),
+    current_user: models.User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Visa journey stage distribution across users (admin/developer only).
+    Pass user_ids to also get each listed user's current stage.
+    """
+    rules = get_compiled_journey_rules(db)
+    stages = compute_stages_for_users(db, user_ids)
+
+    distribution = {stage_number: 0 for stage_number in rules.stage_numbers}
+    for result in stages.values():
+        distribution[result.current_stage] = distribution.get(result.current_stage, 0) + 1
+
+    response = {
+        "catalog_version": rules.catalog_version,
+        "total_users": len(stages),
+        "stage_distribution": [
+            {
+                "stage": stage_number,
+                "name": rules.stage_info(stage_number).get("name"),
+                "users": count,
+            }
+            for stage_number, count in sorted(distribution.items())
+        ],
+    }
+    if user_ids is not None:
+        response["users"] = [
+            {
+                "user_id": user_id,
+                "current_stage": result.current_stage,
+                "progress_percent": rules.progress_percent(result),
+            }
+            for user_id, result in stages.items()
+        ]
+    return response
+
 @router.get("/admin/all", response_model=schemas.DocumentListResponse)
 async def get_all_documents_admin(
     page: int = Query(1, ge=1),
@@ -1074,8 +1120,7 @@ async def download_document_admin(
     
     try:
         # Get file from R2
-        response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.filename)
-        file_content = response['Body'].read()
+        file_content = await document_storage.aget_bytes(document.filename)
         
         return StreamingResponse(
             BytesIO(file_content),
@@ -1109,7 +1154,7 @@ async def delete_document(
     try:
         # Delete original file from R2
         try:
-            r2_client.delete_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.filename)
+            await document_storage.adelete(document.filename)
         except Exception as r2_error:
             # Log the error but continue with database deletion
             # The file might already be deleted or not exist
@@ -1118,25 +1163,17 @@ async def delete_document(
         # Delete extracted text file from R2 if it exists
         if document.extracted_text_file_url:
             try:
-                r2_client.delete_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.extracted_text_file_url)
+                await document_storage.adelete(document.extracted_text_file_url)
             except Exception as r2_error:
                 # Log the error but continue with database deletion
                 print(f"Warning: Failed to delete extracted text file from R2: {str(r2_error)}")
         
         # Delete from database
+        document_owner_id = document.user_id
         db.delete(document)
+        mark_student_profile_stale(db, document_owner_id)
         db.commit()
-        
-        # Refresh the student profile in R2 to update document counts
-        try:
-            all_documents = db.query(models.Document).filter(
-                models.Document.user_id == current_user.id
-            ).all()
-            status_data = calculate_visa_journey_stage(all_documents, db)
-            save_student_profile_to_r2(current_user, status_data, all_documents, db=db)
-        except Exception as refresh_error:
-            # Don't fail the delete if profile refresh fails
-            print(f"Warning: Failed to refresh student profile after delete: {str(refresh_error)}")
+        invalidate_user_artifacts(document_owner_id)
         
         return None
     except Exception as e:
@@ -1155,37 +1192,26 @@ async def delete_document_admin(
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Get the document owner for profile refresh
+    # Get the document owner for profile invalidation
     document_owner_id = document.user_id
     
     try:
         # Delete original file from R2
-        r2_client.delete_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.filename)
+        await document_storage.adelete(document.filename)
         
         # Delete extracted text file from R2 if it exists
         if document.extracted_text_file_url:
             try:
-                r2_client.delete_object(Bucket=R2_DOCUMENTS_BUCKET, Key=document.extracted_text_file_url)
+                await document_storage.adelete(document.extracted_text_file_url)
             except Exception as r2_error:
                 # Log the error but continue with database deletion
                 print(f"Warning: Failed to delete extracted text file from R2: {str(r2_error)}")
         
         # Delete from database
         db.delete(document)
+        mark_student_profile_stale(db, document_owner_id)
         db.commit()
-        
-        # Refresh the document owner's student profile in R2
-        try:
-            document_owner = db.query(models.User).filter(models.User.id == document_owner_id).first()
-            if document_owner:
-                all_documents = db.query(models.Document).filter(
-                    models.Document.user_id == document_owner_id
-                ).all()
-                status_data = calculate_visa_journey_stage(all_documents, db)
-                save_student_profile_to_r2(document_owner, status_data, all_documents, db=db)
-        except Exception as refresh_error:
-            # Don't fail the delete if profile refresh fails
-            print(f"Warning: Failed to refresh student profile after admin delete: {str(refresh_error)}")
+        invalidate_user_artifacts(document_owner_id)
         
         return None
     except Exception as e:
@@ -218,6 +218,8 @@ def _generate_content_with_grounding(model: Any, prompt: str, model_name: str, l
     This helper is intentionally used only by News/Interview endpoints.
     """
     grounding_errors: List[str] = []
+    # Metrics are grouped by endpoint family ("news", "interviews"), not per label.
+    call_site = "interviews" if "interview" in label else "news"
     _log_gemini_prompt(label, model_name, prompt, extra="grounding=enabled")
 
     # Vertex AI grounding path
@@ -228,7 +230,7 @@ def _generate_content_with_grounding(model: Any, prompt: str, model_name: str, l
             tool = Tool.from_google_search_retrieval(
                 grounding.GoogleSearchRetrieval()
             )
-            response = model.generate_content(prompt, tools=[tool])
+            response = gemini_utils.gemini_client.generate(call_site, prompt, model=model, tools=[tool])
             _log_gemini_response(label, model_name, response, extra="grounding_method=vertex_google_search_retrieval")
             return response
         except Exception as exc:
@@ -240,7 +242,7 @@ def _generate_content_with_grounding(model: Any, prompt: str, model_name: str, l
                 tool = gemini_utils.genai.protos.Tool(
                     google_search_retrieval=gemini_utils.genai.protos.GoogleSearchRetrieval()
                 )
-                response = model.generate_content(prompt, tools=[tool])
+                response = gemini_utils.gemini_client.generate(call_site, prompt, model=model, tools=[tool])
                 _log_gemini_response(label, model_name, response, extra="grounding_method=genai_protos_tool")
                 return response
             except Exception as exc:
@@ -248,7 +250,7 @@ def _generate_content_with_grounding(model: Any, prompt: str, model_name: str, l
 
             # Alternate dict-style tool format for compatibility with some SDK builds.
             try:
-                response = model.generate_content(prompt, tools=[{"google_search_retrieval": {}}])
+                response = gemini_utils.gemini_client.generate(call_site, prompt, model=model, tools=[{"google_search_retrieval": {}}])
                 _log_gemini_response(label, model_name, response, extra="grounding_method=genai_dict_tool")
                 return response
             except Exception as exc:
@@ -256,7 +258,7 @@ def _generate_content_with_grounding(model: Any, prompt: str, model_name: str, l
 
     # Fallback to non-grounded generation if grounding tool failed.
     try:
-        response = model.generate_content(prompt)
+        response = gemini_utils.gemini_client.generate(call_site, prompt, model=model)
         _log_gemini_response(
             label,
             model_name,
@@ -322,13 +324,9 @@ Provide 4 to 8 items."""
 
     for model_name in model_candidates:
         try:
-            if gemini_utils.USE_VERTEX_AI and gemini_utils.VERTEX_AI_AVAILABLE:
-                from vertexai.generative_models import GenerativeModel
-                model = GenerativeModel(model_name)
-            elif gemini_utils.GENAI_AVAILABLE and gemini_utils.genai:
-                model = gemini_utils.genai.GenerativeModel(model_name)
-            else:
+            if gemini_utils.gemini_client.provider is None:
                 raise HTTPException(status_code=503, detail="Gemini library is not available")
+            model = gemini_utils.gemini_client.get_model(model_name)
 
             response = _generate_content_with_grounding(model, prompt, model_name=model_name, label="news.f1_latest")
             data = _clean_and_parse_json(getattr(response, "text", ""))
@@ -408,13 +406,9 @@ Provide 5 to 10 items."""
 
     for model_name in model_candidates:
         try:
-            if gemini_utils.USE_VERTEX_AI and gemini_utils.VERTEX_AI_AVAILABLE:
-                from vertexai.generative_models import GenerativeModel
-                model = GenerativeModel(model_name)
-            elif gemini_utils.GENAI_AVAILABLE and gemini_utils.genai:
-                model = gemini_utils.genai.GenerativeModel(model_name)
-            else:
+            if gemini_utils.gemini_client.provider is None:
                 raise HTTPException(status_code=503, detail="Gemini library is not available")
+            model = gemini_utils.gemini_client.get_model(model_name)
 
             response = _generate_content_with_grounding(
                 model,
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app import models, schemas
-from app.auth import get_current_active_user, get_current_admin_user
+from app.auth import AuthenticatedUser, get_active_authenticated_user, get_current_admin_user
 from app.database import get_db
 from app.notification_center import (
     delete_all_user_notifications,
@@ -19,7 +19,7 @@ router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 @router.get("", response_model=schemas.NotificationListResponse)
 def get_my_notifications(
     limit: int = Query(default=50, ge=1, le=200),
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: AuthenticatedUser = Depends(get_active_authenticated_user),
     db: Session = Depends(get_db),
 ):
     notifications = list_user_notifications(db, current_user.id, limit=limit)
@@ -30,7 +30,7 @@ def get_my_notifications(
 @router.post("/{notification_id}/read")
 def mark_notification_read(
     notification_id: int,
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: AuthenticatedUser = Depends(get_active_authenticated_user),
     db: Session = Depends(get_db),
 ):
     notification = mark_user_notification_read(db, current_user.id, notification_id)
@@ -47,7 +47,7 @@ def mark_notification_read(
 
 @router.post("/read-all")
 def mark_all_notifications_read(
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: AuthenticatedUser = Depends(get_active_authenticated_user),
     db: Session = Depends(get_db),
 ):
     updated_count = mark_all_user_notifications_read(db, current_user.id)
@@ -60,7 +60,7 @@ def mark_all_notifications_read(
 
 @router.delete("")
 def clear_all_notifications(
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: AuthenticatedUser = Depends(get_active_authenticated_user),
     db: Session = Depends(get_db),
 ):
     deleted_count = delete_all_user_notifications(db, current_user.id)
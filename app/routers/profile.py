@@ -6,12 +6,15 @@ from app.database import get_db
 from app import models, schemas
 from app.auth import (
     get_current_active_user,
-    verify_password,
-    get_password_hash,
+    verify_password_offloaded,
+    get_password_hash_offloaded,
     validate_password_strength,
 )
 from app.referrals import ensure_user_referral_code
+from app.services.student_profile import mark_student_profile_stale
+from app.services.validation_cache import delete_user_validation_cache
 from app.utils.rate_limiter import check_ip_rate_limit
+from app.utils.security import unlock_sessions
 
 router = APIRouter(prefix="/api/profile", tags=["profile"])
 CHANGE_PASSWORD_RATE_LIMIT = int(os.getenv("CHANGE_PASSWORD_RATE_LIMIT", "5"))
@@ -110,6 +113,7 @@ def update_profile(
                 )
             setattr(current_user, field, value)
     
+    mark_student_profile_stale(db, current_user.id)
     db.commit()
     db.refresh(current_user)
     return current_user
@@ -138,10 +142,10 @@ def change_password(
     if not new_password:
         raise HTTPException(status_code=400, detail="New password is required.")
 
-    if not verify_password(current_password, current_user.hashed_password):
+    if not verify_password_offloaded(current_password, current_user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect.")
 
-    if verify_password(new_password, current_user.hashed_password):
+    if verify_password_offloaded(new_password, current_user.hashed_password):
         raise HTTPException(
             status_code=400,
             detail="New password must be different from your current password."
@@ -152,7 +156,9 @@ def change_password(
         raise HTTPException(status_code=400, detail=password_error)
 
     try:
-        current_user.hashed_password = get_password_hash(new_password)
+        current_user.hashed_password = get_password_hash_offloaded(new_password)
+    except HTTPException:
+        raise
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
     except Exception:
@@ -165,6 +171,7 @@ def change_password(
     current_user.password_reset_token = None
     current_user.password_reset_token_expires = None
     db.commit()
+    unlock_sessions.revoke_user(current_user.id)
 
     return {
         "message": "Password changed successfully. Please log in again on any other devices for security."
@@ -195,6 +202,7 @@ def update_documentation_preferences(
     if preferences.year:
         current_user.preferred_year = preferences.year
     
+    mark_student_profile_stale(db, current_user.id)
     db.commit()
     db.refresh(current_user)
     
@@ -249,6 +257,7 @@ def delete_account(
     user_id = current_user.id
     
     # Delete the user explicitly; related documents will be removed by cascade
+    delete_user_validation_cache(db, user_id)
     db.delete(current_user)
     db.commit()
     
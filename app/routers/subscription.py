@@ -15,7 +15,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app import models, schemas
-from app.auth import get_current_active_user
+from app.auth import AuthenticatedUser, get_active_authenticated_user, get_current_active_user
 from app.database import get_db
 from app.email_service import (
     build_email_notifications_unsubscribe_url,
@@ -29,6 +29,7 @@ from app.subscriptions import (
     get_plan_limits,
     grant_pro_access_for_days,
 )
+from app.services.student_profile import mark_student_profile_stale
 from app.utils.rate_limiter import check_ip_rate_limit
 
 router = APIRouter(prefix="/api/subscription", tags=["subscription"])
@@ -870,6 +871,7 @@ def _finalize_verified_payment(
 
     # Reflect the latest successful paid activation/renewal event in UI.
     subscription.started_at = now
+    mark_student_profile_stale(db, user_id)
     db.commit()
     db.refresh(subscription)
     return subscription
@@ -968,25 +970,9 @@ def _send_subscription_change_email_safe(
         )
 
 
-def _refresh_student_profile_snapshot_safe(db: Session, user_id: int) -> None:
-    """
-    Best-effort sync of STUDENT_PROFILE_AND_F1_VISA_STATUS.json after subscription changes.
-    Never raises to avoid breaking payment/subscription flows.
-    """
-    try:
-        from app.routers.documents import refresh_student_profile_snapshot_for_user_id
-
-        refresh_student_profile_snapshot_for_user_id(user_id=user_id, db=db)
-    except Exception:
-        logger.exception(
-            "Failed to refresh STUDENT_PROFILE_AND_F1_VISA_STATUS.json for user_id=%s",
-            user_id,
-        )
-
-
 @router.get("/me", response_model=schemas.SubscriptionResponse)
 def get_my_subscription(
-    current_user: models.User = Depends(get_current_active_user),
+    current_user: AuthenticatedUser = Depends(get_active_authenticated_user),
     db: Session = Depends(get_db),
 ):
     subscription = get_or_create_user_subscription(db, current_user.id)
@@ -1228,6 +1214,7 @@ def upgrade_to_pro(
         )
         subscription.started_at = now
         db.add(payment_row)
+        mark_student_profile_stale(db, current_user.id)
         db.commit()
         db.refresh(subscription)
 
@@ -1243,7 +1230,6 @@ def upgrade_to_pro(
                 payment_amount_paise=0,
                 payment_currency=currency,
             )
-        _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
 
         return {
             "action": "coupon_activated",
@@ -1510,7 +1496,6 @@ def verify_payment_and_activate_pro(
             payment_amount_paise=int(payment_row.amount_paise or 0),
             payment_currency=_normalize_currency(payment_row.currency or "INR"),
         )
-    _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
     return _build_subscription_response(subscription)
 
 
@@ -1693,7 +1678,6 @@ def verify_recurring_payment_and_activate_pro(
             payment_amount_paise=int(payment_data.get("amount", 0) or 0),
             payment_currency=_normalize_currency(payment_data.get("currency", "")),
         )
-    _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
     return _build_subscription_response(subscription)
 
 
@@ -1846,7 +1830,6 @@ def _handle_recurring_payment_webhook(
             payment_amount_paise=int(payment_data.get("amount", 0) or 0),
             payment_currency=_normalize_currency(payment_data.get("currency", "")),
         )
-    _refresh_student_profile_snapshot_safe(db=db, user_id=user.id)
     return {"status": "ok"}
 
 
@@ -1904,6 +1887,7 @@ def _handle_subscription_lifecycle_webhook(
             subscription.ends_at = provider_period_end
         else:
             _downgrade_to_free(subscription)
+        mark_student_profile_stale(db, user.id)
         db.commit()
         db.refresh(subscription)
         after_snapshot = _subscription_change_snapshot(subscription)
@@ -1917,15 +1901,17 @@ def _handle_subscription_lifecycle_webhook(
                 next_renewal_at=_subscription_next_renewal_at(subscription_data),
                 payment_status=str(status or "updated"),
             )
-        _refresh_student_profile_snapshot_safe(db=db, user_id=user.id)
         return {"status": "ok"}
 
     updated_subscription = _apply_pro_access_from_provider_period(
         db=db,
         user_id=user.id,
         razorpay_subscription_data=subscription_data,
-        commit=True,
+        commit=False,
     )
+    mark_student_profile_stale(db, user.id)
+    db.commit()
+    db.refresh(updated_subscription)
     after_snapshot = _subscription_change_snapshot(updated_subscription)
     if before_snapshot != after_snapshot:
         if after_snapshot["status"] == "canceled" and before_snapshot["status"] != "canceled":
@@ -1942,7 +1928,6 @@ def _handle_subscription_lifecycle_webhook(
             next_renewal_at=_subscription_next_renewal_at(subscription_data),
             payment_status=str(status or "updated"),
         )
-    _refresh_student_profile_snapshot_safe(db=db, user_id=user.id)
     return {"status": "ok"}
 
 
@@ -2094,7 +2079,6 @@ async def razorpay_webhook(
                 payment_amount_paise=int(payment_entity.get("amount", 0) or 0),
                 payment_currency=_normalize_currency(payment_entity.get("currency", "")),
             )
-        _refresh_student_profile_snapshot_safe(db=db, user_id=user.id)
     except HTTPException:
         _mark_payment_failed(db, payment_row, "webhook_validation_failed")
         return {"status": "ignored", "reason": "validation_failed"}
@@ -2140,8 +2124,11 @@ def cancel_my_subscription(
             db=db,
             user_id=current_user.id,
             razorpay_subscription_data=subscription_data,
-            commit=True,
+            commit=False,
         )
+        mark_student_profile_stale(db, current_user.id)
+        db.commit()
+        db.refresh(updated_subscription)
         after_snapshot = _subscription_change_snapshot(updated_subscription)
         if before_snapshot != after_snapshot:
             _send_subscription_change_email_safe(
@@ -2151,7 +2138,6 @@ def cancel_my_subscription(
                 auto_renew_enabled=_is_provider_auto_renew_enabled(subscription_data),
                 next_renewal_at=_subscription_next_renewal_at(subscription_data),
             )
-        _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
         return _build_subscription_response(
             updated_subscription,
             auto_renew_enabled=_is_provider_auto_renew_enabled(subscription_data),
@@ -2160,6 +2146,7 @@ def cancel_my_subscription(
 
     # Legacy one-time Pro subscriptions (without recurring subscription id) downgrade immediately.
     _downgrade_to_free(subscription)
+    mark_student_profile_stale(db, current_user.id)
     db.commit()
     db.refresh(subscription)
     after_snapshot = _subscription_change_snapshot(subscription)
@@ -2170,7 +2157,6 @@ def cancel_my_subscription(
             subscription=subscription,
             auto_renew_enabled=False,
         )
-    _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
     return _build_subscription_response(subscription, auto_renew_enabled=False, recurring_subscription_status=None)
 
 
@@ -2210,7 +2196,7 @@ def consume_session_quota(
             )
         subscription.mock_interviews_used += 1
 
+    mark_student_profile_stale(db, current_user.id)
     db.commit()
     db.refresh(subscription)
-    _refresh_student_profile_snapshot_safe(db=db, user_id=current_user.id)
     return _build_subscription_response(subscription)
@@ -6,31 +6,15 @@ from typing import List
 import os
 import uuid
 from pathlib import Path
-import boto3
-from botocore.config import Config
+from app.utils.object_storage import R2_BUCKET_NAME, R2_ENDPOINT_URL, get_image_storage
 
 router = APIRouter(prefix="/api/upload", tags=["upload"])
 
 # R2 Configuration from environment variables
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID", "1dfccbb465ae188db13dc9f92cc60b3b")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID", "")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "")
-R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "images")
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL", f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "")  # Set this to your public URL (custom domain or pub-xxxxx.r2.dev)
 
-# Initialize R2 client (required)
-if not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
-    raise ValueError("R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY must be set in environment variables")
-
-r2_client = boto3.client(
-    's3',
-    endpoint_url=R2_ENDPOINT_URL,
-    aws_access_key_id=R2_ACCESS_KEY_ID,
-    aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-    region_name='auto',
-    config=Config(signature_version='s3v4')
-)
+# Shared, connection-pooled object storage for the images bucket (required)
+image_storage = get_image_storage()
 
 if not R2_PUBLIC_URL:
     raise ValueError("R2_PUBLIC_URL must be set in environment variables for image URLs to work")
@@ -43,18 +27,17 @@ def is_allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return Path(filename).suffix.lower() in ALLOWED_EXTENSIONS
 
-def upload_to_r2(file_contents: bytes, filename: str) -> str:
+async def upload_to_r2(file_contents: bytes, filename: str) -> str:
     """Upload file to R2 and return public URL"""
     try:
-        r2_client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=filename,
-            Body=file_contents,
-            ContentType='image/jpeg' if filename.endswith(('.jpg', '.jpeg')) else 
-                       'image/png' if filename.endswith('.png') else
-                       'image/gif' if filename.endswith('.gif') else
-                       'image/webp' if filename.endswith('.webp') else
-                       'application/octet-stream'
+        await image_storage.aput_bytes(
+            filename,
+            file_contents,
+            content_type='image/jpeg' if filename.endswith(('.jpg', '.jpeg')) else 
+                         'image/png' if filename.endswith('.png') else
+                         'image/gif' if filename.endswith('.gif') else
+                         'image/webp' if filename.endswith('.webp') else
+                         'application/octet-stream'
         )
         
         # Return public URL
@@ -95,7 +78,7 @@ async def upload_image(
     unique_filename = f"{uuid.uuid4()}{file_extension}"
     
     # Upload to R2 (required)
-    image_url = upload_to_r2(contents, unique_filename)
+    image_url = await upload_to_r2(contents, unique_filename)
     
     return {"url": image_url, "filename": unique_filename}
 
@@ -130,7 +113,7 @@ async def upload_images(
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         
         # Upload to R2 (required)
-        image_url = upload_to_r2(contents, unique_filename)
+        image_url = await upload_to_r2(contents, unique_filename)
         
         uploaded_images.append({"url": image_url, "filename": unique_filename})
     
@@ -165,7 +148,7 @@ async def upload_profile_picture(
     unique_filename = f"profile_{current_user.id}_{uuid.uuid4()}{file_extension}"
     
     # Upload to R2 (required)
-    image_url = upload_to_r2(contents, unique_filename)
+    image_url = await upload_to_r2(contents, unique_filename)
     
     return {"url": image_url, "filename": unique_filename}
 
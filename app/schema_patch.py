@@ -41,6 +41,9 @@ def ensure_user_legal_consent_column():
         if "email_notifications_unsubscribe_reason" not in columns:
             conn.execute(text("ALTER TABLE users ADD COLUMN email_notifications_unsubscribe_reason TEXT"))
 
+        if "profile_version" not in columns:
+            conn.execute(text("ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 0"))
+
 
 def ensure_subscription_usage_columns():
     """
@@ -71,6 +74,53 @@ def ensure_document_catalog_columns():
                 )
             )
 
+        if "prevalidation_rules" not in columns:
+            conn.execute(text("ALTER TABLE document_type_catalog ADD COLUMN prevalidation_rules TEXT"))
+
+
+def ensure_document_validation_status_column():
+    """
+    Patch documents table schema for the background validation pipeline.
+    """
+    with engine.begin() as conn:
+        columns = _get_table_columns(conn, "documents")
+
+        if "validation_status" not in columns:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN validation_status VARCHAR"))
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS ix_documents_validation_status "
+                    "ON documents (validation_status)"
+                )
+            )
+
+        if "validation_heartbeat_at" not in columns:
+            conn.execute(text("ALTER TABLE documents ADD COLUMN validation_heartbeat_at TIMESTAMP"))
+
+
+def ensure_daily_notification_run_columns():
+    """
+    Patch ai_daily_notification_runs and run item schema for run progress tracking.
+    """
+    with engine.begin() as conn:
+        item_columns = _get_table_columns(conn, "ai_daily_notification_run_items")
+        if item_columns and "email_error" not in item_columns:
+            conn.execute(text("ALTER TABLE ai_daily_notification_run_items ADD COLUMN email_error TEXT"))
+
+        columns = _get_table_columns(conn, "ai_daily_notification_runs")
+
+        if "users_total" not in columns:
+            conn.execute(text("ALTER TABLE ai_daily_notification_runs ADD COLUMN users_total INTEGER NOT NULL DEFAULT 0"))
+
+        if "users_failed" not in columns:
+            conn.execute(text("ALTER TABLE ai_daily_notification_runs ADD COLUMN users_failed INTEGER NOT NULL DEFAULT 0"))
+
+        if "users_unchanged" not in columns:
+            conn.execute(text("ALTER TABLE ai_daily_notification_runs ADD COLUMN users_unchanged INTEGER NOT NULL DEFAULT 0"))
+
+        if "last_progress_at" not in columns:
+            conn.execute(text("ALTER TABLE ai_daily_notification_runs ADD COLUMN last_progress_at TIMESTAMP"))
+
 
 def ensure_subscription_payment_recurring_columns():
     """
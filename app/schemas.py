@@ -197,6 +197,7 @@ class DocumentResponse(BaseModel):
     extracted_text_file_url: Optional[str] = None
     is_valid: Optional[bool] = None
     validation_message: Optional[str] = None
+    validation_status: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     uploader: UserResponse
@@ -205,7 +206,17 @@ class DocumentResponse(BaseModel):
         from_attributes = True
 
 class DocumentValidationResponse(BaseModel):
-    is_valid: bool
+    is_valid: Optional[bool] = None
+    status: str = "completed"  # pending | processing | completed | failed
+    message: Optional[str] = None
+    details: Optional[dict] = None
+
+
+class DocumentValidationStatusResponse(BaseModel):
+    document_id: int
+    validation_status: str
+    is_valid: Optional[bool] = None
+    is_processed: bool
     message: Optional[str] = None
     details: Optional[dict] = None
 
@@ -213,6 +224,10 @@ class DocumentUploadResponse(BaseModel):
     document: DocumentResponse
     validation: DocumentValidationResponse
 
+class DocumentUnlockResponse(BaseModel):
+    unlock_token: str
+    expires_in: int
+
 class DocumentListResponse(BaseModel):
     documents: List[DocumentResponse]
     total: int
@@ -231,6 +246,7 @@ class DocumentTypeCatalogItem(BaseModel):
     stage_gate_required: bool
     stage_gate_requires_validation: bool
     stage_gate_group: Optional[str] = None
+    prevalidation_rules: Optional[dict] = None
 
 
 class JourneyStageDefinition(BaseModel):
@@ -0,0 +1,241 @@
+"""
+Artifact key rotation.
+
+Walks the documents bucket one user prefix (user_<id>/) at a time. Each server
+artifact it finds is re-encrypted under the current artifact key in the V2
+format, whether it is legacy plaintext, V1, or V2 under an old key. Student
+profile snapshots in the database are rotated the same way.
+
+Uploaded documents share the prefixes but are zero-knowledge: their keys are
+wrapped with the user's password, so they cannot be re-encrypted server-side.
+They are counted by format (chunked vs legacy Fernet) and left untouched.
+
+Progress is checkpointed per completed prefix, so an interrupted run resumes
+where it stopped.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from app.utils.chunked_encryption import is_chunked_ciphertext
+from app.utils.secure_artifacts import ArtifactKeyring
+
+ARTIFACT_OBJECT_SUFFIX = "_extracted.txt"
+USER_PREFIX = "user_"
+SNAPSHOT_BATCH_SIZE = 200
+
+
+class RotationStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters = {
+            "prefixes": 0,
+            "objects_scanned": 0,
+            "rotated": 0,
+            "already_current": 0,
+            "failed": 0,
+            "bytes_rewritten": 0,
+            "documents_chunked": 0,
+            "documents_legacy": 0,
+            "snapshots_rotated": 0,
+            "snapshots_failed": 0,
+        }
+        self.failures: list[tuple[str, str]] = []
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self.counters[name] += value
+
+    def fail(self, key: str, exc: Exception) -> None:
+        with self._lock:
+            self.counters["failed"] += 1
+            self.failures.append((key, str(exc)))
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def objects_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.counters["objects_scanned"] / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "elapsed_seconds": round(self.elapsed_seconds, 3),
+                "objects_per_second": round(self.objects_per_second, 1),
+            }
+
+
+class _Checkpoint:
+    """Completed prefixes as an append-only log, one line per prefix."""
+
+    SNAPSHOTS_MARKER = "#snapshots"
+
+    def __init__(self, path: Optional[str]) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.completed: set[str] = set()
+        self.snapshots_done = False
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    entry = line.rstrip("\n")
+                    if entry == self.SNAPSHOTS_MARKER:
+                        self.snapshots_done = True
+                    elif entry:
+                        self.completed.add(entry)
+
+    def _append(self, entry: str) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(entry + "\n")
+
+    def mark_prefix(self, prefix: str) -> None:
+        self.completed.add(prefix)
+        self._append(prefix)
+
+    def mark_snapshots(self) -> None:
+        self.snapshots_done = True
+        self._append(self.SNAPSHOTS_MARKER)
+
+
+class ArtifactRotationJob:
+    def __init__(
+        self,
+        storage,
+        keyring: ArtifactKeyring,
+        checkpoint_path: Optional[str] = None,
+        concurrency: int = 8,
+        dry_run: bool = False,
+        prefix: str = USER_PREFIX,
+        limit_prefixes: Optional[int] = None,
+    ) -> None:
+        self.storage = storage
+        self.keyring = keyring
+        self.concurrency = max(1, concurrency)
+        self.dry_run = dry_run
+        self.prefix = prefix
+        self.limit_prefixes = limit_prefixes
+        # A dry run never records progress, so it can be repeated freely.
+        self.checkpoint = _Checkpoint(None if dry_run else checkpoint_path)
+        self.stats = RotationStats()
+
+    def _rotate_object(self, key: str) -> None:
+        if not key.endswith(ARTIFACT_OBJECT_SUFFIX):
+            # Uploaded document: only inspect its header.
+            head = next(iter(self.storage.iter_bytes(key, range_size=64)), b"")
+            if is_chunked_ciphertext(head):
+                self.stats.add(objects_scanned=1, documents_chunked=1)
+            else:
+                self.stats.add(objects_scanned=1, documents_legacy=1)
+            return
+
+        data = self.storage.get_bytes(key)
+        if not self.keyring.needs_rotation(data):
+            self.stats.add(objects_scanned=1, already_current=1)
+            return
+        rotated = self.keyring.rotate(data)
+        if not self.dry_run:
+            self.storage.put_bytes(
+                key,
+                rotated,
+                content_type="application/octet-stream",
+                metadata={"uploaded-by": "rilono-system", "encrypted": "true"},
+            )
+        self.stats.add(objects_scanned=1, rotated=1, bytes_rewritten=len(rotated))
+
+    def _rotate_prefix(self, prefix: str) -> bool:
+        """Rotate every object under prefix; False if any failed (the prefix is retried next run)."""
+        ok = True
+        for key in self.storage.list_keys(prefix):
+            try:
+                self._rotate_object(key)
+            except Exception as exc:  # noqa: BLE001
+                self.stats.fail(key, exc)
+                ok = False
+        return ok
+
+    def rotate_objects(self) -> None:
+        pending = (p for p in self.storage.list_prefixes(self.prefix) if p not in self.checkpoint.completed)
+        scheduled = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="artifact-rotation") as executor:
+            in_flight = {}
+            while True:
+                while len(in_flight) < self.concurrency * 2 and (
+                    self.limit_prefixes is None or scheduled < self.limit_prefixes
+                ):
+                    prefix = next(pending, None)
+                    if prefix is None:
+                        break
+                    in_flight[executor.submit(self._rotate_prefix, prefix)] = prefix
+                    scheduled += 1
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix = in_flight.pop(future)
+                    self.stats.add(prefixes=1)
+                    if future.result():
+                        self.checkpoint.mark_prefix(prefix)
+
+    def rotate_snapshots(self, session_factory) -> None:
+        """Rotate student profile snapshot payloads stored in the database."""
+        from app import models
+
+        if self.checkpoint.snapshots_done:
+            return
+        last_user_id = 0
+        while True:
+            db = session_factory()
+            try:
+                rows = (
+                    db.query(models.StudentProfileSnapshot.user_id, models.StudentProfileSnapshot.encrypted_payload)
+                    .filter(models.StudentProfileSnapshot.user_id > last_user_id)
+                    .order_by(models.StudentProfileSnapshot.user_id)
+                    .limit(SNAPSHOT_BATCH_SIZE)
+                    .all()
+                )
+                if not rows:
+                    break
+                for user_id, encrypted_payload in rows:
+                    last_user_id = user_id
+                    payload = (encrypted_payload or "").encode("ascii")
+                    if not self.keyring.needs_rotation(payload):
+                        continue
+                    try:
+                        rotated = self.keyring.rotate(payload).decode("ascii")
+                    except ValueError as exc:
+                        self.stats.add(snapshots_failed=1)
+                        self.stats.failures.append((f"student_profile_snapshots/{user_id}", str(exc)))
+                        continue
+                    # Compare-and-set so a snapshot re-rendered meanwhile is not overwritten.
+                    db.query(models.StudentProfileSnapshot).filter(
+                        models.StudentProfileSnapshot.user_id == user_id,
+                        models.StudentProfileSnapshot.encrypted_payload == encrypted_payload,
+                    ).update({"encrypted_payload": rotated}, synchronize_session=False)
+                    self.stats.add(snapshots_rotated=1)
+                if self.dry_run:
+                    db.rollback()
+                else:
+                    db.commit()
+            finally:
+                db.close()
+        if not self.dry_run:
+            self.checkpoint.mark_snapshots()
+
+    def run(self, session_factory=None) -> RotationStats:
+        self.rotate_objects()
+        if session_factory is not None and self.limit_prefixes is None:
+            self.rotate_snapshots(session_factory)
+        self.stats.finished_at = time.perf_counter()
+        return self.stats
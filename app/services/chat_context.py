@@ -0,0 +1,320 @@
+"""
+Prompt context assembly for AI chat.
+
+Fits the student profile, uploaded document extracts, navigation guide and
+conversation history into a token budget before they are rendered into the
+Gemini prompt:
+
+- JSON payloads are compacted (no indentation, empty fields dropped)
+- document extracts are ranked by relevance to the current message and
+  attached in that order until the budget runs out; the rest are listed by
+  name on one line whose cost is reserved up front
+- older history turns are condensed into a short summary
+- anything that still does not fit is truncated at a fixed size, so the same
+  inputs always produce the same prompt
+
+Token counts are estimated from character length (about 4 characters per token
+for Gemini on English/JSON text), which keeps assembly free of network calls.
+"""
+import json
+import os
+import re
+import threading
+from typing import List, Optional
+
+AI_CHAT_PROMPT_TOKEN_BUDGET = max(2000, int(os.getenv("AI_CHAT_PROMPT_TOKEN_BUDGET", "32000") or "32000"))
+# Most recent history messages kept verbatim; older ones are summarized.
+AI_CHAT_HISTORY_VERBATIM_MESSAGES = 4
+AI_CHAT_HISTORY_MAX_MESSAGES = 10
+
+_CHARS_PER_TOKEN = 4
+# Fixed instructions in the system prompt template plus per-document headers.
+_SYSTEM_PROMPT_TOKENS = 700
+_DOCUMENT_HEADER_TOKENS = 40
+# A truncated extract shorter than this is not worth attaching.
+_MIN_DOCUMENT_TOKENS = 150
+# Shares of the budget left after the system prompt and current message.
+_PROFILE_SHARE = 0.25
+_GUIDE_SHARE = 0.10
+_HISTORY_SHARE = 0.15
+_DOCUMENT_LIST_SHARE = 0.10
+_HISTORY_SUMMARY_CHARS = 160
+
+OMITTED_DOCUMENTS_NOTE = (
+    "Not attached to keep the prompt within budget (ask about a document by name to have it attached): "
+)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from have how i if in is it me my of on or "
+    "should so that the this to was what when where which who why will with you your".split()
+)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+def _drop_empty(value):
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            item = _drop_empty(item)
+            if item is None or item == "" or item == [] or item == {}:
+                continue
+            compacted[key] = item
+        return compacted
+    if isinstance(value, list):
+        return [item for item in (_drop_empty(item) for item in value) if item is not None and item != "" and item != {}]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def compact_json_text(text: Optional[str]) -> str:
+    """Re-serialize JSON without whitespace or empty fields; other text is returned stripped."""
+    if not text:
+        return ""
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return text.strip()
+    return json.dumps(_drop_empty(data), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, marking how much was dropped."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens * _CHARS_PER_TOKEN - 40)
+    return f"{text[:limit]}\n[... truncated {len(text) - limit} characters]"
+
+
+def _terms(text: Optional[str]) -> set:
+    if not text:
+        return set()
+    return {word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS and len(word) > 1}
+
+
+def rank_documents(user_message: str, document_files: List[dict]) -> List[int]:
+    """
+    Indices of document_files, most relevant to the message first.
+    Matches on document type and filename weigh more than matches in the extract;
+    documents needing review get a small boost. Ties keep upload order.
+    """
+    query = _terms(user_message)
+
+    def score(index: int) -> tuple:
+        doc = document_files[index]
+        label_terms = _terms(f"{doc.get('document_type', '')} {doc.get('filename', '')}".replace("_", " "))
+        content_terms = _terms(doc.get("content"))
+        value = 3 * len(query & label_terms) + len(query & content_terms)
+        if not doc.get("is_valid"):
+            value += 1
+        return (-value, index)
+
+    return sorted(range(len(document_files)), key=score)
+
+
+def _select_guide_sections(guide_text: str, user_message: str, max_tokens: int) -> str:
+    """Whole guide when it fits; otherwise the intro plus the most relevant "## " sections in guide order."""
+    if estimate_tokens(guide_text) <= max_tokens:
+        return guide_text
+    intro, *sections = re.split(r"\n(?=## )", guide_text)
+    query = _terms(user_message)
+    ranked = sorted(range(len(sections)), key=lambda i: (-len(query & _terms(sections[i])), i))
+    remaining = max_tokens - estimate_tokens(intro)
+    chosen = set()
+    for index in ranked:
+        cost = estimate_tokens(sections[index])
+        if cost <= remaining:
+            chosen.add(index)
+            remaining -= cost
+    kept = [intro] + [sections[i] for i in sorted(chosen)]
+    return truncate_to_tokens("\n".join(kept), max_tokens)
+
+
+def _summarize_history(messages: List[dict]) -> str:
+    lines = []
+    for msg in messages:
+        role = msg.get("role", "user")
+        if role not in ("user", "assistant"):
+            continue
+        content = " ".join(str(msg.get("content", "")).split())
+        if len(content) > _HISTORY_SUMMARY_CHARS:
+            content = content[:_HISTORY_SUMMARY_CHARS].rstrip() + "..."
+        lines.append(f"- {'User' if role == 'user' else 'Assistant'}: {content}")
+    return "\n".join(lines)
+
+
+def _document_label(doc: dict) -> str:
+    return f"{str(doc.get('document_type') or 'document').upper()} ({doc.get('filename') or 'unnamed'})"
+
+
+def _omitted_note_tokens(label_chars: int) -> int:
+    """Upper bound on the omitted-documents line listing labels totalling label_chars (separators included)."""
+    if label_chars <= 0:
+        return 0
+    return estimate_tokens(OMITTED_DOCUMENTS_NOTE) + -(-label_chars // _CHARS_PER_TOKEN)
+
+
+def _format_history(messages: List[dict]) -> str:
+    text = ""
+    for msg in messages:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        if role == "user":
+            text += f"User: {content}\n"
+        elif role == "assistant":
+            text += f"Assistant: {content}\n"
+    return text
+
+
+class ChatPromptContext:
+    """Budgeted prompt sections plus the token estimate for each."""
+
+    def __init__(self) -> None:
+        self.student_profile_context = ""
+        self.documents_context = ""
+        self.document_files: List[dict] = []
+        self.omitted_documents_note = ""
+        self.navigation_guide_text = ""
+        self.conversation_text = ""
+        self.section_tokens: dict = {}
+        self.documents_attached = 0
+        self.documents_truncated = 0
+        self.documents_omitted = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.section_tokens.values())
+
+
+def assemble_chat_context(
+    user_message: str,
+    student_profile_context: str,
+    documents_context: str,
+    navigation_guide_text: str,
+    document_files: Optional[List[dict]] = None,
+    conversation_history: Optional[List[dict]] = None,
+    token_budget: Optional[int] = None,
+) -> ChatPromptContext:
+    budget = token_budget or AI_CHAT_PROMPT_TOKEN_BUDGET
+    context = ChatPromptContext()
+    message_tokens = estimate_tokens(user_message)
+    available = max(0, budget - _SYSTEM_PROMPT_TOKENS - message_tokens)
+
+    context.student_profile_context = truncate_to_tokens(
+        compact_json_text(student_profile_context), int(available * _PROFILE_SHARE)
+    )
+    context.navigation_guide_text = _select_guide_sections(
+        navigation_guide_text or "", user_message, int(available * _GUIDE_SHARE)
+    )
+
+    history = [msg for msg in (conversation_history or [])[-AI_CHAT_HISTORY_MAX_MESSAGES:] if isinstance(msg, dict)]
+    recent = history[-AI_CHAT_HISTORY_VERBATIM_MESSAGES:]
+    older = history[:-AI_CHAT_HISTORY_VERBATIM_MESSAGES]
+    conversation_text = _format_history(recent)
+    if older:
+        conversation_text = f"Earlier in this conversation:\n{_summarize_history(older)}\n\n{conversation_text}"
+    context.conversation_text = truncate_to_tokens(conversation_text, int(available * _HISTORY_SHARE)) if conversation_text else ""
+    context.documents_context = truncate_to_tokens(documents_context or "", int(available * _DOCUMENT_LIST_SHARE))
+
+    used = (
+        estimate_tokens(context.student_profile_context)
+        + estimate_tokens(context.navigation_guide_text)
+        + estimate_tokens(context.conversation_text)
+        + estimate_tokens(context.documents_context)
+    )
+    remaining = max(0, available - used)
+    document_files = document_files or []
+    ranked = rank_documents(user_message, document_files)
+    labels = [_document_label(document_files[index]) for index in ranked]
+    # later_chars[k]: characters needed to list ranked[k:] on the omitted line.
+    later_chars = [0] * (len(ranked) + 1)
+    for position in range(len(ranked) - 1, -1, -1):
+        later_chars[position] = later_chars[position + 1] + len(labels[position]) + 2
+    omitted_labels: List[str] = []
+    omitted_chars = 0
+    for position, index in enumerate(ranked):
+        # Keep room to list everything omitted so far and every later document.
+        room = remaining - _omitted_note_tokens(omitted_chars + later_chars[position + 1])
+        doc = dict(document_files[index])
+        content = compact_json_text(doc.get("content"))
+        cost = estimate_tokens(content) + _DOCUMENT_HEADER_TOKENS
+        if cost <= room:
+            context.documents_attached += 1
+        elif room >= _MIN_DOCUMENT_TOKENS + _DOCUMENT_HEADER_TOKENS:
+            content = truncate_to_tokens(content, room - _DOCUMENT_HEADER_TOKENS)
+            cost = room
+            context.documents_truncated += 1
+        else:
+            omitted_labels.append(labels[position])
+            omitted_chars += len(labels[position]) + 2
+            context.documents_omitted += 1
+            continue
+        remaining -= cost
+        doc["content"] = content
+        context.document_files.append(doc)
+    if omitted_labels:
+        note = OMITTED_DOCUMENTS_NOTE + ", ".join(omitted_labels)
+        if estimate_tokens(note) > remaining:
+            # Only when the budget cannot even hold the names.
+            note = f"{len(omitted_labels)} uploaded documents were not attached to keep the prompt within budget."
+        context.omitted_documents_note = note
+
+    context.section_tokens = {
+        "system": _SYSTEM_PROMPT_TOKENS + message_tokens,
+        "profile": estimate_tokens(context.student_profile_context),
+        "documents": estimate_tokens(context.documents_context)
+        + sum(estimate_tokens(doc["content"]) + _DOCUMENT_HEADER_TOKENS for doc in context.document_files)
+        + estimate_tokens(context.omitted_documents_note),
+        "guide": estimate_tokens(context.navigation_guide_text),
+        "history": estimate_tokens(context.conversation_text),
+    }
+    prompt_budget_stats.record(context)
+    return context
+
+
+class PromptBudgetStats:
+    """Running per-section token totals across assembled chat prompts."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._prompts = 0
+        self._section_totals: dict = {}
+        self._max_prompt_tokens = 0
+        self._documents = {"attached": 0, "truncated": 0, "omitted": 0}
+
+    def record(self, context: ChatPromptContext) -> None:
+        with self._lock:
+            self._prompts += 1
+            for section, tokens in context.section_tokens.items():
+                self._section_totals[section] = self._section_totals.get(section, 0) + tokens
+            self._max_prompt_tokens = max(self._max_prompt_tokens, context.total_tokens)
+            self._documents["attached"] += context.documents_attached
+            self._documents["truncated"] += context.documents_truncated
+            self._documents["omitted"] += context.documents_omitted
+
+    def stats(self) -> dict:
+        with self._lock:
+            prompts = self._prompts
+            return {
+                "token_budget": AI_CHAT_PROMPT_TOKEN_BUDGET,
+                "prompts": prompts,
+                "avg_section_tokens": {
+                    section: round(total / prompts, 1) for section, total in self._section_totals.items()
+                },
+                "avg_prompt_tokens": round(sum(self._section_totals.values()) / prompts, 1) if prompts else 0.0,
+                "max_prompt_tokens": self._max_prompt_tokens,
+                "documents": dict(self._documents),
+            }
+
+
+prompt_budget_stats = PromptBudgetStats()
+
+
+def get_prompt_budget_stats() -> dict:
+    return prompt_budget_stats.stats()
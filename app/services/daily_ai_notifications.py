@@ -1,13 +1,15 @@
+import hashlib
 import json
 import os
 import threading
-from datetime import datetime, timedelta, timezone
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
 from typing import Any, Optional
 
-import boto3
-from botocore.config import Config
 from pydantic import BaseModel, ValidationError
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
 
 from app import models
 from app.database import SessionLocal
@@ -16,25 +18,58 @@ from app.email_service import (
     send_proactive_assistant_email,
 )
 from app.notification_center import create_user_notification
-from app.routers.documents import refresh_student_profile_snapshot_for_user
+from app.services.journey_stages import (
+    BULK_STAGE_USER_BATCH_SIZE,
+    compute_stages_for_users,
+    get_compiled_journey_rules,
+)
+from app.services.student_profile import get_student_profile_snapshot
 from app.utils import gemini_service as gemini_utils
+from app.utils.object_storage import get_document_storage
 from app.utils.secure_artifacts import decrypt_artifact_bytes
 
 MODEL_NAME = "gemini-3-pro-preview"
-PROFILE_KEY_SUFFIX = "STUDENT_PROFILE_AND_F1_VISA_STATUS.json"
 PROMPT_LOG_MAX_CHARS = int(os.getenv("GEMINI_LOG_MAX_CHARS", "0") or "0")
 
-R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID", "")
-R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID", "")
-R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "")
-R2_DOCUMENTS_BUCKET = os.getenv("R2_DOCUMENTS_BUCKET", "documents")
-R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL", f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com")
-
 DAILY_AI_NOTIFIER_ENABLED = str(os.getenv("DAILY_AI_NOTIFIER_ENABLED", "true")).strip().lower() in {"1", "true", "yes", "on"}
 DAILY_AI_NOTIFIER_HOUR_UTC = max(0, min(23, int(os.getenv("DAILY_AI_NOTIFIER_HOUR_UTC", "6") or "6")))
 DAILY_AI_NOTIFIER_MINUTE_UTC = max(0, min(59, int(os.getenv("DAILY_AI_NOTIFIER_MINUTE_UTC", "0") or "0")))
 DAILY_AI_NOTIFIER_POLL_SECONDS = max(60, int(os.getenv("DAILY_AI_NOTIFIER_POLL_SECONDS", "300") or "300"))
 DAILY_AI_NOTIFIER_USER_LIMIT = max(0, int(os.getenv("DAILY_AI_NOTIFIER_USER_LIMIT", "0") or "0"))
+DAILY_AI_NOTIFIER_CONCURRENCY = max(1, int(os.getenv("DAILY_AI_NOTIFIER_CONCURRENCY", "8") or "8"))
+# Requests per second; 0 disables the limit.
+DAILY_AI_NOTIFIER_GEMINI_QPS = max(0.0, float(os.getenv("DAILY_AI_NOTIFIER_GEMINI_QPS", "5") or "0"))
+DAILY_AI_NOTIFIER_EMAIL_QPS = max(0.0, float(os.getenv("DAILY_AI_NOTIFIER_EMAIL_QPS", "2") or "0"))
+DAILY_AI_NOTIFIER_DOCUMENT_FETCH_TIMEOUT_SECONDS = max(
+    1.0, float(os.getenv("DAILY_AI_NOTIFIER_DOCUMENT_FETCH_TIMEOUT_SECONDS", "15") or "15")
+)
+DAILY_AI_NOTIFIER_PROGRESS_SECONDS = max(1, int(os.getenv("DAILY_AI_NOTIFIER_PROGRESS_SECONDS", "10") or "10"))
+# A running run whose heartbeat is older than this is treated as crashed and resumed.
+DAILY_AI_NOTIFIER_STALE_MINUTES = max(1, int(os.getenv("DAILY_AI_NOTIFIER_STALE_MINUTES", "15") or "15"))
+# Skip the model call for users whose inputs are unchanged since a "no action needed" decision.
+DAILY_AI_NOTIFIER_SKIP_UNCHANGED = str(os.getenv("DAILY_AI_NOTIFIER_SKIP_UNCHANGED", "true")).strip().lower() in {"1", "true", "yes", "on"}
+# Unchanged users are still re-evaluated after this many days.
+DAILY_AI_NOTIFIER_MAX_SKIP_DAYS = max(1, int(os.getenv("DAILY_AI_NOTIFIER_MAX_SKIP_DAYS", "7") or "7"))
+# Per-user run items are kept this many days after their run, then pruned. Run summaries
+# stay, and the decision fingerprints live in ai_daily_notification_states.
+DAILY_AI_NOTIFIER_RUN_ITEM_RETENTION_DAYS = max(
+    1, int(os.getenv("DAILY_AI_NOTIFIER_RUN_ITEM_RETENTION_DAYS", "7") or "7")
+)
+
+RUN_ITEM_PENDING = "pending"
+RUN_ITEM_PROCESSING = "processing"
+RUN_ITEM_NO_ACTION = "no_action"
+RUN_ITEM_NOTIFIED = "notified"
+RUN_ITEM_UNCHANGED = "unchanged"
+RUN_ITEM_SKIPPED = "skipped"
+RUN_ITEM_FAILED = "failed"
+RUN_ITEM_INTERRUPTED = "interrupted"  # Outcome only; the item stays processing and is retried on resume.
+OPEN_RUN_ITEM_STATUSES = {RUN_ITEM_PENDING, RUN_ITEM_PROCESSING}
+RUN_ITEM_INSERT_BATCH_SIZE = 1000
+FINGERPRINT_VERSION = "1"
+
+# Approximate first month of each intake term, for timeline bucketing.
+INTAKE_START_MONTHS = {"spring": 1, "summer": 5, "fall": 8}
 
 
 class DailyAssistantDecision(BaseModel):
@@ -45,6 +80,45 @@ class DailyAssistantDecision(BaseModel):
     in_app_message: str = ""
 
 
+class _TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available or stop_event is set."""
+
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None) -> None:
+        self.rate = rate_per_second
+        self.capacity = max(1.0, burst if burst is not None else rate_per_second)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event: Optional[threading.Event] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_seconds = (1 - self._tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait_seconds):
+                    return False
+            else:
+                time.sleep(wait_seconds)
+
+
+class _RunLimits:
+    def __init__(self, stop_event: Optional[threading.Event]) -> None:
+        self.stop_event = stop_event
+        self.gemini = _TokenBucket(DAILY_AI_NOTIFIER_GEMINI_QPS)
+        self.email = _TokenBucket(DAILY_AI_NOTIFIER_EMAIL_QPS)
+
+    def stopped(self) -> bool:
+        return self.stop_event is not None and self.stop_event.is_set()
+
+
 class DailyAINotificationScheduler:
     def __init__(self) -> None:
         self._stop_event = threading.Event()
@@ -79,7 +153,7 @@ class DailyAINotificationScheduler:
             try:
                 now_utc = datetime.now(timezone.utc)
                 if _is_due_for_today(now_utc):
-                    result = run_daily_ai_notification_job(force=False)
+                    result = run_daily_ai_notification_job(force=False, stop_event=self._stop_event)
                     if result.get("status") != "skipped":
                         print(f"Daily AI notifier run result: {result}")
             except Exception as exc:  # noqa: BLE001
@@ -95,35 +169,11 @@ def _clip_for_log(text: str) -> str:
     return f"{text[:PROMPT_LOG_MAX_CHARS]}\n\n...[truncated {len(text) - PROMPT_LOG_MAX_CHARS} chars]"
 
 
-def _build_r2_client():
-    if not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
-        raise RuntimeError("R2 credentials are not configured")
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT_URL,
-        aws_access_key_id=R2_ACCESS_KEY_ID,
-        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-        region_name="auto",
-        config=Config(signature_version="s3v4"),
-    )
-
-
-def _read_decrypted_r2_text(r2_client, key: str) -> str:
-    response = r2_client.get_object(Bucket=R2_DOCUMENTS_BUCKET, Key=key)
-    encrypted_blob = response["Body"].read()
-    return decrypt_artifact_bytes(encrypted_blob).decode("utf-8")
-
-
 def _build_gemini_model():
-    if gemini_utils.USE_VERTEX_AI and gemini_utils.VERTEX_AI_AVAILABLE:
-        from vertexai.generative_models import GenerativeModel
-
-        return GenerativeModel(MODEL_NAME), "vertex"
-
-    if gemini_utils.GENAI_AVAILABLE and gemini_utils.genai:
-        return gemini_utils.genai.GenerativeModel(MODEL_NAME), "genai"
-
-    raise RuntimeError("Gemini is not configured (service account or API key missing)")
+    client = gemini_utils.gemini_client
+    if client.provider is None:
+        raise RuntimeError("Gemini is not configured (service account or API key missing)")
+    return client.get_model(MODEL_NAME), client.provider
 
 
 def _is_due_for_today(now_utc: datetime) -> bool:
@@ -220,7 +270,7 @@ def _analyze_user(model: Any, prompt: str, user_id: int) -> DailyAssistantDecisi
     print(_clip_for_log(prompt))
     print("=" * 90)
 
-    response = model.generate_content(prompt)
+    response = gemini_utils.gemini_client.generate("daily_notifier", prompt, model=model)
     response_text = str(getattr(response, "text", "") or "")
 
     print("\n" + "-" * 90)
@@ -236,9 +286,15 @@ def _analyze_user(model: Any, prompt: str, user_id: int) -> DailyAssistantDecisi
         raise ValueError(f"Gemini JSON schema mismatch: {str(exc)}") from exc
 
 
-def _load_user_document_payload(user_id: int, db_session, r2_client) -> list[dict]:
+def _load_user_document_payload(user_id: int, db_session, storage) -> list[dict]:
     documents = (
-        db_session.query(models.Document)
+        db_session.query(
+            models.Document.document_type,
+            models.Document.original_filename,
+            models.Document.is_valid,
+            models.Document.validation_message,
+            models.Document.extracted_text_file_url,
+        )
         .filter(
             models.Document.user_id == user_id,
             models.Document.extracted_text_file_url.isnot(None),
@@ -246,16 +302,28 @@ def _load_user_document_payload(user_id: int, db_session, r2_client) -> list[dic
         .order_by(models.Document.created_at.asc(), models.Document.id.asc())
         .all()
     )
+    if not documents:
+        return []
+
+    # Read directly rather than through the artifact cache: a full scan touches every
+    # user once and would only evict the entries AI chat actually reuses.
+    fetched = storage.get_many(
+        [document.extracted_text_file_url for document in documents if document.extracted_text_file_url],
+        timeout=DAILY_AI_NOTIFIER_DOCUMENT_FETCH_TIMEOUT_SECONDS,
+    )
 
     payload: list[dict] = []
     for document in documents:
-        if not document.extracted_text_file_url:
+        key = document.extracted_text_file_url
+        if not key:
             continue
         try:
-            raw_content = _read_decrypted_r2_text(r2_client, document.extracted_text_file_url)
+            if key not in fetched.objects:
+                raise fetched.errors.get(key) or TimeoutError("fetch timed out")
+            raw_content = decrypt_artifact_bytes(fetched.objects[key]).decode("utf-8")
         except Exception as exc:  # noqa: BLE001
             print(
-                f"Daily AI notifier warning: failed to read extracted doc key={document.extracted_text_file_url} "
+                f"Daily AI notifier warning: failed to read extracted doc key={key} "
                 f"for user_id={user_id}: {str(exc)}"
             )
             continue
@@ -272,30 +340,209 @@ def _load_user_document_payload(user_id: int, db_session, r2_client) -> list[dic
     return payload
 
 
-def _load_profile_raw_json(user_id: int, r2_client) -> str:
-    key = f"user_{user_id}/{PROFILE_KEY_SUFFIX}"
-    return _read_decrypted_r2_text(r2_client, key)
+def _timeline_bucket(today: date, preferred_intake: Optional[str], preferred_year: Optional[int]) -> str:
+    """
+    Date granularity that can change the assistant's timeline advice: monthly while
+    the intake is far away, weekly when it gets closer and daily in the final weeks.
+    Users without an intake are bucketed weekly.
+    """
+    start_month = INTAKE_START_MONTHS.get((preferred_intake or "").strip().lower())
+    if start_month and preferred_year:
+        try:
+            days_to_intake = (date(int(preferred_year), start_month, 1) - today).days
+        except ValueError:
+            days_to_intake = None
+        if days_to_intake is not None:
+            if days_to_intake > 180:
+                return f"m:{today.year}-{today.month:02d}"
+            if days_to_intake > 60:
+                iso_year, iso_week, _ = today.isocalendar()
+                return f"w:{iso_year}-{iso_week:02d}"
+            return f"d:{today.isoformat()}"
+    iso_year, iso_week, _ = today.isocalendar()
+    return f"w:{iso_year}-{iso_week:02d}"
+
+
+def _compute_input_fingerprints(db, user_ids: list[int], today: date) -> dict[int, str]:
+    """
+    Fingerprint of everything the daily analysis reads, built from a few bulk queries:
+    the profile snapshot identity (profile_version + catalog version), document ids and
+    validation state, the journey stage and the timeline date bucket.
+    """
+    fingerprints: dict[int, str] = {}
+    catalog_version = get_compiled_journey_rules(db).catalog_version
+    for start in range(0, len(user_ids), BULK_STAGE_USER_BATCH_SIZE):
+        batch = user_ids[start:start + BULK_STAGE_USER_BATCH_SIZE]
+        documents_by_user: dict[int, list[str]] = {user_id: [] for user_id in batch}
+        document_rows = (
+            db.query(
+                models.Document.user_id,
+                models.Document.id,
+                models.Document.is_valid,
+                models.Document.validation_status,
+                models.Document.extracted_text_file_url,
+            )
+            .filter(models.Document.user_id.in_(batch))
+            .order_by(models.Document.user_id.asc(), models.Document.id.asc())
+            .all()
+        )
+        for user_id, document_id, is_valid, validation_status, extracted_key in document_rows:
+            documents_by_user[user_id].append(f"{document_id}:{is_valid}:{validation_status}:{extracted_key or ''}")
+
+        stages = compute_stages_for_users(db, batch)
+        user_rows = (
+            db.query(
+                models.User.id,
+                models.User.profile_version,
+                models.User.preferred_intake,
+                models.User.preferred_year,
+            )
+            .filter(models.User.id.in_(batch))
+            .all()
+        )
+        for user_id, profile_version, preferred_intake, preferred_year in user_rows:
+            stage = stages.get(user_id)
+            parts = [
+                FINGERPRINT_VERSION,
+                str(profile_version or 0),
+                str(catalog_version),
+                str(stage.current_stage if stage else ""),
+                ",".join(documents_by_user.get(user_id, [])),
+                _timeline_bucket(today, preferred_intake, preferred_year),
+            ]
+            fingerprints[user_id] = hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+    return fingerprints
+
+
+def _filter_unchanged_users(db, run_id: int, user_ids: list[int], today: date) -> tuple[list[int], dict[int, str]]:
+    """
+    Mark users whose inputs are unchanged since a recent "no action needed" decision
+    as unchanged, without calling the model. Returns the users left to analyze and
+    the fingerprints to store with their new decisions.
+    """
+    fingerprints = _compute_input_fingerprints(db, user_ids, today)
+    if not DAILY_AI_NOTIFIER_SKIP_UNCHANGED:
+        return user_ids, fingerprints
+
+    reevaluate_before = datetime.utcnow() - timedelta(days=DAILY_AI_NOTIFIER_MAX_SKIP_DAYS)
+    unchanged_ids: list[int] = []
+    for start in range(0, len(user_ids), BULK_STAGE_USER_BATCH_SIZE):
+        batch = user_ids[start:start + BULK_STAGE_USER_BATCH_SIZE]
+        states = (
+            db.query(
+                models.AIDailyNotificationState.user_id,
+                models.AIDailyNotificationState.input_fingerprint,
+                models.AIDailyNotificationState.notification_needed,
+                models.AIDailyNotificationState.evaluated_at,
+            )
+            .filter(models.AIDailyNotificationState.user_id.in_(batch))
+            .all()
+        )
+        batch_unchanged = [
+            user_id
+            for user_id, input_fingerprint, notification_needed, evaluated_at in states
+            if not notification_needed
+            and input_fingerprint == fingerprints.get(user_id)
+            and evaluated_at is not None
+            and evaluated_at.replace(tzinfo=None) >= reevaluate_before
+        ]
+        if batch_unchanged:
+            db.query(models.AIDailyNotificationRunItem).filter(
+                models.AIDailyNotificationRunItem.run_id == run_id,
+                models.AIDailyNotificationRunItem.user_id.in_(batch_unchanged),
+            ).update(
+                {
+                    models.AIDailyNotificationRunItem.status: RUN_ITEM_UNCHANGED,
+                    models.AIDailyNotificationRunItem.completed_at: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+            unchanged_ids.extend(batch_unchanged)
+
+    if not unchanged_ids:
+        return user_ids, fingerprints
+    unchanged = set(unchanged_ids)
+    return [user_id for user_id in user_ids if user_id not in unchanged], fingerprints
+
+
+def _record_decision_state(session, user_id: int, input_fingerprint: Optional[str], notification_needed: bool) -> None:
+    if not input_fingerprint:
+        return
+    state = session.get(models.AIDailyNotificationState, user_id)
+    if state is None:
+        state = models.AIDailyNotificationState(user_id=user_id)
+        session.add(state)
+    state.input_fingerprint = input_fingerprint
+    state.notification_needed = notification_needed
+    state.evaluated_at = datetime.utcnow()
+
+
+def _record_run_item_email_error(session, run_id: int, user_id: int, email_error: str) -> None:
+    """Note a failed email on an already notified item without changing its status."""
+    try:
+        session.query(models.AIDailyNotificationRunItem).filter(
+            models.AIDailyNotificationRunItem.run_id == run_id,
+            models.AIDailyNotificationRunItem.user_id == user_id,
+        ).update({models.AIDailyNotificationRunItem.email_error: email_error[:1000]}, synchronize_session=False)
+        session.commit()
+    except Exception as exc:  # noqa: BLE001
+        session.rollback()
+        print(f"Daily AI notifier: could not record email error for user_id={user_id}: {str(exc)}")
+
 
+def _set_run_item_status(session, run_id: int, user_id: int, status: str, error_message: Optional[str] = None) -> None:
+    values: dict[Any, Any] = {
+        models.AIDailyNotificationRunItem.status: status,
+        models.AIDailyNotificationRunItem.error_message: error_message,
+    }
+    if status == RUN_ITEM_PROCESSING:
+        values[models.AIDailyNotificationRunItem.attempts] = models.AIDailyNotificationRunItem.attempts + 1
+    else:
+        values[models.AIDailyNotificationRunItem.completed_at] = datetime.utcnow()
+    session.query(models.AIDailyNotificationRunItem).filter(
+        models.AIDailyNotificationRunItem.run_id == run_id,
+        models.AIDailyNotificationRunItem.user_id == user_id,
+    ).update(values, synchronize_session=False)
+
+
+def _process_single_user(
+    user_id: int,
+    run_id: int,
+    model: Any,
+    storage,
+    limits: _RunLimits,
+    input_fingerprint: Optional[str] = None,
+) -> str:
+    """Scan one user and checkpoint the outcome on their run item. Returns the item status."""
+    if limits.stopped():
+        return RUN_ITEM_INTERRUPTED
 
-def _process_single_user(user_id: int, model: Any, r2_client) -> bool:
     session = SessionLocal()
     try:
+        _set_run_item_status(session, run_id, user_id, RUN_ITEM_PROCESSING)
+        session.commit()
+
         user = (
             session.query(models.User)
             .filter(models.User.id == user_id, models.User.is_active.is_(True))
             .first()
         )
         if not user:
-            return False
+            _set_run_item_status(session, run_id, user_id, RUN_ITEM_SKIPPED)
+            session.commit()
+            return RUN_ITEM_SKIPPED
 
         try:
-            refresh_student_profile_snapshot_for_user(user=user, db=session)
+            profile_raw_json = get_student_profile_snapshot(user, session).raw_json
         except Exception as exc:  # noqa: BLE001
-            print(f"Daily AI notifier warning: failed profile snapshot refresh for user_id={user_id}: {str(exc)}")
+            print(f"Daily AI notifier warning: failed profile snapshot load for user_id={user_id}: {str(exc)}")
+            profile_raw_json = "{}"
 
-        profile_raw_json = _load_profile_raw_json(user.id, r2_client)
-        document_payload = _load_user_document_payload(user.id, session, r2_client)
+        document_payload = _load_user_document_payload(user.id, session, storage)
         prompt = _build_analysis_prompt(user, profile_raw_json, document_payload)
+        if not limits.gemini.acquire(limits.stop_event):
+            return RUN_ITEM_INTERRUPTED
         decision = _analyze_user(model, prompt, user_id=user.id)
         print(
             f"Daily AI notifier reasoning user_id={user.id}: "
@@ -304,13 +551,17 @@ def _process_single_user(user_id: int, model: Any, r2_client) -> bool:
 
         if not decision.notification_needed:
             print(f"Daily AI notifier: no action needed for user_id={user.id}")
-            return False
+            _set_run_item_status(session, run_id, user_id, RUN_ITEM_NO_ACTION)
+            _record_decision_state(session, user.id, input_fingerprint, notification_needed=False)
+            session.commit()
+            return RUN_ITEM_NO_ACTION
 
         subject = (decision.email_subject or "Action needed for your F1 visa plan").strip()[:140]
         in_app_message = (decision.in_app_message or subject).strip()[:180]
         if not in_app_message:
             in_app_message = "New action item in your F1 visa journey."
 
+        # The notification and the checkpoint commit together, so a resumed run never notifies twice.
         create_user_notification(
             session,
             user_id=user.id,
@@ -318,33 +569,114 @@ def _process_single_user(user_id: int, model: Any, r2_client) -> bool:
             message=in_app_message,
             notification_type="warning",
             source="ai_daily_assistant",
-            commit=True,
+            commit=False,
         )
+        _set_run_item_status(session, run_id, user_id, RUN_ITEM_NOTIFIED)
+        _record_decision_state(session, user.id, input_fingerprint, notification_needed=True)
+        session.commit()
 
+        # The item is already committed as notified; an email problem is recorded beside it, not over it.
         if user.email and user.email_notifications_enabled is not False:
-            unsubscribe_url = build_email_notifications_unsubscribe_url(email=user.email)
-            send_proactive_assistant_email(
-                email=user.email,
-                full_name=user.full_name,
-                subject=subject,
-                html_body=decision.email_body,
-                unsubscribe_url=unsubscribe_url,
-            )
+            email_error = None
+            if not limits.email.acquire(limits.stop_event):
+                email_error = "Run stopped before the email could be sent."
+            else:
+                try:
+                    unsubscribe_url = build_email_notifications_unsubscribe_url(email=user.email)
+                    if not send_proactive_assistant_email(
+                        email=user.email,
+                        full_name=user.full_name,
+                        subject=subject,
+                        html_body=decision.email_body,
+                        unsubscribe_url=unsubscribe_url,
+                    ):
+                        email_error = "Email provider did not accept the message."
+                except Exception as exc:  # noqa: BLE001
+                    email_error = str(exc)
+            if email_error:
+                print(f"Daily AI notifier: email not sent for user_id={user.id}: {email_error}")
+                _record_run_item_email_error(session, run_id, user_id, email_error)
 
         print(f"Daily AI notifier: sent proactive notification for user_id={user.id}")
-        return True
+        return RUN_ITEM_NOTIFIED
     except Exception as exc:  # noqa: BLE001
         session.rollback()
         print(f"Daily AI notifier error for user_id={user_id}: {str(exc)}")
-        return False
+        try:
+            _set_run_item_status(session, run_id, user_id, RUN_ITEM_FAILED, error_message=str(exc)[:1000])
+            session.commit()
+        except Exception:  # noqa: BLE001
+            session.rollback()
+        return RUN_ITEM_FAILED
     finally:
         session.close()
 
 
-def run_daily_ai_notification_job(force: bool = False) -> dict:
+def _prune_run_items(db, run_date) -> int:
+    """Delete the items of runs older than the retention window. Only today's run can resume."""
+    cutoff = run_date - timedelta(days=DAILY_AI_NOTIFIER_RUN_ITEM_RETENTION_DAYS)
+    old_run_ids = (
+        db.query(models.AIDailyNotificationRun.id)
+        .filter(models.AIDailyNotificationRun.run_date < cutoff)
+        .subquery()
+    )
+    deleted = (
+        db.query(models.AIDailyNotificationRunItem)
+        .filter(models.AIDailyNotificationRunItem.run_id.in_(db.query(old_run_ids.c.id)))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return int(deleted or 0)
+
+
+def _seed_run_items(db, run_id: int) -> int:
+    user_id_rows = (
+        db.query(models.User.id)
+        .filter(models.User.is_active.is_(True))
+        .order_by(models.User.id.asc())
+        .all()
+    )
+    user_ids = [int(row[0]) for row in user_id_rows]
+    if DAILY_AI_NOTIFIER_USER_LIMIT > 0:
+        user_ids = user_ids[:DAILY_AI_NOTIFIER_USER_LIMIT]
+
+    for start in range(0, len(user_ids), RUN_ITEM_INSERT_BATCH_SIZE):
+        db.bulk_insert_mappings(
+            models.AIDailyNotificationRunItem,
+            [
+                {"run_id": run_id, "user_id": user_id, "status": RUN_ITEM_PENDING, "attempts": 0}
+                for user_id in user_ids[start:start + RUN_ITEM_INSERT_BATCH_SIZE]
+            ],
+        )
+    db.commit()
+    return len(user_ids)
+
+
+def _count_run_items(db, run_id: int) -> dict[str, int]:
+    rows = (
+        db.query(models.AIDailyNotificationRunItem.status, func.count(models.AIDailyNotificationRunItem.id))
+        .filter(models.AIDailyNotificationRunItem.run_id == run_id)
+        .group_by(models.AIDailyNotificationRunItem.status)
+        .all()
+    )
+    return {status: int(count) for status, count in rows}
+
+
+def _write_run_progress(db, run_row: models.AIDailyNotificationRun, counts: dict[str, int]) -> None:
+    run_row.users_scanned = sum(count for status, count in counts.items() if status not in OPEN_RUN_ITEM_STATUSES)
+    run_row.notifications_sent = counts.get(RUN_ITEM_NOTIFIED, 0)
+    run_row.users_failed = counts.get(RUN_ITEM_FAILED, 0)
+    run_row.users_unchanged = counts.get(RUN_ITEM_UNCHANGED, 0)
+    run_row.last_progress_at = datetime.utcnow()
+    db.commit()
+
+
+def run_daily_ai_notification_job(force: bool = False, stop_event: Optional[threading.Event] = None) -> dict:
     """
     Run one daily proactive notification scan cycle.
-    Uses ai_daily_notification_runs.run_date as idempotency guard.
+    Uses ai_daily_notification_runs.run_date as idempotency guard. Users are scanned
+    concurrently and checkpointed in ai_daily_notification_run_items, so an interrupted
+    or crashed run resumes with the remaining users. force=True starts the day over.
     """
     now_utc = datetime.now(timezone.utc)
     run_date = now_utc.date()
@@ -364,12 +696,13 @@ def run_daily_ai_notification_job(force: bool = False) -> dict:
                 "reason": "already_ran_for_today",
                 "run_date": run_date.isoformat(),
             }
+        last_heartbeat = (existing_run.last_progress_at or existing_run.started_at) if existing_run else None
         if (
             existing_run
             and not force
             and existing_run.status == "running"
-            and existing_run.started_at
-            and (datetime.utcnow() - existing_run.started_at) < timedelta(hours=2)
+            and last_heartbeat
+            and (datetime.utcnow() - last_heartbeat.replace(tzinfo=None)) < timedelta(minutes=DAILY_AI_NOTIFIER_STALE_MINUTES)
         ):
             return {
                 "status": "skipped",
@@ -377,13 +710,23 @@ def run_daily_ai_notification_job(force: bool = False) -> dict:
                 "run_date": run_date.isoformat(),
             }
 
+        resumed = False
         if existing_run:
             run_row = existing_run
+            resumed = not force
+            if force:
+                db.query(models.AIDailyNotificationRunItem).filter(
+                    models.AIDailyNotificationRunItem.run_id == run_row.id
+                ).delete(synchronize_session=False)
+                run_row.started_at = datetime.utcnow()
+                run_row.users_total = 0
+                run_row.users_scanned = 0
+                run_row.notifications_sent = 0
+                run_row.users_failed = 0
+                run_row.users_unchanged = 0
             run_row.status = "running"
-            run_row.started_at = datetime.utcnow()
             run_row.completed_at = None
-            run_row.users_scanned = 0
-            run_row.notifications_sent = 0
+            run_row.last_progress_at = datetime.utcnow()
             run_row.error_message = None
             db.commit()
             db.refresh(run_row)
@@ -392,8 +735,12 @@ def run_daily_ai_notification_job(force: bool = False) -> dict:
                 run_date=run_date,
                 status="running",
                 started_at=datetime.utcnow(),
+                last_progress_at=datetime.utcnow(),
                 users_scanned=0,
                 notifications_sent=0,
+                users_total=0,
+                users_failed=0,
+                users_unchanged=0,
             )
             db.add(run_row)
             try:
@@ -408,40 +755,93 @@ def run_daily_ai_notification_job(force: bool = False) -> dict:
                 }
 
         model, provider = _build_gemini_model()
-        r2_client = _build_r2_client()
-
-        user_id_rows = (
-            db.query(models.User.id)
-            .filter(models.User.is_active.is_(True))
-            .order_by(models.User.id.asc())
+        storage = get_document_storage()
+        run_id = run_row.id
+
+        counts = _count_run_items(db, run_id)
+        if not counts:
+            pruned = _prune_run_items(db, run_date)
+            if pruned:
+                print(f"Daily AI notifier: pruned {pruned} run items older than {DAILY_AI_NOTIFIER_RUN_ITEM_RETENTION_DAYS} days")
+            run_row.users_total = _seed_run_items(db, run_id)
+            counts = {RUN_ITEM_PENDING: run_row.users_total}
+        else:
+            run_row.users_total = sum(counts.values())
+        _write_run_progress(db, run_row, counts)
+
+        open_user_ids = [
+            int(row[0])
+            for row in db.query(models.AIDailyNotificationRunItem.user_id)
+            .filter(
+                models.AIDailyNotificationRunItem.run_id == run_id,
+                models.AIDailyNotificationRunItem.status.in_(OPEN_RUN_ITEM_STATUSES),
+            )
+            .order_by(models.AIDailyNotificationRunItem.user_id.asc())
             .all()
-        )
-        user_ids = [int(row[0]) for row in user_id_rows]
-        if DAILY_AI_NOTIFIER_USER_LIMIT > 0:
-            user_ids = user_ids[:DAILY_AI_NOTIFIER_USER_LIMIT]
-
-        users_scanned = 0
-        notifications_sent = 0
-
-        for user_id in user_ids:
-            users_scanned += 1
-            sent = _process_single_user(user_id=user_id, model=model, r2_client=r2_client)
-            if sent:
-                notifications_sent += 1
-
-        run_row.status = "completed"
-        run_row.completed_at = datetime.utcnow()
-        run_row.users_scanned = users_scanned
-        run_row.notifications_sent = notifications_sent
-        db.commit()
+        ]
+        if resumed and open_user_ids:
+            print(f"Daily AI notifier: resuming run {run_date.isoformat()} with {len(open_user_ids)} users remaining")
+        open_user_ids, fingerprints = _filter_unchanged_users(db, run_id, open_user_ids, run_date)
+
+        limits = _RunLimits(stop_event)
+        interrupted = False
+        last_progress_write = time.monotonic()
+        max_in_flight = DAILY_AI_NOTIFIER_CONCURRENCY * 2
+        pending_ids = iter(open_user_ids)
+        in_flight = set()
+
+        with ThreadPoolExecutor(
+            max_workers=DAILY_AI_NOTIFIER_CONCURRENCY,
+            thread_name_prefix="daily-ai-notifier",
+        ) as executor:
+            while True:
+                while not limits.stopped() and len(in_flight) < max_in_flight:
+                    user_id = next(pending_ids, None)
+                    if user_id is None:
+                        break
+                    in_flight.add(
+                        executor.submit(
+                            _process_single_user,
+                            user_id,
+                            run_id,
+                            model,
+                            storage,
+                            limits,
+                            fingerprints.get(user_id),
+                        )
+                    )
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, timeout=DAILY_AI_NOTIFIER_PROGRESS_SECONDS, return_when=FIRST_COMPLETED)
+                if any(future.result() == RUN_ITEM_INTERRUPTED for future in done):
+                    interrupted = True
+
+                if time.monotonic() - last_progress_write >= DAILY_AI_NOTIFIER_PROGRESS_SECONDS:
+                    _write_run_progress(db, run_row, _count_run_items(db, run_id))
+                    last_progress_write = time.monotonic()
+
+        interrupted = interrupted or limits.stopped()
+        counts = _count_run_items(db, run_id)
+        if interrupted:
+            run_row.status = "failed"
+            run_row.error_message = "Interrupted before completion; remaining users resume on the next run."
+        else:
+            run_row.status = "completed"
+            run_row.completed_at = datetime.utcnow()
+        _write_run_progress(db, run_row, counts)
 
         return {
-            "status": "completed",
+            "status": "interrupted" if interrupted else "completed",
             "run_date": run_date.isoformat(),
             "provider": provider,
             "model": MODEL_NAME,
-            "users_scanned": users_scanned,
-            "notifications_sent": notifications_sent,
+            "resumed": resumed,
+            "users_total": run_row.users_total,
+            "users_scanned": run_row.users_scanned,
+            "users_failed": run_row.users_failed,
+            "users_unchanged": run_row.users_unchanged,
+            "notifications_sent": run_row.notifications_sent,
         }
     except Exception as exc:  # noqa: BLE001
         db.rollback()
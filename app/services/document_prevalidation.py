@@ -0,0 +1,315 @@
+"""
+Local pre-validation of uploaded documents, before anything is sent to Gemini.
+
+Cheap checks settle obvious cases in milliseconds:
+- the file is empty, or its magic bytes do not match its extension
+- an image cannot be decoded, or declares too many pixels
+- a PDF has no header or %%EOF marker (truncated upload)
+- a .txt file contains binary data
+
+Those uploads are rejected outright. Files that are readable but do not fit
+the document type's rules are flagged: they are stored and marked invalid
+without a Gemini call. The rules come from the document catalog
+(DocumentCatalogSnapshot.prevalidation_rules):
+- file_kinds: accepted kinds among "pdf", "image", "word", "text"
+- min_pages / max_pages: PDF page count range
+- min_image_edge: shortest acceptable image side in pixels
+- requires_text_layer: the PDF must contain selectable text, not only a scan
+
+Word documents are always flagged, since Gemini validation cannot read them.
+Everything else is forwarded to Gemini as before.
+
+PDF page counts and text-layer presence come from pypdf when it is installed.
+Otherwise they are read heuristically from the raw PDF objects and may be
+unknown. An unknown value never flags a document.
+"""
+import io
+import os
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from PIL import Image
+
+from app.utils.image_preprocessing import GEMINI_IMAGE_MAX_PIXELS
+
+# Optional: exact page counts and text extraction for PDFs
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = None
+    PYPDF_AVAILABLE = False
+
+DOCUMENT_PREVALIDATION_ENABLED = os.getenv("DOCUMENT_PREVALIDATION_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+# Images with a shorter side than this are flagged unless the catalog sets min_image_edge.
+DOCUMENT_PREVALIDATION_MIN_IMAGE_EDGE = max(1, int(os.getenv("DOCUMENT_PREVALIDATION_MIN_IMAGE_EDGE", "200") or "200"))
+
+PREVALIDATION_PASS = "pass"
+PREVALIDATION_FLAG = "flag"
+PREVALIDATION_REJECT = "reject"
+
+FILE_KINDS_BY_EXTENSION = {
+    ".pdf": "pdf",
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".gif": "image",
+    ".webp": "image",
+    ".doc": "word",
+    ".docx": "word",
+    ".txt": "text",
+}
+_FILE_KIND_LABELS = {
+    "pdf": "a PDF",
+    "image": "an image (JPG, PNG, GIF, WebP)",
+    "word": "a Word document",
+    "text": "a text file",
+}
+
+# PDF headers may be preceded by up to 1 KB of junk; readers accept that.
+_PDF_HEADER_WINDOW = 1024
+_TEXT_SNIFF_BYTES = 8192
+_PDF_TEXT_LAYER_PAGES = 3
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PDF_FONT_RE = re.compile(rb"/Font\b")
+_PDF_OBJECT_STREAM_RE = re.compile(rb"/ObjStm\b")
+
+
+class PrevalidationResult:
+    __slots__ = ("outcome", "reason", "message", "checks")
+
+    def __init__(self, outcome: str, reason: str, message: str, checks: dict[str, Any]) -> None:
+        self.outcome = outcome
+        self.reason = reason
+        self.message = message
+        self.checks = checks
+
+    def as_validation_details(self) -> dict[str, Any]:
+        """Shaped like a Gemini validation result, for the upload response."""
+        return {
+            "Document Validation": "No",
+            "Message": self.message,
+            "Prevalidation": {"reason": self.reason, **self.checks},
+        }
+
+
+def _matches_magic(kind: str, extension: str, head: bytes) -> bool:
+    if kind == "pdf":
+        return b"%PDF-" in head[:_PDF_HEADER_WINDOW]
+    if kind == "image":
+        # A renamed image (PNG saved as .jpg) is still readable, so any image signature will do.
+        return (
+            head.startswith(b"\xff\xd8\xff")
+            or head.startswith(b"\x89PNG\r\n\x1a\n")
+            or head[:6] in (b"GIF87a", b"GIF89a")
+            or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+        )
+    if kind == "word":
+        if extension == ".docx":
+            return head.startswith(b"PK\x03\x04")
+        return head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")
+    return True
+
+
+def _inspect_image(file_contents: bytes, checks: dict[str, Any]) -> Optional[tuple[str, str]]:
+    """Fill in image checks; returns (reason, message) when the image must be rejected."""
+    try:
+        image = Image.open(io.BytesIO(file_contents))
+        width, height = image.size
+    except Image.DecompressionBombError:
+        return "image_too_large", "The image is too large to process."
+    except OSError:
+        return "corrupt_image", "The image file is damaged or is not a supported image. Please upload it again."
+    checks.update({"format": image.format, "width": width, "height": height})
+    if width * height > GEMINI_IMAGE_MAX_PIXELS:
+        return "image_too_large", f"The image is too large to process ({width}x{height} pixels)."
+    try:
+        if image.format == "JPEG":
+            # Decode at 1/8 scale: cheap, but still reads the whole stream, so truncation shows up.
+            image.draft("RGB", (max(1, width // 8), max(1, height // 8)))
+            image.load()
+        else:
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        return "corrupt_image", "The image file is damaged or incomplete and cannot be opened. Please upload it again."
+    return None
+
+
+def _inspect_pdf(file_contents: bytes, checks: dict[str, Any]) -> Optional[tuple[str, str]]:
+    """Fill in page count and text-layer checks; returns (reason, message) when the PDF must be rejected."""
+    if b"%%EOF" not in file_contents:
+        return "corrupt_pdf", "The PDF file is damaged or incomplete. Please upload it again."
+    checks["encrypted"] = b"/Encrypt" in file_contents
+
+    if PYPDF_AVAILABLE:
+        try:
+            reader = PdfReader(io.BytesIO(file_contents), strict=False)
+            checks["pages"] = len(reader.pages)
+            checks["text_layer"] = any(
+                (page.extract_text() or "").strip()
+                for page in list(reader.pages)[:_PDF_TEXT_LAYER_PAGES]
+            )
+            return None
+        except Exception as exc:  # noqa: BLE001
+            # Gemini may still read a PDF pypdf cannot; fall back to the heuristics.
+            print(f"Warning: pypdf could not parse uploaded PDF: {str(exc)}")
+
+    # Without pypdf: count page objects and font resources in the raw bytes. Both can sit
+    # inside compressed object streams, in which case a zero count means "unknown".
+    has_object_streams = bool(_PDF_OBJECT_STREAM_RE.search(file_contents))
+    checks["pages"] = len(_PDF_PAGE_RE.findall(file_contents)) or None
+    if _PDF_FONT_RE.search(file_contents):
+        checks["text_layer"] = True
+    else:
+        checks["text_layer"] = None if has_object_streams else False
+    return None
+
+
+def _kinds_text(kinds: list[str]) -> str:
+    labels = [_FILE_KIND_LABELS.get(kind, kind) for kind in kinds]
+    return labels[0] if len(labels) == 1 else f"{', '.join(labels[:-1])} or {labels[-1]}"
+
+
+def prevalidate_document(
+    file_contents: bytes,
+    filename: str,
+    document_type: str,
+    rules: Optional[dict[str, Any]] = None,
+    document_label: Optional[str] = None,
+) -> PrevalidationResult:
+    """
+    Run the local checks for one upload.
+    Returns a PrevalidationResult whose outcome is "pass" (forward to Gemini),
+    "flag" (store as invalid without a Gemini call) or "reject" (refuse the upload).
+    """
+    started = time.perf_counter()
+    result = _prevalidate(file_contents, filename, rules or {}, document_label or document_type)
+    prevalidation_stats.record(result, (time.perf_counter() - started) * 1000)
+    return result
+
+
+def _prevalidate(file_contents: bytes, filename: str, rules: dict[str, Any], document_label: str) -> PrevalidationResult:
+    extension = os.path.splitext(filename or "")[1].lower()
+    kind = FILE_KINDS_BY_EXTENSION.get(extension, "unknown")
+    checks: dict[str, Any] = {"file_kind": kind, "size_bytes": len(file_contents)}
+
+    def reject(reason: str, message: str) -> PrevalidationResult:
+        return PrevalidationResult(PREVALIDATION_REJECT, reason, message, checks)
+
+    def flag(reason: str, message: str) -> PrevalidationResult:
+        return PrevalidationResult(PREVALIDATION_FLAG, reason, message, checks)
+
+    if not file_contents:
+        return reject("empty_file", "The uploaded file is empty.")
+    head = file_contents[:_PDF_HEADER_WINDOW]
+    if not _matches_magic(kind, extension, head):
+        return reject(
+            "content_mismatch",
+            f"The file content does not match its {extension or 'file'} extension. Please upload the original file.",
+        )
+
+    if kind == "image":
+        problem = _inspect_image(file_contents, checks)
+        if problem:
+            return reject(*problem)
+    elif kind == "pdf":
+        problem = _inspect_pdf(file_contents, checks)
+        if problem:
+            return reject(*problem)
+    elif kind == "text":
+        sample = file_contents[:_TEXT_SNIFF_BYTES]
+        if b"\x00" in sample:
+            return reject("binary_text_file", "The text file contains binary data. Please upload a plain text file.")
+        if not file_contents.decode("utf-8", errors="ignore").strip():
+            return reject("empty_file", "The uploaded text file is empty.")
+
+    file_kinds = rules.get("file_kinds")
+    if file_kinds and kind not in file_kinds:
+        return flag(
+            "file_kind_not_accepted",
+            f"{document_label} must be uploaded as {_kinds_text(file_kinds)}.",
+        )
+    if kind == "word":
+        return flag(
+            "unsupported_for_ai",
+            "Word documents cannot be validated automatically. "
+            "Please upload a PDF or image version, or verify this document manually.",
+        )
+
+    if kind == "image":
+        min_edge = int(rules.get("min_image_edge") or DOCUMENT_PREVALIDATION_MIN_IMAGE_EDGE)
+        if min(checks["width"], checks["height"]) < min_edge:
+            return flag(
+                "image_too_small",
+                f"The image is too small to read ({checks['width']}x{checks['height']} pixels). "
+                f"Please upload a clearer scan or photo, at least {min_edge} pixels on each side.",
+            )
+    elif kind == "pdf":
+        pages = checks.get("pages")
+        if pages is not None:
+            min_pages, max_pages = rules.get("min_pages"), rules.get("max_pages")
+            if min_pages and pages < min_pages:
+                return flag(
+                    "too_few_pages",
+                    f"{document_label} should have at least {min_pages} page(s), but this PDF has {pages}. "
+                    "Please upload the complete document.",
+                )
+            if max_pages and pages > max_pages:
+                return flag(
+                    "too_many_pages",
+                    f"{document_label} should have at most {max_pages} page(s), but this PDF has {pages}. "
+                    "Please upload only the relevant pages.",
+                )
+        if rules.get("requires_text_layer") and checks.get("text_layer") is False:
+            return flag(
+                "no_text_layer",
+                f"{document_label} should be the original PDF with selectable text, not a scan. "
+                "Please upload the PDF you downloaded or received.",
+            )
+
+    return PrevalidationResult(PREVALIDATION_PASS, "ok", "", checks)
+
+
+class PrevalidationStats:
+    """Running outcome counts; skip_rate is the share of uploads that never reached Gemini."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._outcomes = {PREVALIDATION_PASS: 0, PREVALIDATION_FLAG: 0, PREVALIDATION_REJECT: 0}
+        self._reasons: dict[str, int] = {}
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+
+    def record(self, result: PrevalidationResult, elapsed_ms: float) -> None:
+        with self._lock:
+            self._outcomes[result.outcome] += 1
+            if result.outcome != PREVALIDATION_PASS:
+                self._reasons[result.reason] = self._reasons.get(result.reason, 0) + 1
+            self._total_ms += elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            checked = sum(self._outcomes.values())
+            skipped = self._outcomes[PREVALIDATION_FLAG] + self._outcomes[PREVALIDATION_REJECT]
+            return {
+                "enabled": DOCUMENT_PREVALIDATION_ENABLED,
+                "pypdf_available": PYPDF_AVAILABLE,
+                "checked": checked,
+                "passed": self._outcomes[PREVALIDATION_PASS],
+                "flagged": self._outcomes[PREVALIDATION_FLAG],
+                "rejected": self._outcomes[PREVALIDATION_REJECT],
+                "skip_rate": round(skipped / checked, 3) if checked else 0.0,
+                "reasons": dict(sorted(self._reasons.items(), key=lambda item: -item[1])),
+                "avg_ms": round(self._total_ms / checked, 2) if checked else 0.0,
+                "max_ms": round(self._max_ms, 2),
+            }
+
+
+prevalidation_stats = PrevalidationStats()
+
+
+def get_prevalidation_stats() -> dict[str, Any]:
+    return prevalidation_stats.stats()
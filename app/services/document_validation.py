@@ -0,0 +1,409 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.utils.gemini_service import VALIDATION_FALLBACK_FLAG, validate_and_extract_document
+from app.services.student_profile import mark_student_profile_stale
+from app.services.validation_cache import (
+    get_cached_validation,
+    store_validation_result,
+    validation_cache_key,
+)
+from app.utils.object_storage import get_document_storage
+from app.utils.secure_artifacts import encrypt_artifact_bytes
+
+VALIDATION_STATUS_PENDING = "pending"
+VALIDATION_STATUS_PROCESSING = "processing"
+VALIDATION_STATUS_COMPLETED = "completed"
+VALIDATION_STATUS_FAILED = "failed"
+IN_FLIGHT_VALIDATION_STATUSES = {VALIDATION_STATUS_PENDING, VALIDATION_STATUS_PROCESSING}
+
+DOCUMENT_VALIDATION_WORKERS = max(1, int(os.getenv("DOCUMENT_VALIDATION_WORKERS", "4") or "4"))
+# Jobs admitted at once (running + queued). Each pins its plaintext upload in memory.
+DOCUMENT_VALIDATION_MAX_PENDING = max(
+    DOCUMENT_VALIDATION_WORKERS,
+    int(os.getenv("DOCUMENT_VALIDATION_MAX_PENDING", str(DOCUMENT_VALIDATION_WORKERS * 4)) or "16"),
+)
+DOCUMENT_VALIDATION_STALE_MINUTES = max(1, int(os.getenv("DOCUMENT_VALIDATION_STALE_MINUTES", "15") or "15"))
+# Each process refreshes validation_heartbeat_at on the in-flight documents it owns this often.
+DOCUMENT_VALIDATION_HEARTBEAT_SECONDS = max(5, int(os.getenv("DOCUMENT_VALIDATION_HEARTBEAT_SECONDS", "30") or "30"))
+# In-flight documents whose heartbeat is older than this belong to a dead process and are failed.
+DOCUMENT_VALIDATION_ORPHAN_SECONDS = max(
+    DOCUMENT_VALIDATION_HEARTBEAT_SECONDS * 2,
+    int(os.getenv("DOCUMENT_VALIDATION_ORPHAN_SECONDS", "120") or "120"),
+)
+
+PENDING_VALIDATION_MESSAGE = "Rilono AI is validating your document. This usually takes less than a minute."
+BUSY_VALIDATION_MESSAGE = (
+    "Document uploaded but Rilono AI was too busy to validate it. "
+    "Please delete and re-upload the document to validate it."
+)
+INTERRUPTED_VALIDATION_MESSAGE = (
+    "Document uploaded but validation was interrupted. "
+    "Please delete and re-upload the document to validate it."
+)
+
+
+class DocumentValidationWorkerPool:
+    """
+    Thread pool that runs Gemini validation/extraction off the request path.
+    Plaintext file bytes only live in memory for the lifetime of the job, so admission
+    is capped at max_pending jobs (running + queued); ThreadPoolExecutor's own queue is
+    unbounded. Tracks which documents it owns so their heartbeat can be kept fresh.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int) -> None:
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._jobs: dict[int, bool] = {}  # document_id -> started
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="document-validation",
+                )
+            return self._executor
+
+    def has_capacity(self) -> bool:
+        with self._lock:
+            return len(self._jobs) < self._max_pending
+
+    def submit(self, owner_document_id: int, fn, /, *args, **kwargs) -> bool:
+        """Queue a job; returns False without queueing when max_pending jobs are already admitted."""
+        with self._lock:
+            if len(self._jobs) >= self._max_pending:
+                return False
+            self._jobs[owner_document_id] = False
+        try:
+            self._get_executor().submit(self._run_job, owner_document_id, fn, args, kwargs)
+        except RuntimeError:
+            # Pool shut down concurrently.
+            with self._lock:
+                self._jobs.pop(owner_document_id, None)
+            return False
+        return True
+
+    def _run_job(self, document_id: int, fn, args, kwargs) -> None:
+        with self._lock:
+            self._jobs[document_id] = True
+        try:
+            fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._jobs.pop(document_id, None)
+
+    def owned_document_ids(self) -> list[int]:
+        with self._lock:
+            return list(self._jobs)
+
+    def shutdown(self) -> list[int]:
+        """Stop the pool; returns the documents whose queued jobs were cancelled before starting."""
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+            cancelled = [document_id for document_id, started in self._jobs.items() if not started]
+            for document_id in cancelled:
+                self._jobs.pop(document_id, None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return cancelled
+
+
+_worker_pool = DocumentValidationWorkerPool(
+    max_workers=DOCUMENT_VALIDATION_WORKERS,
+    max_pending=DOCUMENT_VALIDATION_MAX_PENDING,
+)
+
+
+def document_validation_has_capacity() -> bool:
+    return _worker_pool.has_capacity()
+
+
+def submit_document_validation(
+    document_id: int,
+    user_id: int,
+    file_contents: bytes,
+    filename: str,
+    content_type: str,
+    document_type: str,
+    cache_key: Optional[str] = None,
+) -> bool:
+    """
+    Queue Gemini validation for a freshly stored document. The result is memoized under cache_key.
+    Returns False when the queue is full; the caller should then fail the document.
+    """
+    return _worker_pool.submit(
+        document_id,
+        _run_document_validation,
+        document_id=document_id,
+        user_id=user_id,
+        file_contents=file_contents,
+        filename=filename,
+        content_type=content_type,
+        document_type=document_type,
+        cache_key=cache_key,
+    )
+
+
+def _store_validation_artifact(user_id: int, validation_result: dict) -> str:
+    validation_json = json.dumps(validation_result, indent=2)
+    encrypted_extracted_text_bytes = encrypt_artifact_bytes(validation_json.encode("utf-8"))
+    return get_document_storage().put_bytes(
+        f"user_{user_id}/{uuid.uuid4()}_extracted.txt",
+        encrypted_extracted_text_bytes,
+        content_type="application/octet-stream",
+        metadata={"uploaded-by": "rilono-system", "encrypted": "true"},
+    )
+
+
+def apply_cached_document_validation(
+    db: Session,
+    document: models.Document,
+    file_contents: bytes,
+    bypass_cache: bool = False,
+) -> tuple[Optional[dict], str]:
+    """
+    Complete validation from a memoized result for identical bytes, if there is one.
+    Returns (cached result or None, cache key to memoize a fresh result under).
+    The caller commits.
+    """
+    cache_key = validation_cache_key(
+        document.user_id, file_contents, document.document_type, datetime.now().date()
+    )
+    validation_result = get_cached_validation(db, cache_key, bypass=bypass_cache)
+    if validation_result is None:
+        return None, cache_key
+    document.is_valid = validation_result.get("Document Validation", "No").upper() == "YES"
+    document.validation_message = validation_result.get("Message", "")
+    document.extracted_text_file_url = _store_validation_artifact(document.user_id, validation_result)
+    document.is_processed = True
+    document.validation_status = VALIDATION_STATUS_COMPLETED
+    return validation_result, cache_key
+
+
+def apply_prevalidation_flag(document: models.Document, prevalidation) -> None:
+    """Complete validation locally for an upload that pre-validation flagged; Gemini is not called."""
+    document.is_valid = False
+    document.validation_message = prevalidation.message
+    document.extracted_text_file_url = None
+    document.is_processed = False
+    document.validation_status = VALIDATION_STATUS_COMPLETED
+
+
+class DocumentValidationSweeper:
+    """
+    Refreshes the heartbeat on documents this process owns and fails in-flight
+    documents whose owner stopped refreshing them (crash, restart, redeploy).
+    """
+
+    def __init__(self) -> None:
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run_loop,
+            name="document-validation-sweeper",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(DOCUMENT_VALIDATION_HEARTBEAT_SECONDS):
+            session = SessionLocal()
+            try:
+                refresh_document_validation_heartbeats(session, _worker_pool.owned_document_ids())
+                failed = fail_interrupted_document_validations(session)
+                if failed:
+                    print(f"Document validation sweeper: failed {failed} orphaned validation(s)")
+            except Exception as exc:  # noqa: BLE001
+                session.rollback()
+                print(f"Document validation sweeper error: {str(exc)}")
+            finally:
+                session.close()
+
+
+_sweeper = DocumentValidationSweeper()
+
+
+def start_document_validation_sweeper() -> None:
+    _sweeper.start()
+
+
+def stop_document_validation_workers() -> None:
+    _sweeper.stop()
+    cancelled = _worker_pool.shutdown()
+    if not cancelled:
+        return
+    # Queued jobs dropped by the shutdown would otherwise stay pending until another process sweeps them.
+    session = SessionLocal()
+    try:
+        session.query(models.Document).filter(
+            models.Document.id.in_(cancelled),
+            models.Document.validation_status.in_(IN_FLIGHT_VALIDATION_STATUSES),
+        ).update(
+            {
+                models.Document.is_valid: False,
+                models.Document.validation_message: INTERRUPTED_VALIDATION_MESSAGE,
+                models.Document.validation_status: VALIDATION_STATUS_FAILED,
+            },
+            synchronize_session=False,
+        )
+        session.commit()
+    except Exception as exc:  # noqa: BLE001
+        session.rollback()
+        print(f"Warning: Failed to mark cancelled document validations: {str(exc)}")
+    finally:
+        session.close()
+
+
+def refresh_document_validation_heartbeats(db: Session, document_ids: list[int]) -> None:
+    if not document_ids:
+        return
+    db.query(models.Document).filter(models.Document.id.in_(document_ids)).update(
+        {models.Document.validation_heartbeat_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _run_document_validation(
+    document_id: int,
+    user_id: int,
+    file_contents: bytes,
+    filename: str,
+    content_type: str,
+    document_type: str,
+    cache_key: Optional[str] = None,
+) -> None:
+    session = SessionLocal()
+    try:
+        document = session.get(models.Document, document_id)
+        if not document:
+            # Deleted before the worker picked it up.
+            return
+        document.validation_status = VALIDATION_STATUS_PROCESSING
+        document.validation_heartbeat_at = datetime.utcnow()
+        session.commit()
+
+        extracted_text_file_url = None
+        is_processed = False
+        try:
+            validation_result = validate_and_extract_document(
+                file_contents,
+                filename,
+                content_type,
+                document_type,
+                current_date_for_evaluation=datetime.now().isoformat(),
+            )
+
+            if validation_result:
+                # A reply Gemini got wrong once must not be replayed for every identical re-upload.
+                cacheable = not validation_result.pop(VALIDATION_FALLBACK_FLAG, False)
+                is_valid = validation_result.get("Document Validation", "No").upper() == "YES"
+                validation_message = validation_result.get("Message", "")
+
+                if session.get(models.Document, document_id) is None:
+                    return
+
+                extracted_text_file_url = _store_validation_artifact(user_id, validation_result)
+                is_processed = True
+                if cache_key and cacheable:
+                    try:
+                        store_validation_result(session, cache_key, user_id, document_type, validation_result)
+                    except Exception as exc:  # noqa: BLE001
+                        session.rollback()
+                        print(f"Warning: Failed to cache validation result for document_id={document_id}: {str(exc)}")
+            else:
+                # If validation_result is None (Gemini returned None), mark as invalid
+                is_valid = False
+                validation_message = (
+                    "Document uploaded but validation could not be completed. "
+                    "Please verify your document manually."
+                )
+        except Exception as exc:  # noqa: BLE001
+            print(f"Warning: Failed to process document with Gemini: {str(exc)}")
+            is_valid = False
+            validation_message = "Document uploaded but validation failed. Please verify your document manually."
+
+        document = session.get(models.Document, document_id)
+        if not document:
+            return
+        document.is_valid = is_valid
+        document.validation_message = validation_message
+        document.extracted_text_file_url = extracted_text_file_url
+        document.is_processed = is_processed
+        document.validation_status = VALIDATION_STATUS_COMPLETED
+        mark_student_profile_stale(session, user_id)
+        session.commit()
+    except Exception as exc:  # noqa: BLE001
+        session.rollback()
+        print(f"Document validation worker error for document_id={document_id}: {str(exc)}")
+        try:
+            document = session.get(models.Document, document_id)
+            if document and document.validation_status in IN_FLIGHT_VALIDATION_STATUSES:
+                document.is_valid = False
+                document.validation_message = "Document uploaded but validation failed. Please verify your document manually."
+                document.validation_status = VALIDATION_STATUS_FAILED
+                session.commit()
+        except Exception:  # noqa: BLE001
+            session.rollback()
+    finally:
+        session.close()
+
+
+def fail_interrupted_document_validations(db: Session) -> int:
+    """
+    Mark validations orphaned by a process restart or crash as failed.
+    The plaintext is never persisted (zero-knowledge), so the job cannot be replayed.
+    A row is orphaned once its heartbeat is older than DOCUMENT_VALIDATION_ORPHAN_SECONDS;
+    live processes, including sibling workers, keep refreshing theirs. Rows from before
+    heartbeats existed fall back to the DOCUMENT_VALIDATION_STALE_MINUTES age threshold.
+    Runs at startup and periodically from the sweeper.
+    """
+    now = datetime.utcnow()
+    orphan_cutoff = now - timedelta(seconds=DOCUMENT_VALIDATION_ORPHAN_SECONDS)
+    legacy_cutoff = now - timedelta(minutes=DOCUMENT_VALIDATION_STALE_MINUTES)
+    query = db.query(models.Document).filter(
+        models.Document.validation_status.in_(IN_FLIGHT_VALIDATION_STATUSES),
+        or_(
+            models.Document.validation_heartbeat_at < orphan_cutoff,
+            and_(
+                models.Document.validation_heartbeat_at.is_(None),
+                models.Document.created_at < legacy_cutoff,
+            ),
+        ),
+    )
+    owned = _worker_pool.owned_document_ids()
+    if owned:
+        query = query.filter(~models.Document.id.in_(owned))
+    stale_documents = query.all()
+    for document in stale_documents:
+        document.is_valid = False
+        document.validation_message = INTERRUPTED_VALIDATION_MESSAGE
+        document.validation_status = VALIDATION_STATUS_FAILED
+
+    if stale_documents:
+        db.commit()
+    return len(stale_documents)
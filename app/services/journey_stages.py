@@ -0,0 +1,254 @@
+"""
+Compiled visa journey stage rules.
+
+Stage-gate rules from the document catalog are compiled once per catalog
+version into integer bitsets over document-type indices. A user's state is two
+bitsets (uploaded types, validated types), which can be built from a compact
+(document_type, is_valid) projection instead of full Document rows, and every
+stage check is a couple of mask comparisons.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.document_catalog import (
+    DocumentCatalogSnapshot,
+    build_journey_stages,
+    default_document_type_payload,
+    get_document_catalog_snapshot,
+)
+
+# Users per IN (...) batch for bulk stage queries; stays below common bind-parameter limits.
+BULK_STAGE_USER_BATCH_SIZE = 900
+
+# Columns needed by stage calculation and the visa-status/profile payloads.
+JOURNEY_DOCUMENT_COLUMNS = (
+    models.Document.id,
+    models.Document.document_type,
+    models.Document.is_valid,
+    models.Document.original_filename,
+    models.Document.created_at,
+    models.Document.intake,
+    models.Document.year,
+)
+
+
+class StageResult:
+    __slots__ = ("current_stage", "completed_stage_count", "completion_map")
+
+    def __init__(self, current_stage: int, completed_stage_count: int, completion_map: dict[int, bool]) -> None:
+        self.current_stage = current_stage
+        self.completed_stage_count = completed_stage_count
+        self.completion_map = completion_map
+
+
+class _StageGate:
+    __slots__ = ("stage", "uploaded_mask", "validated_mask", "groups")
+
+    def __init__(self, stage: int) -> None:
+        self.stage = stage
+        # Direct rules: every bit must be present in the matching user mask.
+        self.uploaded_mask = 0
+        self.validated_mask = 0
+        # Grouped rules: at least one bit of each (uploaded, validated) pair must be present.
+        self.groups: list[tuple[int, int]] = []
+
+    def is_complete(self, uploaded: int, validated: int) -> bool:
+        if uploaded & self.uploaded_mask != self.uploaded_mask:
+            return False
+        if validated & self.validated_mask != self.validated_mask:
+            return False
+        for group_uploaded, group_validated in self.groups:
+            if not (uploaded & group_uploaded or validated & group_validated):
+                return False
+        return True
+
+
+class CompiledJourneyRules:
+    def __init__(self, catalog_version: Optional[int], document_types: list[dict[str, Any]], journey_stages: list[dict[str, Any]]) -> None:
+        self.catalog_version = catalog_version
+        self.journey_stages = journey_stages
+        self.type_bits: dict[str, int] = {}
+        for row in document_types:
+            if row["value"] not in self.type_bits:
+                self.type_bits[row["value"]] = 1 << len(self.type_bits)
+
+        self.stage_numbers = sorted(stage["stage"] for stage in journey_stages)
+        self.stage_info_by_number = {stage["stage"]: stage for stage in journey_stages}
+        self.total_stages = len(journey_stages) if journey_stages else 1
+
+        gates = {number: _StageGate(number) for number in self.stage_numbers}
+        grouped: dict[tuple[int, str], list[int]] = {}
+        for row in document_types:
+            gate = gates.get(row.get("journey_stage"))
+            if gate is None or not row.get("stage_gate_required"):
+                continue
+            bit = self.type_bits[row["value"]]
+            requires_validation = bool(row.get("stage_gate_requires_validation"))
+            group_key = row.get("stage_gate_group")
+            if group_key:
+                pair = grouped.setdefault((gate.stage, group_key), [0, 0])
+                pair[1 if requires_validation else 0] |= bit
+            elif requires_validation:
+                gate.validated_mask |= bit
+            else:
+                gate.uploaded_mask |= bit
+        for (stage_number, _), (uploaded_bits, validated_bits) in grouped.items():
+            gates[stage_number].groups.append((uploaded_bits, validated_bits))
+        self.gates = [gates[number] for number in self.stage_numbers]
+
+    def masks_for(self, rows: Iterable[tuple[Optional[str], Optional[bool]]]) -> tuple[int, int]:
+        """(uploaded, validated) bitsets from (document_type, is_valid) pairs."""
+        uploaded = 0
+        validated = 0
+        type_bits = self.type_bits
+        for document_type, is_valid in rows:
+            bit = type_bits.get(document_type)
+            if not bit:
+                continue
+            uploaded |= bit
+            if is_valid is True:
+                validated |= bit
+        return uploaded, validated
+
+    def evaluate(self, uploaded: int, validated: int) -> StageResult:
+        completion_map = {gate.stage: gate.is_complete(uploaded, validated) for gate in self.gates}
+
+        # Progress to stage N only when stage N-1 is completed and stage N requirements are also met.
+        current_stage = 1
+        for stage_number in self.stage_numbers:
+            if stage_number <= 1:
+                continue
+            if completion_map.get(stage_number - 1, True) and completion_map.get(stage_number, False):
+                current_stage = stage_number
+                continue
+            break
+
+        completed_stage_count = 0
+        for stage_number in self.stage_numbers:
+            if not completion_map.get(stage_number):
+                break
+            completed_stage_count += 1
+
+        return StageResult(current_stage, completed_stage_count, completion_map)
+
+    def stage_info(self, stage_number: int) -> dict[str, Any]:
+        stage = self.stage_info_by_number.get(stage_number)
+        if stage is not None:
+            return stage
+        return self.journey_stages[0] if self.journey_stages else {}
+
+    def progress_percent(self, result: StageResult) -> int:
+        return round((result.completed_stage_count / max(self.total_stages, 1)) * 100)
+
+
+_compiled_lock = threading.Lock()
+_compiled_rules: Optional[tuple[DocumentCatalogSnapshot, CompiledJourneyRules]] = None
+_default_rules: Optional[CompiledJourneyRules] = None
+
+
+def _compile_rules(catalog_version: Optional[int], document_types: list[dict[str, Any]], journey_stages: Optional[list[dict[str, Any]]]) -> CompiledJourneyRules:
+    if not document_types:
+        # Fallback to built-in defaults if the DB catalog is unavailable or empty.
+        document_types = default_document_type_payload()
+        journey_stages = None
+    if journey_stages is None:
+        journey_stages = build_journey_stages(document_types)
+    return CompiledJourneyRules(catalog_version, document_types, journey_stages)
+
+
+def get_compiled_journey_rules(db: Optional[Session] = None) -> CompiledJourneyRules:
+    """Compiled rules for the current catalog snapshot; recompiled only when the snapshot changes."""
+    global _compiled_rules, _default_rules
+    if db is None:
+        if _default_rules is None:
+            _default_rules = _compile_rules(None, [], None)
+        return _default_rules
+
+    snapshot = get_document_catalog_snapshot(db)
+    cached = _compiled_rules
+    if cached is not None and cached[0] is snapshot:
+        return cached[1]
+    with _compiled_lock:
+        cached = _compiled_rules
+        if cached is None or cached[0] is not snapshot:
+            rules = _compile_rules(
+                snapshot.version,
+                list(snapshot.document_types),
+                list(snapshot.journey_stages),
+            )
+            cached = (snapshot, rules)
+            _compiled_rules = cached
+    return cached[1]
+
+
+def load_journey_document_rows(db: Session, user_id: int) -> list:
+    """Lightweight document rows (no ORM hydration) for stage and profile calculation."""
+    return db.query(*JOURNEY_DOCUMENT_COLUMNS).filter(models.Document.user_id == user_id).all()
+
+
+def compute_user_stage(db: Session, user_id: int) -> StageResult:
+    rules = get_compiled_journey_rules(db)
+    rows = (
+        db.query(models.Document.document_type, models.Document.is_valid)
+        .filter(models.Document.user_id == user_id, models.Document.document_type.isnot(None))
+        .all()
+    )
+    return rules.evaluate(*rules.masks_for(rows))
+
+
+def compute_stages_for_users(db: Session, user_ids: Optional[Iterable[int]] = None) -> dict[int, StageResult]:
+    """
+    Current stage for many users in one pass over a (user_id, document_type, is_valid)
+    projection. With user_ids=None every user is included; unknown ids are skipped.
+    """
+    rules = get_compiled_journey_rules(db)
+    if user_ids is None:
+        target_ids = [row[0] for row in db.query(models.User.id).all()]
+    else:
+        requested_ids = list(dict.fromkeys(user_ids))
+        target_ids = []
+        for start in range(0, len(requested_ids), BULK_STAGE_USER_BATCH_SIZE):
+            batch = requested_ids[start:start + BULK_STAGE_USER_BATCH_SIZE]
+            target_ids.extend(row[0] for row in db.query(models.User.id).filter(models.User.id.in_(batch)).all())
+
+    masks: dict[int, list[int]] = {user_id: [0, 0] for user_id in target_ids}
+    type_bits = rules.type_bits
+    base_query = db.query(
+        models.Document.user_id,
+        models.Document.document_type,
+        models.Document.is_valid,
+    ).filter(models.Document.document_type.isnot(None))
+
+    if user_ids is None:
+        batches = [base_query]
+    else:
+        batches = [
+            base_query.filter(models.Document.user_id.in_(target_ids[start:start + BULK_STAGE_USER_BATCH_SIZE]))
+            for start in range(0, len(target_ids), BULK_STAGE_USER_BATCH_SIZE)
+        ]
+    for query in batches:
+        for user_id, document_type, is_valid in query.yield_per(5000):
+            bit = type_bits.get(document_type)
+            user_masks = masks.get(user_id)
+            if not bit or user_masks is None:
+                continue
+            user_masks[0] |= bit
+            if is_valid is True:
+                user_masks[1] |= bit
+
+    # Users sharing the same document state share one evaluation.
+    evaluated: dict[tuple[int, int], StageResult] = {}
+    results: dict[int, StageResult] = {}
+    for user_id, (uploaded, validated) in masks.items():
+        key = (uploaded, validated)
+        result = evaluated.get(key)
+        if result is None:
+            result = rules.evaluate(uploaded, validated)
+            evaluated[key] = result
+        results[user_id] = result
+    return results
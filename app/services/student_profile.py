@@ -0,0 +1,134 @@
+"""
+Student profile snapshot service.
+
+STUDENT_PROFILE_AND_F1_VISA_STATUS.json is derived entirely from DB state: the
+user row, their documents, subscription and the document catalog. Mutations of
+those inputs only bump users.profile_version inside their own transaction. The
+JSON is rendered lazily when a consumer (AI chat, daily notifier, visa status)
+asks for it and is stored encrypted in student_profile_snapshots together with
+the version it was rendered from, so a stale render is never served.
+"""
+import json
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app import models
+from app.document_catalog import get_document_catalog_snapshot
+from app.services.journey_stages import load_journey_document_rows
+from app.utils.secure_artifacts import decrypt_artifact_bytes, encrypt_artifact_bytes
+
+
+class StudentProfileSnapshot:
+    def __init__(self, user_id: int, raw_json: str, data: dict, version: int, refreshed: bool) -> None:
+        self.user_id = user_id
+        self.raw_json = raw_json
+        self.data = data
+        self.version = version
+        self.refreshed = refreshed
+
+
+def mark_student_profile_stale(db: Session, user_id: int) -> None:
+    """
+    Bump the user's profile version. Call inside the mutating transaction;
+    the caller's commit makes the change visible together with the mutation.
+    """
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.profile_version: models.User.profile_version + 1},
+        synchronize_session="fetch",
+    )
+
+
+def _write_snapshot_row(db: Session, user_id: int, version: int, encrypted_payload: str) -> None:
+    row = db.get(models.StudentProfileSnapshot, user_id)
+    if row is None:
+        row = models.StudentProfileSnapshot(user_id=user_id)
+        db.add(row)
+    elif (row.profile_version or 0) > version:
+        # A concurrent render already stored a newer version.
+        return
+    row.profile_version = version
+    row.encrypted_payload = encrypted_payload
+    row.rendered_at = func.now()
+    db.commit()
+
+
+def store_student_profile_snapshot(db: Session, user: models.User, payload: dict) -> StudentProfileSnapshot:
+    """Encrypt and persist a freshly rendered profile payload, returning it without a read-back."""
+    raw_json = json.dumps(payload, indent=2, default=str)
+    encrypted_payload = encrypt_artifact_bytes(raw_json.encode("utf-8")).decode("ascii")
+    version = payload.get("profile_version", 0)
+    user_id = user.id
+
+    try:
+        _write_snapshot_row(db, user_id, version, encrypted_payload)
+    except IntegrityError:
+        # Another request inserted the first snapshot row concurrently; update it instead.
+        db.rollback()
+        _write_snapshot_row(db, user_id, version, encrypted_payload)
+
+    return StudentProfileSnapshot(
+        user_id=user_id,
+        raw_json=raw_json,
+        data=json.loads(raw_json),
+        version=version,
+        refreshed=True,
+    )
+
+
+def refresh_student_profile_snapshot(user: models.User, db: Session) -> StudentProfileSnapshot:
+    from app.routers.documents import build_student_profile_payload, calculate_visa_journey_stage
+
+    documents = load_journey_document_rows(db, user.id)
+    status_data = calculate_visa_journey_stage(documents, db)
+    return store_student_profile_snapshot(
+        db,
+        user,
+        build_student_profile_payload(user, status_data, documents, db=db),
+    )
+
+
+def load_stored_student_profile(db: Session, user_id: int) -> Optional[StudentProfileSnapshot]:
+    """Last rendered snapshot as-is (no staleness check), or None if none was rendered yet."""
+    row = db.get(models.StudentProfileSnapshot, user_id)
+    if row is None or not row.encrypted_payload:
+        return None
+    try:
+        raw_json = decrypt_artifact_bytes(row.encrypted_payload.encode("ascii")).decode("utf-8")
+        data = json.loads(raw_json)
+    except Exception as exc:  # noqa: BLE001
+        print(f"Warning: Failed to load student profile snapshot for user_id={user_id}: {str(exc)}")
+        return None
+    if not isinstance(data, dict):
+        return None
+    return StudentProfileSnapshot(
+        user_id=user_id,
+        raw_json=raw_json,
+        data=data,
+        version=row.profile_version or 0,
+        refreshed=False,
+    )
+
+
+def get_student_profile_snapshot(user: models.User, db: Session) -> StudentProfileSnapshot:
+    """
+    Current profile snapshot: one primary-key read, plus a render when the stored
+    copy is missing or was rendered from an older profile_version or catalog version.
+    """
+    stored = load_stored_student_profile(db, user.id)
+    if (
+        stored is not None
+        and stored.version == (user.profile_version or 0)
+        and stored.data.get("catalog_version") == get_document_catalog_snapshot(db).version
+    ):
+        return stored
+    try:
+        return refresh_student_profile_snapshot(user, db)
+    except Exception as exc:  # noqa: BLE001
+        db.rollback()
+        if stored is None:
+            raise
+        print(f"Warning: Failed to refresh student profile for user_id={user.id}, serving last snapshot: {str(exc)}")
+        return stored
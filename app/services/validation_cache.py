@@ -0,0 +1,190 @@
+"""
+Memoized Gemini document validation results.
+
+An identical re-upload (same bytes, same document type) reuses the previous
+validation instead of sending the file to Gemini again. Entries are keyed by an
+HMAC over the user id, the SHA-256 of the plaintext, the document type, the
+validation prompt version and the evaluation-date bucket. Date-sensitive checks
+(expiry, statement age) are therefore recomputed once the bucket rolls over.
+
+The key is user-scoped and keyed with the server secret, so the table never
+reveals a plaintext hash or whether two users uploaded the same file. Results
+are stored artifact-encrypted, like the extracted JSON files in R2.
+
+Entries expire after DOCUMENT_VALIDATION_CACHE_TTL_HOURS. The table is capped
+by entry count and total size, and the least recently used entries are evicted
+first.
+"""
+import hashlib
+import hmac
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.gemini_service import VALIDATION_PROMPT_VERSION
+from app.utils.secure_artifacts import decrypt_artifact_bytes, encrypt_artifact_bytes
+
+DOCUMENT_VALIDATION_CACHE_ENABLED = os.getenv("DOCUMENT_VALIDATION_CACHE_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+DOCUMENT_VALIDATION_CACHE_TTL_HOURS = max(1, int(os.getenv("DOCUMENT_VALIDATION_CACHE_TTL_HOURS", "72") or "72"))
+DOCUMENT_VALIDATION_CACHE_MAX_ENTRIES = max(1, int(os.getenv("DOCUMENT_VALIDATION_CACHE_MAX_ENTRIES", "20000") or "20000"))
+DOCUMENT_VALIDATION_CACHE_MAX_MB = max(1, int(os.getenv("DOCUMENT_VALIDATION_CACHE_MAX_MB", "256") or "256"))
+# Results are reused only within the same window of evaluation dates.
+DOCUMENT_VALIDATION_CACHE_DATE_BUCKET_DAYS = max(1, int(os.getenv("DOCUMENT_VALIDATION_CACHE_DATE_BUCKET_DAYS", "1") or "1"))
+
+_HMAC_KEY = hashlib.sha256(
+    b"rilono-validation-cache:"
+    + (os.getenv("ARTIFACT_ENCRYPTION_KEY", "").strip() or os.getenv("SECRET_KEY", "").strip()).encode("utf-8")
+).digest()
+# Eviction runs at most this often per process; expired rows are ignored on read meanwhile.
+_EVICTION_INTERVAL_SECONDS = 60
+
+
+class _ValidationCacheStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "evicted": 0, "errors": 0}
+        self.last_eviction_at = 0.0
+
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def eviction_due(self, now: float) -> bool:
+        with self._lock:
+            if now - self.last_eviction_at < _EVICTION_INTERVAL_SECONDS:
+                return False
+            self.last_eviction_at = now
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+_stats = _ValidationCacheStats()
+
+
+def evaluation_date_bucket(evaluation_date: date) -> int:
+    return evaluation_date.toordinal() // DOCUMENT_VALIDATION_CACHE_DATE_BUCKET_DAYS
+
+
+def validation_cache_key(user_id: int, file_contents: bytes, document_type: str, evaluation_date: date) -> str:
+    content_digest = hashlib.sha256(file_contents).hexdigest()
+    message = "\n".join([
+        str(user_id),
+        content_digest,
+        document_type or "",
+        VALIDATION_PROMPT_VERSION,
+        str(evaluation_date_bucket(evaluation_date)),
+    ])
+    return hmac.new(_HMAC_KEY, message.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def get_cached_validation(db: Session, cache_key: str, bypass: bool = False) -> Optional[dict]:
+    """Cached validation result for cache_key, or None on a miss, expiry, bypass or unreadable entry."""
+    if not DOCUMENT_VALIDATION_CACHE_ENABLED:
+        return None
+    if bypass:
+        _stats.add("bypassed")
+        return None
+    now = datetime.utcnow()
+    entry = db.get(models.DocumentValidationCacheEntry, cache_key)
+    if entry is None or entry.expires_at <= now:
+        _stats.add("misses")
+        return None
+    try:
+        result = json.loads(decrypt_artifact_bytes(entry.encrypted_result.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as exc:
+        # Sealed with a key that is no longer configured, or corrupt: drop it.
+        print(f"Warning: Discarding unreadable validation cache entry: {str(exc)}")
+        db.delete(entry)
+        db.commit()
+        _stats.add("errors")
+        return None
+    db.query(models.DocumentValidationCacheEntry).filter(
+        models.DocumentValidationCacheEntry.cache_key == cache_key
+    ).update(
+        {
+            models.DocumentValidationCacheEntry.hit_count: models.DocumentValidationCacheEntry.hit_count + 1,
+            models.DocumentValidationCacheEntry.last_used_at: now,
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    _stats.add("hits")
+    return result
+
+
+def store_validation_result(db: Session, cache_key: str, user_id: int, document_type: str, result: dict) -> None:
+    if not DOCUMENT_VALIDATION_CACHE_ENABLED or not result:
+        return
+    now = datetime.utcnow()
+    encrypted_result = encrypt_artifact_bytes(json.dumps(result).encode("utf-8")).decode("ascii")
+    entry = db.get(models.DocumentValidationCacheEntry, cache_key)
+    if entry is None:
+        entry = models.DocumentValidationCacheEntry(cache_key=cache_key, user_id=user_id, hit_count=0)
+        db.add(entry)
+    entry.document_type = document_type
+    entry.encrypted_result = encrypted_result
+    entry.size_bytes = len(encrypted_result)
+    entry.last_used_at = now
+    entry.expires_at = now + timedelta(hours=DOCUMENT_VALIDATION_CACHE_TTL_HOURS)
+    db.commit()
+    _stats.add("stores")
+    if _stats.eviction_due(now.timestamp()):
+        evict_validation_cache(db)
+
+
+def evict_validation_cache(db: Session) -> int:
+    """Delete expired entries, then least recently used ones until under the count and size caps."""
+    Entry = models.DocumentValidationCacheEntry
+    evicted = db.query(Entry).filter(Entry.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.commit()
+
+    count, total_bytes = db.query(func.count(Entry.cache_key), func.coalesce(func.sum(Entry.size_bytes), 0)).one()
+    max_bytes = DOCUMENT_VALIDATION_CACHE_MAX_MB * 1024 * 1024
+    if count > DOCUMENT_VALIDATION_CACHE_MAX_ENTRIES or total_bytes > max_bytes:
+        doomed = []
+        for cache_key, size_bytes in db.query(Entry.cache_key, Entry.size_bytes).order_by(Entry.last_used_at).yield_per(500):
+            if count <= DOCUMENT_VALIDATION_CACHE_MAX_ENTRIES and total_bytes <= max_bytes:
+                break
+            doomed.append(cache_key)
+            count -= 1
+            total_bytes -= size_bytes or 0
+        for start in range(0, len(doomed), 500):
+            evicted += db.query(Entry).filter(Entry.cache_key.in_(doomed[start:start + 500])).delete(synchronize_session=False)
+        db.commit()
+    if evicted:
+        _stats.add("evicted", evicted)
+    return evicted
+
+
+def delete_user_validation_cache(db: Session, user_id: int) -> int:
+    """Drop a user's cached results (account deletion). The caller commits."""
+    return db.query(models.DocumentValidationCacheEntry).filter(
+        models.DocumentValidationCacheEntry.user_id == user_id
+    ).delete(synchronize_session=False)
+
+
+def get_validation_cache_stats(db: Session) -> dict:
+    Entry = models.DocumentValidationCacheEntry
+    entries, total_bytes = db.query(func.count(Entry.cache_key), func.coalesce(func.sum(Entry.size_bytes), 0)).one()
+    counters = _stats.snapshot()
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        "enabled": DOCUMENT_VALIDATION_CACHE_ENABLED,
+        "prompt_version": VALIDATION_PROMPT_VERSION,
+        "entries": entries,
+        "size_bytes": int(total_bytes),
+        "max_entries": DOCUMENT_VALIDATION_CACHE_MAX_ENTRIES,
+        "max_bytes": DOCUMENT_VALIDATION_CACHE_MAX_MB * 1024 * 1024,
+        "ttl_hours": DOCUMENT_VALIDATION_CACHE_TTL_HOURS,
+        **counters,
+        "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+    }
@@ -23,6 +23,14 @@ def _normalize_datetime(value):
     return value
 
 
+def effective_plan(plan: str, ends_at) -> str:
+    """Plan in effect right now, treating an expired Pro plan as Free before the row is downgraded."""
+    normalized_ends_at = _normalize_datetime(ends_at)
+    if plan == PLAN_PRO and normalized_ends_at is not None and normalized_ends_at <= datetime.utcnow():
+        return PLAN_FREE
+    return plan
+
+
 def _apply_subscription_expiry(subscription: models.Subscription) -> bool:
     if subscription.plan != PLAN_PRO:
         return False
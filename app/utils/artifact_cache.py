@@ -0,0 +1,268 @@
+"""
+Decrypted artifact cache for extracted document JSON files.
+
+Entries are keyed by object key plus a per-user version stamp. Any write that
+changes what a user's artifacts should look like bumps the version, so stale
+entries are never served and simply age out of the LRU.
+
+Tiers:
+- in-process LRU holding decrypted bytes, bounded by ARTIFACT_CACHE_MAX_BYTES
+- optional shared Redis tier (ARTIFACT_CACHE_REDIS_URL) holding only the
+  encrypted blobs as stored in R2, plus the per-user version counters so every
+  worker process sees invalidations
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.utils.object_storage import BatchFetchResult
+from app.utils.secure_artifacts import decrypt_artifact_bytes
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+ARTIFACT_CACHE_ENABLED = os.getenv("ARTIFACT_CACHE_ENABLED", "true").strip().lower() in {"1", "true", "yes", "on"}
+ARTIFACT_CACHE_MAX_BYTES = max(0, int(os.getenv("ARTIFACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)) or "0"))
+ARTIFACT_CACHE_TTL_SECONDS = max(1, int(os.getenv("ARTIFACT_CACHE_TTL_SECONDS", "900") or "900"))
+ARTIFACT_CACHE_REDIS_URL = os.getenv("ARTIFACT_CACHE_REDIS_URL", "").strip()
+ARTIFACT_CACHE_REDIS_PREFIX = os.getenv("ARTIFACT_CACHE_REDIS_PREFIX", "rilono:artifact")
+
+_USER_KEY_PATTERN = re.compile(r"^user_(\d+)/")
+
+
+def _user_id_for_key(key: str) -> Optional[int]:
+    match = _USER_KEY_PATTERN.match(key or "")
+    return int(match.group(1)) if match else None
+
+
+class ArtifactCache:
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: int,
+        redis_client=None,
+        redis_prefix: str = "rilono:artifact",
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis_client
+        self._redis_prefix = redis_prefix
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple[str, int], tuple[bytes, float]]" = OrderedDict()
+        self._user_entries: dict[int, set[tuple[str, int]]] = {}
+        self._local_versions: dict[int, int] = {}
+        self._size_bytes = 0
+        self._counters = {
+            "hits": 0,
+            "shared_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "shared_errors": 0,
+        }
+
+    # ----- version stamps -----
+
+    def _version_key(self, user_id: int) -> str:
+        return f"{self._redis_prefix}:version:{user_id}"
+
+    def user_version(self, user_id: Optional[int]) -> int:
+        if user_id is None:
+            return 0
+        if self._redis is not None:
+            try:
+                value = self._redis.get(self._version_key(user_id))
+                return int(value or 0)
+            except Exception as exc:  # noqa: BLE001
+                self._shared_error("version lookup", exc)
+        with self._lock:
+            return self._local_versions.get(user_id, 0)
+
+    def invalidate_user(self, user_id: Optional[int]) -> int:
+        """Bump the user's version stamp and drop their local entries. Returns the new version."""
+        if user_id is None:
+            return 0
+        version = None
+        if self._redis is not None:
+            try:
+                version = int(self._redis.incr(self._version_key(user_id)))
+            except Exception as exc:  # noqa: BLE001
+                self._shared_error("invalidation", exc)
+        with self._lock:
+            if version is None:
+                version = self._local_versions.get(user_id, 0) + 1
+            self._local_versions[user_id] = version
+            for entry_key in self._user_entries.pop(user_id, set()):
+                self._drop_locked(entry_key)
+            self._counters["invalidations"] += 1
+        return version
+
+    # ----- entries -----
+
+    def _shared_key(self, key: str, version: int) -> str:
+        return f"{self._redis_prefix}:blob:{version}:{key}"
+
+    def _shared_error(self, operation: str, exc: Exception) -> None:
+        with self._lock:
+            self._counters["shared_errors"] += 1
+        print(f"Warning: Artifact cache shared tier {operation} failed: {str(exc)}")
+
+    def _drop_locked(self, entry_key: tuple[str, int]) -> None:
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._size_bytes -= len(entry[0])
+
+    def _store_local(self, key: str, version: int, plaintext: bytes) -> None:
+        size = len(plaintext)
+        if size > self.max_bytes:
+            return
+        entry_key = (key, version)
+        user_id = _user_id_for_key(key)
+        with self._lock:
+            self._drop_locked(entry_key)
+            self._entries[entry_key] = (plaintext, time.monotonic() + self.ttl_seconds)
+            self._size_bytes += size
+            if user_id is not None:
+                self._user_entries.setdefault(user_id, set()).add(entry_key)
+            while self._size_bytes > self.max_bytes and self._entries:
+                evicted_key, (evicted, _) = self._entries.popitem(last=False)
+                self._size_bytes -= len(evicted)
+                self._counters["evictions"] += 1
+                evicted_user = _user_id_for_key(evicted_key[0])
+                if evicted_user is not None:
+                    self._user_entries.get(evicted_user, set()).discard(evicted_key)
+
+    def get(self, key: str, version: int) -> Optional[bytes]:
+        """Return decrypted bytes for (key, version) from the local or shared tier."""
+        entry_key = (key, version)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                plaintext, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(entry_key)
+                    self._counters["hits"] += 1
+                    return plaintext
+                self._drop_locked(entry_key)
+
+        if self._redis is not None:
+            try:
+                encrypted_blob = self._redis.get(self._shared_key(key, version))
+            except Exception as exc:  # noqa: BLE001
+                self._shared_error("read", exc)
+                encrypted_blob = None
+            if encrypted_blob is not None:
+                try:
+                    plaintext = decrypt_artifact_bytes(encrypted_blob)
+                except ValueError:
+                    plaintext = None
+                if plaintext is not None:
+                    self._store_local(key, version, plaintext)
+                    with self._lock:
+                        self._counters["shared_hits"] += 1
+                    return plaintext
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, version: int, plaintext: bytes, encrypted_blob: Optional[bytes] = None) -> None:
+        self._store_local(key, version, plaintext)
+        if self._redis is not None and encrypted_blob is not None:
+            try:
+                self._redis.setex(self._shared_key(key, version), self.ttl_seconds, encrypted_blob)
+            except Exception as exc:  # noqa: BLE001
+                self._shared_error("write", exc)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["shared_hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_ratio": round((lookups - self._counters["misses"]) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "shared_tier": self._redis is not None,
+            }
+
+
+def _build_redis_client():
+    if not ARTIFACT_CACHE_REDIS_URL:
+        return None
+    if redis is None:
+        print("Warning: ARTIFACT_CACHE_REDIS_URL is set but the redis package is not installed; using in-process cache only")
+        return None
+    try:
+        return redis.Redis.from_url(ARTIFACT_CACHE_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+    except Exception as exc:  # noqa: BLE001
+        print(f"Warning: Failed to configure artifact cache Redis tier: {str(exc)}")
+        return None
+
+
+artifact_cache = ArtifactCache(
+    max_bytes=ARTIFACT_CACHE_MAX_BYTES if ARTIFACT_CACHE_ENABLED else 0,
+    ttl_seconds=ARTIFACT_CACHE_TTL_SECONDS,
+    redis_client=_build_redis_client() if ARTIFACT_CACHE_ENABLED else None,
+    redis_prefix=ARTIFACT_CACHE_REDIS_PREFIX,
+)
+
+
+def load_artifact(storage, key: str) -> bytes:
+    """Decrypted artifact bytes, served from cache when the user's version is unchanged."""
+    version = artifact_cache.user_version(_user_id_for_key(key))
+    cached = artifact_cache.get(key, version)
+    if cached is not None:
+        return cached
+    encrypted_blob = storage.get_bytes(key)
+    plaintext = decrypt_artifact_bytes(encrypted_blob)
+    artifact_cache.put(key, version, plaintext, encrypted_blob)
+    return plaintext
+
+
+def load_artifacts(storage, keys: Iterable[str], timeout: Optional[float] = None) -> BatchFetchResult:
+    """
+    Batch variant of load_artifact(). Only cache misses hit object storage; they are
+    fetched in parallel via storage.get_many(). Objects in the result are decrypted.
+    """
+    result = BatchFetchResult()
+    versions: dict[Optional[int], int] = {}
+    missing: dict[str, int] = {}
+    for key in dict.fromkeys(key for key in keys if key):
+        user_id = _user_id_for_key(key)
+        if user_id not in versions:
+            versions[user_id] = artifact_cache.user_version(user_id)
+        cached = artifact_cache.get(key, versions[user_id])
+        if cached is not None:
+            result.objects[key] = cached
+        else:
+            missing[key] = versions[user_id]
+
+    if not missing:
+        return result
+
+    fetched = storage.get_many(missing.keys(), timeout=timeout)
+    result.errors.update(fetched.errors)
+    result.timed_out.extend(fetched.timed_out)
+    for key, encrypted_blob in fetched.objects.items():
+        try:
+            plaintext = decrypt_artifact_bytes(encrypted_blob)
+        except ValueError as exc:
+            result.errors[key] = exc
+            continue
+        artifact_cache.put(key, missing[key], plaintext, encrypted_blob)
+        result.objects[key] = plaintext
+    return result
+
+
+def invalidate_user_artifacts(user_id: int) -> None:
+    artifact_cache.invalidate_user(user_id)
+
+
+def get_artifact_cache_stats() -> dict:
+    return artifact_cache.stats()
@@ -0,0 +1,128 @@
+"""
+Chunked AEAD container for zero-knowledge document blobs.
+
+Documents are split into fixed-size chunks, each sealed with AES-256-GCM, so
+they can be encrypted and decrypted as a stream with memory bounded by the chunk
+size (Fernet needs the whole payload at once and base64-inflates it by a third).
+
+Layout:
+    header   b"RZK" | version (1 byte) | chunk size (u32 BE) | nonce prefix (7 bytes) | reserved (1 byte)
+    segment  AES-GCM(chunk) + 16-byte tag, repeated; every chunk is full-size except the last
+
+Segment nonces are prefix | segment index (u32 BE) | last-segment flag, and the
+header is authenticated with every segment, so reordering, truncation or
+header edits fail decryption. The per-file key is a Fernet-format key (see
+Fernet.generate_key()) so wrapped keys keep their existing shape in the database.
+"""
+import base64
+import os
+import struct
+from itertools import chain
+from typing import Iterable, Iterator
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+CHUNKED_FORMAT_MAGIC = b"RZK"
+CHUNKED_FORMAT_VERSION = 2
+DOCUMENT_ENCRYPTION_CHUNK_SIZE = max(4, int(os.getenv("DOCUMENT_ENCRYPTION_CHUNK_KB", "64") or "64")) * 1024
+
+_HEADER = struct.Struct(">3sBI7sx")
+_TAG_SIZE = 16
+_NONCE_PREFIX_SIZE = 7
+
+
+def is_chunked_ciphertext(prefix: bytes) -> bool:
+    """True when the blob starts with a chunked container header (legacy blobs are Fernet tokens)."""
+    return len(prefix) >= 4 and prefix[:3] == CHUNKED_FORMAT_MAGIC and prefix[3] == CHUNKED_FORMAT_VERSION
+
+
+def encrypted_size(plain_size: int, chunk_size: int = DOCUMENT_ENCRYPTION_CHUNK_SIZE) -> int:
+    segments = max(1, -(-plain_size // chunk_size))
+    return _HEADER.size + plain_size + segments * _TAG_SIZE
+
+
+def _cipher(file_key: bytes) -> AESGCM:
+    return AESGCM(base64.urlsafe_b64decode(file_key))
+
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index > 0xFFFFFFFF:
+        raise ValueError("Too many segments for one document.")
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+
+def _rechunk(blocks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Re-split arbitrary blocks into size-byte pieces (the last may be shorter) without joining them."""
+    buffer = bytearray()
+    for block in blocks:
+        view = memoryview(block)
+        if buffer:
+            take = size - len(buffer)
+            buffer += view[:take]
+            view = view[take:]
+            if len(buffer) < size:
+                continue
+            yield bytes(buffer)
+            buffer.clear()
+        while len(view) >= size:
+            yield bytes(view[:size])
+            view = view[size:]
+        buffer += view
+    if buffer:
+        yield bytes(buffer)
+
+
+def encrypt_chunks(
+    file_key: bytes,
+    plaintext_blocks: Iterable[bytes],
+    chunk_size: int = DOCUMENT_ENCRYPTION_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Yield the container header followed by one sealed segment per chunk."""
+    cipher = _cipher(file_key)
+    nonce_prefix = os.urandom(_NONCE_PREFIX_SIZE)
+    header = _HEADER.pack(CHUNKED_FORMAT_MAGIC, CHUNKED_FORMAT_VERSION, chunk_size, nonce_prefix)
+    yield header
+
+    chunks = _rechunk(plaintext_blocks, chunk_size)
+    current = next(chunks, b"")
+    index = 0
+    for following in chunks:
+        yield cipher.encrypt(_nonce(nonce_prefix, index, False), current, header)
+        current = following
+        index += 1
+    yield cipher.encrypt(_nonce(nonce_prefix, index, True), current, header)
+
+
+def decrypt_chunks(file_key: bytes, ciphertext_blocks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Yield plaintext chunks of a container produced by encrypt_chunks().
+
+    Raises:
+        ValueError: If the container is malformed, truncated or fails authentication
+    """
+    cipher = _cipher(file_key)
+    blocks = iter(ciphertext_blocks)
+    head = b""
+    for block in blocks:
+        head += block
+        if len(head) >= _HEADER.size:
+            break
+    if len(head) < _HEADER.size or not is_chunked_ciphertext(head):
+        raise ValueError("Not a chunked document container.")
+    header = head[:_HEADER.size]
+    _, _, chunk_size, nonce_prefix = _HEADER.unpack(header)
+
+    segments = _rechunk(chain([head[_HEADER.size:]], blocks), chunk_size + _TAG_SIZE)
+    current = next(segments, None)
+    if current is None:
+        raise ValueError("Document container is truncated.")
+    index = 0
+    try:
+        for following in segments:
+            yield cipher.decrypt(_nonce(nonce_prefix, index, False), current, header)
+            current = following
+            index += 1
+        yield cipher.decrypt(_nonce(nonce_prefix, index, True), current, header)
+    except InvalidTag as exc:
+        raise ValueError(f"Document segment {index} failed authentication.") from exc
@@ -2,10 +2,14 @@
 Gemini AI service for document text extraction
 Supports both standard Gemini API (with API key) and Vertex AI (with service account)
 """
-import os
-from typing import Optional
 import io
-from PIL import Image
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Optional
+from app.utils.image_preprocessing import PreparedImage, prepare_image_for_gemini
 from pathlib import Path
 from datetime import datetime
 
@@ -79,6 +83,336 @@ if not USE_VERTEX_AI:
     else:
         print("⚠ Warning: Neither service account JSON nor valid GEMINI_API_KEY found. Document text extraction will be disabled.")
 
+GEMINI_MODEL_NAME = "gemini-3-pro-preview"
+GEMINI_TIMEOUT_SECONDS = max(1.0, float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120") or "120"))
+GEMINI_MAX_ATTEMPTS = max(1, int(os.getenv("GEMINI_MAX_ATTEMPTS", "3") or "3"))
+GEMINI_RETRY_BASE_DELAY_SECONDS = max(0.0, float(os.getenv("GEMINI_RETRY_BASE_DELAY_SECONDS", "1") or "1"))
+GEMINI_MAX_CONCURRENCY = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "8") or "8"))
+
+try:
+    from google.api_core import exceptions as google_exceptions
+    _TRANSIENT_GEMINI_ERRORS = (
+        google_exceptions.TooManyRequests,
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+    )
+except ImportError:  # pragma: no cover - optional dependency
+    _TRANSIENT_GEMINI_ERRORS = ()
+
+
+def _is_transient_gemini_error(exc: Exception) -> bool:
+    if _TRANSIENT_GEMINI_ERRORS and isinstance(exc, _TRANSIENT_GEMINI_ERRORS):
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in ("429", "503", "resource exhausted", "unavailable", "deadline exceeded"))
+
+
+class _CallSiteStats:
+    __slots__ = ("calls", "errors", "retries", "total_ms", "max_ms", "prompt_tokens", "output_tokens")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+
+class _StreamChunks:
+    """
+    Iterator over a streaming response. Holds one of the client's concurrency slots
+    from the request until the stream is exhausted, fails or is closed; latency is
+    recorded then, with usage from the last chunk.
+    """
+
+    def __init__(self, client: "GeminiClient", call_site: str, stream, started: float) -> None:
+        self._client = client
+        self._call_site = call_site
+        self._stream = stream
+        self._iterator = None
+        self._started = started
+        self._last = None
+        self._finished = False
+        self._finish_lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        try:
+            if self._iterator is None:
+                self._iterator = iter(self._stream)
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._finish(failed=False)
+            raise
+        except Exception:
+            self._finish(failed=True)
+            raise
+        self._last = chunk
+        return chunk
+
+    def close(self) -> None:
+        """Stop early (e.g. client disconnected) and give the slot back."""
+        self._finish(failed=False)
+
+    def _finish(self, failed: bool) -> None:
+        with self._finish_lock:
+            if self._finished:
+                return
+            self._finished = True
+        try:
+            self._client._record(
+                self._call_site, (time.perf_counter() - self._started) * 1000, response=self._last, failed=failed
+            )
+        finally:
+            self._client._semaphore.release()
+
+    def __del__(self) -> None:
+        self.close()
+
+
+class GeminiClient:
+    """
+    Single entry point for Gemini calls.
+
+    Model handles are built once per (provider, model, config) and reused, since
+    they are stateless. Calls go through a shared concurrency limit and get a
+    per-request timeout (Gemini API key path) and jittered exponential backoff
+    on rate-limit and availability errors. Latency, token usage, retries and
+    errors are recorded per call site (e.g. "upload_validation", "chat").
+    Streamed calls hold a concurrency slot until their stream ends or is closed.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        timeout_seconds: float = GEMINI_TIMEOUT_SECONDS,
+        max_attempts: int = GEMINI_MAX_ATTEMPTS,
+        retry_base_delay_seconds: float = GEMINI_RETRY_BASE_DELAY_SECONDS,
+    ) -> None:
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_delay_seconds = retry_base_delay_seconds
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._models: dict = {}
+        self._stats: dict = {}
+
+    @property
+    def provider(self) -> Optional[str]:
+        if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
+            return "vertex"
+        if GENAI_AVAILABLE and genai is not None:
+            return "genai"
+        return None
+
+    def is_configured(self) -> bool:
+        has_service_account = os.path.exists(SERVICE_ACCOUNT_PATH)
+        has_valid_api_key = GEMINI_API_KEY and GEMINI_API_KEY.startswith("AIza")
+        return bool(has_service_account or has_valid_api_key) and self.provider is not None
+
+    def get_model(self, model_name: str = GEMINI_MODEL_NAME, **config):
+        """Cached model handle; config is passed to the GenerativeModel constructor."""
+        provider = self.provider
+        if provider is None:
+            raise RuntimeError("Gemini AI not available. Please configure service account or API key.")
+        cache_key = (provider, model_name, tuple(sorted((name, repr(value)) for name, value in config.items())))
+        with self._lock:
+            model = self._models.get(cache_key)
+            if model is None:
+                if provider == "vertex":
+                    model = GenerativeModel(model_name, **config)
+                else:
+                    model = genai.GenerativeModel(model_name, **config)
+                self._models[cache_key] = model
+            return model
+
+    def _site_stats(self, call_site: str) -> _CallSiteStats:
+        stats = self._stats.get(call_site)
+        if stats is None:
+            stats = self._stats.setdefault(call_site, _CallSiteStats())
+        return stats
+
+    def _record(self, call_site: str, elapsed_ms: float, response: Any = None, failed: bool = False, retries: int = 0) -> None:
+        usage = getattr(response, "usage_metadata", None) if response is not None else None
+        with self._lock:
+            stats = self._site_stats(call_site)
+            stats.calls += 1
+            stats.retries += retries
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            if failed:
+                stats.errors += 1
+            if usage is not None:
+                stats.prompt_tokens += int(getattr(usage, "prompt_token_count", 0) or 0)
+                stats.output_tokens += int(getattr(usage, "candidates_token_count", 0) or 0)
+
+    def _request_kwargs(self, kwargs: dict) -> dict:
+        if self.provider == "genai" and "request_options" not in kwargs:
+            kwargs = {**kwargs, "request_options": {"timeout": self.timeout_seconds}}
+        return kwargs
+
+    def generate(self, call_site: str, contents, model=None, model_name: str = GEMINI_MODEL_NAME, **kwargs):
+        """generate_content() with retries; pass model to use a specific handle."""
+        model = model if model is not None else self.get_model(model_name)
+        kwargs = self._request_kwargs(kwargs)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                # The slot covers one attempt only; backoff sleeps must not hold it.
+                with self._semaphore:
+                    response = model.generate_content(contents, **kwargs)
+            except Exception as exc:
+                if attempt >= self.max_attempts or not _is_transient_gemini_error(exc):
+                    self._record(call_site, (time.perf_counter() - started) * 1000, failed=True, retries=attempt - 1)
+                    raise
+                # Full jitter keeps concurrent retries from hitting the quota in lockstep.
+                delay = random.uniform(0, self.retry_base_delay_seconds * (2 ** (attempt - 1)))
+                print(f"⚠ Gemini {call_site} attempt {attempt} failed ({str(exc)}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self._record(call_site, (time.perf_counter() - started) * 1000, response=response, retries=attempt - 1)
+            return response
+
+    def stream(self, call_site: str, contents, model=None, model_name: str = GEMINI_MODEL_NAME, **kwargs):
+        """
+        Streaming generate_content(). Not retried, since chunks may already have been
+        delivered. Returns (stream, chunks): close or cancel stream, iterate chunks, and
+        close chunks when stopping early so its concurrency slot is released.
+        """
+        model = model if model is not None else self.get_model(model_name)
+        kwargs = self._request_kwargs(kwargs)
+        self._semaphore.acquire()
+        started = time.perf_counter()
+        try:
+            stream = model.generate_content(contents, stream=True, **kwargs)
+        except Exception:
+            self._semaphore.release()
+            self._record(call_site, (time.perf_counter() - started) * 1000, failed=True)
+            raise
+        return stream, _StreamChunks(self, call_site, stream, started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "cached_models": len(self._models),
+                "call_sites": {
+                    call_site: {
+                        "calls": stats.calls,
+                        "errors": stats.errors,
+                        "error_rate": round(stats.errors / stats.calls, 4) if stats.calls else 0.0,
+                        "retries": stats.retries,
+                        "avg_ms": round(stats.total_ms / stats.calls, 1) if stats.calls else 0.0,
+                        "max_ms": round(stats.max_ms, 1),
+                        "prompt_tokens": stats.prompt_tokens,
+                        "output_tokens": stats.output_tokens,
+                    }
+                    for call_site, stats in sorted(self._stats.items())
+                },
+            }
+
+
+gemini_client = GeminiClient()
+
+
+def get_gemini_client() -> GeminiClient:
+    return gemini_client
+
+
+def get_gemini_stats() -> dict:
+    return gemini_client.stats()
+
+
+def image_part(prepared: PreparedImage):
+    """Inline image content for generate_content() in the configured SDK's format."""
+    if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
+        return Part.from_data(prepared.data, mime_type=prepared.mime_type)
+    return {"mime_type": prepared.mime_type, "data": prepared.data}
+
+
+# PDFs up to this size are sent inline with the request; Gemini caps a whole
+# request at 20 MB, and inline data is base64-encoded on the wire. Never below the
+# upload size limit, so uploads are always inline and validation workers never
+# wait on Files API processing.
+GEMINI_INLINE_PDF_MAX_MB = max(
+    1,
+    int(os.getenv("GEMINI_INLINE_PDF_MAX_MB", "14") or "14"),
+    int(os.getenv("DOCUMENT_MAX_SIZE_MB", "5") or "5"),
+)
+# Larger PDFs go through the Files API; this bounds the wait for server-side processing.
+GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS = max(1.0, float(os.getenv("GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS", "60") or "60"))
+
+
+def _upload_pdf_file(file_contents: bytes):
+    """Upload to the Gemini Files API from memory and wait, with backoff and a deadline, until it is usable."""
+    print(f"📤 Uploading PDF to Gemini Files API ({len(file_contents) / (1024 * 1024):.1f} MB)...")
+    pdf_file = genai.upload_file(io.BytesIO(file_contents), mime_type="application/pdf")
+    deadline = time.monotonic() + GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS
+    delay = 0.25
+    try:
+        while pdf_file.state.name == "PROCESSING":
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(
+                    f"PDF was still processing after {GEMINI_FILE_PROCESSING_TIMEOUT_SECONDS:.0f}s"
+                )
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 4.0)
+            pdf_file = genai.get_file(pdf_file.name)
+        if pdf_file.state.name == "FAILED":
+            raise Exception(f"File processing failed: {pdf_file.state}")
+    except Exception:
+        _delete_uploaded_file(pdf_file)
+        raise
+    return pdf_file
+
+
+def _delete_uploaded_file(uploaded_file) -> None:
+    try:
+        genai.delete_file(uploaded_file.name)
+    except Exception:
+        pass
+
+
+@contextmanager
+def pdf_content(file_contents: bytes):
+    """
+    PDF content for generate_content(). Inline bytes whenever they fit (always on
+    Vertex AI), so there is no temp file and no processing wait; larger PDFs on the
+    Gemini API path are uploaded and removed again afterwards.
+    """
+    if (USE_VERTEX_AI and VERTEX_AI_AVAILABLE) or len(file_contents) <= GEMINI_INLINE_PDF_MAX_MB * 1024 * 1024:
+        if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
+            yield Part.from_data(file_contents, mime_type="application/pdf")
+        else:
+            yield {"mime_type": "application/pdf", "data": file_contents}
+        return
+    pdf_file = _upload_pdf_file(file_contents)
+    try:
+        yield pdf_file
+    finally:
+        _delete_uploaded_file(pdf_file)
+
+
+# Identifies the validation prompt, model and image pre-processing. Bump it whenever
+# any of them changes so cached validation results from the old inputs are not reused.
+VALIDATION_PROMPT_VERSION = f"{GEMINI_MODEL_NAME}/2025-03"
+# Set on validation results that were filled in because Gemini's reply could not be
+# used as-is. Callers pop it; such results must not be memoized.
+VALIDATION_FALLBACK_FLAG = "_fallback"
+
 # Supported file types for Gemini
 SUPPORTED_IMAGE_TYPES = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 SUPPORTED_DOCUMENT_TYPES = {".pdf", ".txt"}
@@ -112,14 +446,11 @@ def validate_and_extract_document(
     try:
         file_extension = os.path.splitext(filename)[1].lower()
         
-        # Initialize the model
-        if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-            model = GenerativeModel('gemini-3-pro-preview')
-        elif GENAI_AVAILABLE:
-            model = genai.GenerativeModel('gemini-3-pro-preview')
-        else:
+        # Shared, cached model handle
+        if gemini_client.provider is None:
             print("Error: Neither Vertex AI nor standard Gemini API available")
             return None
+        model = gemini_client.get_model(GEMINI_MODEL_NAME)
         
         evaluation_date_value = (current_date_for_evaluation or "").strip() or datetime.now().isoformat()
 
@@ -216,8 +547,8 @@ Remember: Output ONLY the JSON object, nothing else."""
         
         # Handle different file types
         if file_extension in SUPPORTED_IMAGE_TYPES:
-            # For images, use vision model
-            image = Image.open(io.BytesIO(file_contents))
+            # For images, use vision model on an oriented, downscaled copy
+            prepared_image = prepare_image_for_gemini(file_contents)
             
             print("\n" + "="*80)
             print(f"🔵 GEMINI API CALL: validate_and_extract_document() - IMAGE")
@@ -230,14 +561,8 @@ Remember: Output ONLY the JSON object, nothing else."""
             print("-"*80)
             print("⏳ Waiting for Gemini response...")
             
-            if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                img_bytes = io.BytesIO()
-                image.save(img_bytes, format='JPEG')
-                img_bytes.seek(0)
-                image_part = Part.from_data(img_bytes.read(), mime_type="image/jpeg")
-                response = model.generate_content([validation_prompt, image_part])
-            else:
-                response = model.generate_content([validation_prompt, image])
+            print(f"🖼  Image: {prepared_image.describe()}")
+            response = gemini_client.generate("upload_validation", [validation_prompt, image_part(prepared_image)], model=model)
             
             response_text = response.text.strip()
             
@@ -247,64 +572,27 @@ Remember: Output ONLY the JSON object, nothing else."""
             print("="*80 + "\n")
         
         elif file_extension == ".pdf":
-            # For PDFs
-            import tempfile
+            # For PDFs: inline bytes, no temp file or processing wait for typical uploads
+            print("\n" + "="*80)
+            print(f"🔵 GEMINI API CALL: validate_and_extract_document() - PDF")
+            print(f"📄 File: {filename} ({len(file_contents) / 1024:.0f} KB)")
+            print(f"📝 Document Type: {document_type or 'Not specified'}")
+            print("-"*80)
+            print("📤 SENDING PROMPT TO GEMINI:")
+            print("-"*80)
+            print(validation_prompt)
+            print("-"*80)
+            print("⏳ Waiting for Gemini response...")
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(file_contents)
-                tmp_path = tmp_file.name
+            with pdf_content(file_contents) as pdf_part:
+                response = gemini_client.generate("upload_validation", [validation_prompt, pdf_part], model=model)
             
-            try:
-                print("\n" + "="*80)
-                print(f"🔵 GEMINI API CALL: validate_and_extract_document() - PDF")
-                print(f"📄 File: {filename}")
-                print(f"📝 Document Type: {document_type or 'Not specified'}")
-                print("-"*80)
-                print("📤 SENDING PROMPT TO GEMINI:")
-                print("-"*80)
-                print(validation_prompt)
-                print("-"*80)
-                print("⏳ Waiting for Gemini response...")
-                
-                if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                    with open(tmp_path, 'rb') as f:
-                        pdf_data = f.read()
-                    pdf_part = Part.from_data(pdf_data, mime_type="application/pdf")
-                    response = model.generate_content([validation_prompt, pdf_part])
-                else:
-                    pdf_file = genai.upload_file(
-                        path=tmp_path,
-                        mime_type="application/pdf"
-                    )
-                    import time
-                    print("📤 Uploading PDF to Gemini...")
-                    while pdf_file.state.name == "PROCESSING":
-                        print("   ⏳ PDF still processing...")
-                        time.sleep(2)
-                        pdf_file = genai.get_file(pdf_file.name)
-                    
-                    if pdf_file.state.name == "FAILED":
-                        raise Exception(f"File processing failed: {pdf_file.state}")
-                    
-                    print("✅ PDF uploaded, generating content...")
-                    response = model.generate_content([validation_prompt, pdf_file])
-                    
-                    try:
-                        genai.delete_file(pdf_file.name)
-                    except:
-                        pass
-                
-                response_text = response.text.strip()
-                
-                print("✅ RECEIVED RESPONSE FROM GEMINI:")
-                print("-"*80)
-                print(response_text[:1000] + ("..." if len(response_text) > 1000 else ""))
-                print("="*80 + "\n")
-            finally:
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
+            response_text = response.text.strip()
+            
+            print("✅ RECEIVED RESPONSE FROM GEMINI:")
+            print("-"*80)
+            print(response_text[:1000] + ("..." if len(response_text) > 1000 else ""))
+            print("="*80 + "\n")
         
         elif file_extension == ".txt":
             text_content = file_contents.decode('utf-8', errors='ignore')
@@ -321,7 +609,7 @@ Remember: Output ONLY the JSON object, nothing else."""
             print("-"*80)
             print("⏳ Waiting for Gemini response...")
             
-            response = model.generate_content(prompt)
+            response = gemini_client.generate("upload_validation", prompt, model=model)
             response_text = response.text.strip()
             
             print("✅ RECEIVED RESPONSE FROM GEMINI:")
@@ -332,7 +620,7 @@ Remember: Output ONLY the JSON object, nothing else."""
         else:
             # Try to process as image
             try:
-                image = Image.open(io.BytesIO(file_contents))
+                prepared_image = prepare_image_for_gemini(file_contents)
                 
                 print("\n" + "="*80)
                 print(f"🔵 GEMINI API CALL: validate_and_extract_document() - UNKNOWN TYPE (trying as image)")
@@ -345,14 +633,8 @@ Remember: Output ONLY the JSON object, nothing else."""
                 print("-"*80)
                 print("⏳ Waiting for Gemini response...")
                 
-                if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                    img_bytes = io.BytesIO()
-                    image.save(img_bytes, format='JPEG')
-                    img_bytes.seek(0)
-                    image_part = Part.from_data(img_bytes.read(), mime_type="image/jpeg")
-                    response = model.generate_content([validation_prompt, image_part])
-                else:
-                    response = model.generate_content([validation_prompt, image])
+                print(f"🖼  Image: {prepared_image.describe()}")
+                response = gemini_client.generate("upload_validation", [validation_prompt, image_part(prepared_image)], model=model)
                 response_text = response.text.strip()
                 
                 print("✅ RECEIVED RESPONSE FROM GEMINI:")
@@ -389,6 +671,7 @@ Remember: Output ONLY the JSON object, nothing else."""
             # Ensure required fields exist
             if "Document Validation" not in result:
                 result["Document Validation"] = "Yes"
+                result[VALIDATION_FALLBACK_FLAG] = True
             if "Message" not in result:
                 result["Message"] = "Document processed successfully"
             
@@ -406,7 +689,8 @@ Remember: Output ONLY the JSON object, nothing else."""
                 "Expiration Date": None,
                 "Issue Date": None,
                 "Country": None,
-                "Other Information": response_text[:500] if response_text else None
+                "Other Information": response_text[:500] if response_text else None,
+                VALIDATION_FALLBACK_FLAG: True,
             }
     
     except Exception as e:
@@ -428,19 +712,16 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
     try:
         file_extension = os.path.splitext(filename)[1].lower()
         
-        # Initialize the model - Use Vertex AI if available, otherwise standard API
-        if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-            model = GenerativeModel('gemini-3-pro-preview')
-        elif GENAI_AVAILABLE:
-            model = genai.GenerativeModel('gemini-3-pro-preview')
-        else:
+        # Shared, cached model handle - Vertex AI if available, otherwise standard API
+        if gemini_client.provider is None:
             print("Error: Neither Vertex AI nor standard Gemini API available")
             return None
+        model = gemini_client.get_model(GEMINI_MODEL_NAME)
         
         # Handle different file types
         if file_extension in SUPPORTED_IMAGE_TYPES:
             # For images, use vision model
-            image = Image.open(io.BytesIO(file_contents))
+            prepared_image = prepare_image_for_gemini(file_contents)
             
             prompt = """Please extract and summarize the main information from this document image. 
             Include all important details such as:
@@ -462,16 +743,8 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
             print("-"*80)
             print("⏳ Waiting for Gemini response...")
             
-            if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                # Vertex AI format - convert image to bytes
-                img_bytes = io.BytesIO()
-                image.save(img_bytes, format='JPEG')
-                img_bytes.seek(0)
-                image_part = Part.from_data(img_bytes.read(), mime_type="image/jpeg")
-                response = model.generate_content([prompt, image_part])
-            else:
-                # Standard API format
-                response = model.generate_content([prompt, image])
+            print(f"🖼  Image: {prepared_image.describe()}")
+            response = gemini_client.generate("text_extraction", [prompt, image_part(prepared_image)], model=model)
             
             print("✅ RECEIVED RESPONSE FROM GEMINI:")
             print("-"*80)
@@ -481,81 +754,36 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
             return response.text
         
         elif file_extension == ".pdf":
-            # For PDFs, we need to save temporarily and upload
-            # Gemini requires file uploads for PDFs
-            import tempfile
+            prompt = """Please extract and summarize the main information from this PDF document. 
+            Include all important details such as:
+            - Document type and purpose
+            - Names, dates, identification numbers
+            - Key dates and expiration dates
+            - Important numbers, codes, and references
+            - Academic information (if applicable): grades, courses, GPA, etc.
+            - Any other relevant information
+            
+            Format the output as clear, structured text that captures all essential information from the document."""
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                tmp_file.write(file_contents)
-                tmp_path = tmp_file.name
+            print("\n" + "="*80)
+            print(f"🔵 GEMINI API CALL: extract_text_from_document() - PDF")
+            print(f"📄 File: {filename} ({len(file_contents) / 1024:.0f} KB)")
+            print("-"*80)
+            print("📤 SENDING PROMPT TO GEMINI:")
+            print("-"*80)
+            print(prompt)
+            print("-"*80)
+            print("⏳ Waiting for Gemini response...")
             
-            try:
-                prompt = """Please extract and summarize the main information from this PDF document. 
-                Include all important details such as:
-                - Document type and purpose
-                - Names, dates, identification numbers
-                - Key dates and expiration dates
-                - Important numbers, codes, and references
-                - Academic information (if applicable): grades, courses, GPA, etc.
-                - Any other relevant information
-                
-                Format the output as clear, structured text that captures all essential information from the document."""
-                
-                print("\n" + "="*80)
-                print(f"🔵 GEMINI API CALL: extract_text_from_document() - PDF")
-                print(f"📄 File: {filename}")
-                print("-"*80)
-                print("📤 SENDING PROMPT TO GEMINI:")
-                print("-"*80)
-                print(prompt)
-                print("-"*80)
-                print("⏳ Waiting for Gemini response...")
-                
-                if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                    # Vertex AI - read PDF directly
-                    with open(tmp_path, 'rb') as f:
-                        pdf_data = f.read()
-                    pdf_part = Part.from_data(pdf_data, mime_type="application/pdf")
-                    response = model.generate_content([prompt, pdf_part])
-                else:
-                    # Standard API - upload file first
-                    print("📤 Uploading PDF to Gemini...")
-                    pdf_file = genai.upload_file(
-                        path=tmp_path,
-                        mime_type="application/pdf"
-                    )
-                    
-                    # Wait for file to be processed
-                    import time
-                    while pdf_file.state.name == "PROCESSING":
-                        print("   ⏳ PDF still processing...")
-                        time.sleep(2)
-                        pdf_file = genai.get_file(pdf_file.name)
-                    
-                    if pdf_file.state.name == "FAILED":
-                        raise Exception(f"File processing failed: {pdf_file.state}")
-                    
-                    print("✅ PDF uploaded, generating content...")
-                    response = model.generate_content([prompt, pdf_file])
-                    
-                    # Clean up uploaded file
-                    try:
-                        genai.delete_file(pdf_file.name)
-                    except:
-                        pass
-                
-                print("✅ RECEIVED RESPONSE FROM GEMINI:")
-                print("-"*80)
-                print(response.text[:1000] + ("..." if len(response.text) > 1000 else ""))
-                print("="*80 + "\n")
-                
-                return response.text
-            finally:
-                # Clean up temporary file
-                try:
-                    os.unlink(tmp_path)
-                except:
-                    pass
+            with pdf_content(file_contents) as pdf_part:
+                extracted_text = gemini_client.generate("text_extraction", [prompt, pdf_part], model=model).text
+            
+            print("✅ RECEIVED RESPONSE FROM GEMINI:")
+            print("-"*80)
+            print(extracted_text[:1000] + ("..." if len(extracted_text) > 1000 else ""))
+            print("="*80 + "\n")
+            
+            return extracted_text
         
         elif file_extension == ".txt":
             # For text files, read and summarize
@@ -584,7 +812,7 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
             print("-"*80)
             print("⏳ Waiting for Gemini response...")
             
-            response = model.generate_content(prompt)
+            response = gemini_client.generate("text_extraction", prompt, model=model)
             
             print("✅ RECEIVED RESPONSE FROM GEMINI:")
             print("-"*80)
@@ -596,7 +824,7 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
         else:
             # For other file types, try to process as image if possible
             try:
-                image = Image.open(io.BytesIO(file_contents))
+                prepared_image = prepare_image_for_gemini(file_contents)
                 prompt = """Please extract and summarize the main information from this document. 
                 Include all important details such as:
                 - Document type (passport, visa, transcript, certificate, etc.)
@@ -617,16 +845,8 @@ def extract_text_from_document(file_contents: bytes, filename: str, mime_type: s
                 print("-"*80)
                 print("⏳ Waiting for Gemini response...")
                 
-                if USE_VERTEX_AI and VERTEX_AI_AVAILABLE:
-                    # Vertex AI format - convert image to bytes
-                    img_bytes = io.BytesIO()
-                    image.save(img_bytes, format='JPEG')
-                    img_bytes.seek(0)
-                    image_part = Part.from_data(img_bytes.read(), mime_type="image/jpeg")
-                    response = model.generate_content([prompt, image_part])
-                else:
-                    # Standard API format
-                    response = model.generate_content([prompt, image])
+                print(f"🖼  Image: {prepared_image.describe()}")
+                response = gemini_client.generate("text_extraction", [prompt, image_part(prepared_image)], model=model)
                 
                 print("✅ RECEIVED RESPONSE FROM GEMINI:")
                 print("-"*80)
@@ -0,0 +1,159 @@
+"""
+Image pre-processing for Gemini vision calls.
+
+Uploaded photos are normalised before they are sent to Gemini:
+- EXIF orientation is applied, so rotated phone photos arrive upright
+- any colour mode (RGBA, P, CMYK, 16-bit) becomes RGB or L, flattening
+  transparency onto white
+- the long edge is capped at GEMINI_IMAGE_MAX_EDGE; Gemini tiles images
+  internally, so larger inputs add bytes and tokens but no legibility
+- the result is encoded as PNG (screenshots and scans), JPEG or WebP,
+  stepping quality down until it fits GEMINI_IMAGE_TARGET_KB
+
+Small images that need none of this are passed through untouched. Images
+whose header declares more than GEMINI_IMAGE_MAX_PIXELS are rejected before
+any pixel data is decoded (decompression-bomb guard).
+"""
+import io
+import os
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+GEMINI_IMAGE_MAX_EDGE = max(256, int(os.getenv("GEMINI_IMAGE_MAX_EDGE", "2048") or "2048"))
+GEMINI_IMAGE_TARGET_KB = max(32, int(os.getenv("GEMINI_IMAGE_TARGET_KB", "600") or "600"))
+GEMINI_IMAGE_FORMAT = (os.getenv("GEMINI_IMAGE_FORMAT", "auto") or "auto").strip().lower()  # auto | jpeg | webp
+GEMINI_IMAGE_MAX_PIXELS = max(1_000_000, int(os.getenv("GEMINI_IMAGE_MAX_PIXELS", "60000000") or "60000000"))
+
+# Qualities tried in order until the encoded image fits the target size.
+_QUALITY_STEPS = (85, 75, 65, 55)
+_PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+class PreparedImage:
+    __slots__ = ("data", "mime_type", "width", "height", "original_size", "original_width", "original_height")
+
+    def __init__(self, data: bytes, mime_type: str, width: int, height: int, original_size: int, original_width: int, original_height: int) -> None:
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_size = original_size
+        self.original_width = original_width
+        self.original_height = original_height
+
+    def describe(self) -> str:
+        return (
+            f"{self.original_width}x{self.original_height} {self.original_size / 1024:.0f} KB -> "
+            f"{self.width}x{self.height} {len(self.data) / 1024:.0f} KB {self.mime_type}"
+        )
+
+
+def _to_rgb_or_l(image: Image.Image) -> Image.Image:
+    if image.mode in ("RGB", "L"):
+        return image
+    if image.mode == "P":
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode in ("RGBA", "LA", "PA"):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if image.mode in ("I;16", "I;16B", "I;16L", "I"):
+        # 16/32-bit greyscale scans: rescale to 8 bits.
+        return image.point(lambda value: value * (1 / 256)).convert("L")
+    return image.convert("RGB")
+
+
+def _encode(image: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, format="PNG", compress_level=6)
+    elif fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=3)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _encode_adaptive(image: Image.Image, target_bytes: int, image_format: str, lossless_source: bool) -> tuple[bytes, str]:
+    # Screenshots and scans (PNG/GIF sources) are mostly flat colour and stay
+    # smallest, and sharpest, as PNG. Otherwise JPEG is tried first because it
+    # encodes several times faster than WebP; WebP is only tried when JPEG
+    # misses the target, which on busy, noisy photos it often beats.
+    if image_format == "auto" and lossless_source:
+        data = _encode(image, "PNG", 0)
+        if len(data) <= target_bytes:
+            return data, "image/png"
+    formats = {"jpeg": ("JPEG",), "webp": ("WEBP",)}.get(image_format, ("JPEG", "WEBP"))
+    best: Optional[tuple[bytes, str]] = None
+    for quality in _QUALITY_STEPS:
+        for fmt in formats:
+            data = _encode(image, fmt, quality)
+            if best is None or len(data) < len(best[0]):
+                best = (data, fmt)
+            if len(data) <= target_bytes:
+                break
+        if len(best[0]) <= target_bytes:
+            break
+    data, fmt = best
+    return data, "image/webp" if fmt == "WEBP" else "image/jpeg"
+
+
+def prepare_image_for_gemini(
+    file_contents: bytes,
+    max_edge: Optional[int] = None,
+    target_kb: Optional[int] = None,
+    image_format: Optional[str] = None,
+) -> PreparedImage:
+    """
+    Normalise and shrink an uploaded image for a Gemini vision call.
+
+    Raises:
+        ValueError: If the bytes are not a readable image or declare too many pixels
+    """
+    max_edge = max_edge or GEMINI_IMAGE_MAX_EDGE
+    target_bytes = (target_kb or GEMINI_IMAGE_TARGET_KB) * 1024
+    image_format = (image_format or GEMINI_IMAGE_FORMAT).lower()
+
+    try:
+        # open() only parses the header; pixel data is decoded on first access.
+        image = Image.open(io.BytesIO(file_contents))
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise ValueError(f"Unreadable image: {str(exc)}") from exc
+    original_width, original_height = image.size
+    if original_width * original_height > GEMINI_IMAGE_MAX_PIXELS:
+        raise ValueError(
+            f"Image is too large to process ({original_width}x{original_height} pixels)."
+        )
+
+    orientation = image.getexif().get(_EXIF_ORIENTATION_TAG, 1)
+    if (
+        image.format in _PASSTHROUGH_FORMATS
+        and len(file_contents) <= target_bytes
+        and max(original_width, original_height) <= max_edge
+        and orientation in (None, 1)
+        and image.mode in ("RGB", "L")
+    ):
+        return PreparedImage(
+            file_contents, _PASSTHROUGH_FORMATS[image.format], original_width, original_height,
+            len(file_contents), original_width, original_height,
+        )
+
+    source_format = image.format
+    try:
+        if source_format == "JPEG":
+            # Let libjpeg decode at a reduced scale (1/2, 1/4, 1/8) when the image is far too big.
+            image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image = _to_rgb_or_l(image)
+        if max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        data, mime_type = _encode_adaptive(image, target_bytes, image_format, source_format in ("PNG", "GIF"))
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ValueError(f"Unreadable image: {str(exc)}") from exc
+
+    return PreparedImage(
+        data, mime_type, image.width, image.height, len(file_contents), original_width, original_height,
+    )
@@ -0,0 +1,461 @@
+"""
+Shared object-storage layer.
+One pooled, retrying boto3 client is shared by every R2 bucket consumer; a
+local filesystem backend (OBJECT_STORAGE_BACKEND=local) lets tests and
+benchmarks run without R2.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+OBJECT_STORAGE_BACKEND = (os.getenv("OBJECT_STORAGE_BACKEND", "r2").strip().lower() or "r2")
+LOCAL_OBJECT_STORAGE_ROOT = os.getenv("LOCAL_OBJECT_STORAGE_ROOT", "./local_object_storage")
+
+R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID", "")
+R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID", "")
+R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "")
+R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL", f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com")
+R2_DOCUMENTS_BUCKET = os.getenv("R2_DOCUMENTS_BUCKET", "documents")
+R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "images")
+
+R2_MAX_POOL_CONNECTIONS = max(1, int(os.getenv("R2_MAX_POOL_CONNECTIONS", "50") or "50"))
+R2_MAX_ATTEMPTS = max(1, int(os.getenv("R2_MAX_ATTEMPTS", "4") or "4"))
+R2_CONNECT_TIMEOUT_SECONDS = float(os.getenv("R2_CONNECT_TIMEOUT_SECONDS", "5") or "5")
+R2_READ_TIMEOUT_SECONDS = float(os.getenv("R2_READ_TIMEOUT_SECONDS", "30") or "30")
+# Upper bound on concurrent GETs issued by one get_many() call.
+R2_FETCH_CONCURRENCY = max(1, int(os.getenv("R2_FETCH_CONCURRENCY", "8") or "8"))
+# Threads shared by all get_many() calls, so several requests fetch at full concurrency
+# at once; stays below the client pool size.
+R2_FETCH_POOL_SIZE = max(R2_FETCH_CONCURRENCY, int(os.getenv("R2_FETCH_POOL_SIZE", "32") or "32"))
+# Streaming transfers: ranged GET size for iter_bytes() and part size for put_stream().
+# S3/R2 require non-final multipart parts of at least 5 MB.
+R2_RANGE_READ_BYTES = max(64, int(os.getenv("R2_RANGE_READ_KB", "1024") or "1024")) * 1024
+R2_MULTIPART_PART_BYTES = max(5, int(os.getenv("R2_MULTIPART_PART_SIZE_MB", "8") or "8")) * 1024 * 1024
+
+
+class ObjectNotFoundError(KeyError):
+    """Raised when a key does not exist in the bucket."""
+
+
+class BatchFetchResult:
+    """Outcome of get_many(): bytes for keys that loaded plus per-key errors for the rest."""
+
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.errors: dict[str, Exception] = {}
+        self.timed_out: list[str] = []
+
+    @property
+    def complete(self) -> bool:
+        return not self.errors and not self.timed_out
+
+
+_fetch_executor: Optional[ThreadPoolExecutor] = None
+_fetch_executor_lock = threading.Lock()
+
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    global _fetch_executor
+    with _fetch_executor_lock:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(
+                max_workers=R2_FETCH_POOL_SIZE,
+                thread_name_prefix="object-storage-fetch",
+            )
+        return _fetch_executor
+
+
+def stop_object_storage_workers() -> None:
+    global _fetch_executor
+    with _fetch_executor_lock:
+        executor = _fetch_executor
+        _fetch_executor = None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _ObjectStorageMixin:
+    """
+    Helpers layered on the backend primitives: bounded parallel batch reads and
+    thread-offloaded async variants so async handlers never block the event loop.
+    """
+
+    def get_many(self, keys: Iterable[str], timeout: Optional[float] = None) -> BatchFetchResult:
+        """
+        Fetch several keys concurrently on the shared fetch pool, at most
+        R2_FETCH_CONCURRENCY at a time for this call. Keys that fail or miss the
+        deadline are reported instead of raised so callers can work with partial results.
+        Once the deadline passes no further keys are started, so a timed-out call only
+        keeps the GETs already in flight on the shared pool.
+        """
+        result = BatchFetchResult()
+        unique_keys = list(dict.fromkeys(key for key in keys if key))
+        if not unique_keys:
+            return result
+        if len(unique_keys) == 1 and timeout is None:
+            key = unique_keys[0]
+            try:
+                result.objects[key] = self.get_bytes(key)
+            except Exception as exc:  # noqa: BLE001
+                result.errors[key] = exc
+            return result
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending = deque(unique_keys)
+        lock = threading.Lock()
+        closed = threading.Event()
+
+        def drain() -> None:
+            while True:
+                with lock:
+                    if closed.is_set() or not pending:
+                        return
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+                    key = pending.popleft()
+                try:
+                    data, error = self.get_bytes(key), None
+                except Exception as exc:  # noqa: BLE001
+                    data, error = None, exc
+                with lock:
+                    if closed.is_set():
+                        return
+                    if error is None:
+                        result.objects[key] = data
+                    else:
+                        result.errors[key] = error
+
+        executor = _get_fetch_executor()
+        workers = [executor.submit(drain) for _ in range(min(R2_FETCH_CONCURRENCY, len(unique_keys)))]
+        wait(workers, timeout=timeout)
+        with lock:
+            # Results arriving after this point are dropped; the caller already has its answer.
+            closed.set()
+            for worker in workers:
+                worker.cancel()
+            result.timed_out = [
+                key for key in unique_keys if key not in result.objects and key not in result.errors
+            ]
+        return result
+
+    async def _run(self, fn, *args, timeout: Optional[float] = None, **kwargs):
+        call = asyncio.to_thread(fn, *args, **kwargs)
+        if timeout is None:
+            return await call
+        return await asyncio.wait_for(call, timeout=timeout)
+
+    async def aget_bytes(self, key: str, timeout: Optional[float] = None) -> bytes:
+        return await self._run(self.get_bytes, key, timeout=timeout)
+
+    async def aput_bytes(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return await self._run(self.put_bytes, key, data, content_type, metadata, timeout=timeout)
+
+    async def adelete(self, key: str, timeout: Optional[float] = None) -> None:
+        await self._run(self.delete, key, timeout=timeout)
+
+    async def alist_keys(self, prefix: str = "", timeout: Optional[float] = None) -> list[str]:
+        return await self._run(lambda: list(self.list_keys(prefix)), timeout=timeout)
+
+
+class R2ObjectStorage(_ObjectStorageMixin):
+    def __init__(self, bucket: str, client) -> None:
+        self.bucket = bucket
+        self._client = client
+
+    def get_bytes(self, key: str) -> bytes:
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") in {"NoSuchKey", "404"}:
+                raise ObjectNotFoundError(key) from exc
+            raise
+        return response["Body"].read()
+
+    def iter_bytes(self, key: str, range_size: int = R2_RANGE_READ_BYTES) -> Iterator[bytes]:
+        """Read an object as consecutive ranged GETs; each range is retried independently."""
+        start = 0
+        while True:
+            try:
+                response = self._client.get_object(
+                    Bucket=self.bucket,
+                    Key=key,
+                    Range=f"bytes={start}-{start + range_size - 1}",
+                )
+            except ClientError as exc:
+                code = exc.response.get("Error", {}).get("Code")
+                if code in {"NoSuchKey", "404"}:
+                    raise ObjectNotFoundError(key) from exc
+                if code in {"InvalidRange", "416"}:
+                    # Empty object, or the previous range ended exactly at the end.
+                    return
+                raise
+            data = response["Body"].read()
+            if data:
+                yield data
+            start += len(data)
+            content_range = response.get("ContentRange") or ""
+            total = int(content_range.rsplit("/", 1)[1]) if "/" in content_range else None
+            if len(data) < range_size or (total is not None and start >= total):
+                return
+
+    def put_stream(
+        self,
+        key: str,
+        blocks: Iterable[bytes],
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+        part_size: int = R2_MULTIPART_PART_BYTES,
+    ) -> str:
+        """
+        Upload from an iterator, holding at most one part in memory. Objects that fit
+        in one part are sent with a single PUT; larger ones use a multipart upload
+        that is aborted on failure.
+        """
+        buffer = bytearray()
+        upload_id = None
+        parts: list[dict] = []
+        params = {"Bucket": self.bucket, "Key": key}
+
+        def upload_part(body: bytes) -> None:
+            response = self._client.upload_part(
+                **params, UploadId=upload_id, PartNumber=len(parts) + 1, Body=body
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+
+        try:
+            for block in blocks:
+                buffer += block
+                while len(buffer) > part_size:
+                    if upload_id is None:
+                        extra = {"ContentType": content_type}
+                        if metadata:
+                            extra["Metadata"] = metadata
+                        upload_id = self._client.create_multipart_upload(**params, **extra)["UploadId"]
+                    upload_part(bytes(buffer[:part_size]))
+                    del buffer[:part_size]
+            if upload_id is None:
+                return self.put_bytes(key, bytes(buffer), content_type, metadata)
+            upload_part(bytes(buffer))
+            self._client.complete_multipart_upload(
+                **params, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+            return key
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    self._client.abort_multipart_upload(**params, UploadId=upload_id)
+                except Exception as exc:  # noqa: BLE001
+                    print(f"Failed to abort multipart upload for {key}: {exc}")
+            raise
+
+    def put_bytes(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+    ) -> str:
+        params = {
+            "Bucket": self.bucket,
+            "Key": key,
+            "Body": data,
+            "ContentType": content_type,
+        }
+        if metadata:
+            params["Metadata"] = metadata
+        self._client.put_object(**params)
+        return key
+
+    def delete(self, key: str) -> None:
+        self._client.delete_object(Bucket=self.bucket, Key=key)
+
+    def list_keys(self, prefix: str = "") -> Iterator[str]:
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get("Contents", []) or []:
+                yield item["Key"]
+
+    def list_prefixes(self, prefix: str = "") -> Iterator[str]:
+        """Immediate "directories" under prefix, e.g. "user_1/" for prefix "user_"."""
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter="/"):
+            for item in page.get("CommonPrefixes", []) or []:
+                yield item["Prefix"]
+
+    def presigned_url(self, key: str, expires_in: int = 3600) -> str:
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+
+class LocalObjectStorage(_ObjectStorageMixin):
+    """Filesystem-backed bucket rooted at <root>/<bucket>/. Metadata is not persisted."""
+
+    def __init__(self, bucket: str, root: str) -> None:
+        self.bucket = bucket
+        self._base = (Path(root) / bucket).resolve()
+        self._base.mkdir(parents=True, exist_ok=True)
+
+    def _path_for(self, key: str) -> Path:
+        path = (self._base / key).resolve()
+        if path != self._base and self._base not in path.parents:
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def get_bytes(self, key: str) -> bytes:
+        path = self._path_for(key)
+        try:
+            return path.read_bytes()
+        except FileNotFoundError as exc:
+            raise ObjectNotFoundError(key) from exc
+
+    def iter_bytes(self, key: str, range_size: int = R2_RANGE_READ_BYTES) -> Iterator[bytes]:
+        path = self._path_for(key)
+        try:
+            handle = path.open("rb")
+        except FileNotFoundError as exc:
+            raise ObjectNotFoundError(key) from exc
+        with handle:
+            while True:
+                data = handle.read(range_size)
+                if not data:
+                    return
+                yield data
+
+    def put_stream(
+        self,
+        key: str,
+        blocks: Iterable[bytes],
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+        part_size: int = R2_MULTIPART_PART_BYTES,
+    ) -> str:
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("wb") as handle:
+                for block in blocks:
+                    handle.write(block)
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return key
+
+    def put_bytes(
+        self,
+        key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+        metadata: Optional[dict] = None,
+    ) -> str:
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return key
+
+    def delete(self, key: str) -> None:
+        try:
+            self._path_for(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def list_keys(self, prefix: str = "") -> Iterator[str]:
+        # Only walk the directory the prefix points into, not the whole bucket.
+        parent = prefix.rpartition("/")[0]
+        directory = self._path_for(parent) if parent else self._base
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.rglob("*")):
+            if not path.is_file() or path.name.startswith("."):
+                continue
+            key = path.relative_to(self._base).as_posix()
+            if key.startswith(prefix):
+                yield key
+
+    def list_prefixes(self, prefix: str = "") -> Iterator[str]:
+        parent, _, name_prefix = prefix.rpartition("/")
+        directory = self._path_for(parent) if parent else self._base
+        if not directory.is_dir():
+            return
+        for path in sorted(directory.iterdir()):
+            if path.is_dir() and path.name.startswith(name_prefix):
+                yield path.relative_to(self._base).as_posix() + "/"
+
+    def presigned_url(self, key: str, expires_in: int = 3600) -> str:
+        return self._path_for(key).as_uri()
+
+
+_client_lock = threading.RLock()
+_r2_client = None
+_storages: dict[str, object] = {}
+
+
+def get_r2_client():
+    """Process-wide boto3 S3 client with a tuned pool, adaptive retries and timeouts."""
+    global _r2_client
+    if _r2_client is not None:
+        return _r2_client
+    with _client_lock:
+        if _r2_client is None:
+            if not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
+                raise ValueError("R2_ACCESS_KEY_ID and R2_SECRET_ACCESS_KEY must be set in environment variables")
+            _r2_client = boto3.client(
+                "s3",
+                endpoint_url=R2_ENDPOINT_URL,
+                aws_access_key_id=R2_ACCESS_KEY_ID,
+                aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+                region_name="auto",
+                config=Config(
+                    signature_version="s3v4",
+                    max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                    retries={"mode": "adaptive", "max_attempts": R2_MAX_ATTEMPTS},
+                    connect_timeout=R2_CONNECT_TIMEOUT_SECONDS,
+                    read_timeout=R2_READ_TIMEOUT_SECONDS,
+                    tcp_keepalive=True,
+                ),
+            )
+    return _r2_client
+
+
+def get_object_storage(bucket: str):
+    storage = _storages.get(bucket)
+    if storage is not None:
+        return storage
+    with _client_lock:
+        storage = _storages.get(bucket)
+        if storage is None:
+            if OBJECT_STORAGE_BACKEND == "local":
+                storage = LocalObjectStorage(bucket, LOCAL_OBJECT_STORAGE_ROOT)
+            else:
+                storage = R2ObjectStorage(bucket, get_r2_client())
+            _storages[bucket] = storage
+    return storage
+
+
+def get_document_storage():
+    return get_object_storage(R2_DOCUMENTS_BUCKET)
+
+
+def get_image_storage():
+    return get_object_storage(R2_BUCKET_NAME)
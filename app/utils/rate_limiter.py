@@ -1,8 +1,7 @@
 import os
-import random
+import sqlite3
 import threading
 import time
-from collections import defaultdict, deque
 from typing import Optional, Tuple
 
 from fastapi import Request
@@ -10,6 +9,11 @@ from sqlalchemy import text
 
 from app.database import engine
 
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
 
 def _is_truthy(value: str) -> bool:
     return str(value).strip().lower() in {"1", "true", "yes", "on"}
@@ -21,45 +25,195 @@ def _parse_csv_set(raw: str) -> set[str]:
 
 TRUST_PROXY_HEADERS = _is_truthy(os.getenv("TRUST_PROXY_HEADERS", "false"))
 TRUSTED_PROXY_IPS = _parse_csv_set(os.getenv("TRUSTED_PROXY_IPS", ""))
+# "database", "redis" or "memory".
 RATE_LIMIT_BACKEND = (os.getenv("RATE_LIMIT_BACKEND", "database").strip().lower() or "database")
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "").strip()
+RATE_LIMIT_REDIS_PREFIX = os.getenv("RATE_LIMIT_REDIS_PREFIX", "rilono:ratelimit")
+RATE_LIMIT_REDIS_MAX_CONNECTIONS = max(1, int(os.getenv("RATE_LIMIT_REDIS_MAX_CONNECTIONS", "50") or "50"))
+RATE_LIMIT_REDIS_TIMEOUT_SECONDS = max(0.05, float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_SECONDS", "0.5") or "0.5"))
+RATE_LIMIT_REDIS_USE_LUA = _is_truthy(os.getenv("RATE_LIMIT_REDIS_USE_LUA", "true"))
+RATE_LIMIT_SWEEP_INTERVAL_SECONDS = max(5, int(os.getenv("RATE_LIMIT_SWEEP_INTERVAL_SECONDS", "60") or "60"))
+RATE_LIMIT_SWEEP_BATCH_SIZE = max(100, int(os.getenv("RATE_LIMIT_SWEEP_BATCH_SIZE", "5000") or "5000"))
+# Buckets untouched for longer than this are swept; keep it above the largest rate limit window.
+RATE_LIMIT_BUCKET_RETENTION_SECONDS = max(60, int(os.getenv("RATE_LIMIT_BUCKET_RETENTION_SECONDS", "3600") or "3600"))
+# In-process tier: "sliding_window" (sliding-window counter) or "gcra" (token bucket).
+RATE_LIMIT_MEMORY_STRATEGY = (os.getenv("RATE_LIMIT_MEMORY_STRATEGY", "sliding_window").strip().lower() or "sliding_window")
+RATE_LIMIT_MEMORY_SHARDS = max(1, int(os.getenv("RATE_LIMIT_MEMORY_SHARDS", "32") or "32"))
+RATE_LIMIT_SHADOW_MAX_KEYS = max(1000, int(os.getenv("RATE_LIMIT_SHADOW_MAX_KEYS", "50000") or "50000"))
+
+
+class SlidingWindowCounterStrategy:
+    """
+    Sliding-window counter: the previous fixed window's count, weighted by how much
+    of it still overlaps the sliding window, plus the current window's count.
+    State per key: [window_start, previous_count, current_count, expires_at].
+    """
 
+    name = "sliding_window"
+
+    def allow(self, entries: dict, key: str, now: float, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        window_start = now - (now % window_seconds)
+        state = entries.get(key)
+        if state is None or state[0] + window_seconds < window_start:
+            # No state, or the last activity is older than the previous window.
+            state = [window_start, 0, 0, 0.0]
+            entries[key] = state
+        elif state[0] < window_start:
+            state[1] = state[2]
+            state[2] = 0
+            state[0] = window_start
+
+        elapsed = now - window_start
+        previous_weight = (window_seconds - elapsed) / window_seconds
+        estimated = state[1] * previous_weight + state[2]
+        if estimated >= limit:
+            if state[2] >= limit or state[1] == 0:
+                retry_after = window_seconds - elapsed
+            else:
+                # Time until the weighted previous window decays enough for one more request.
+                retry_after = window_seconds * (1 - (limit - state[2]) / state[1]) - elapsed
+            return False, int(max(1, retry_after))
+
+        state[2] += 1
+        state[3] = window_start + 2 * window_seconds
+        return True, 0
 
-class InMemoryRateLimiter:
+    @staticmethod
+    def expires_at(state) -> float:
+        return state[3]
+
+
+class GCRAStrategy:
     """
-    Simple fixed-window in-memory rate limiter.
-    Suitable for local/single-instance deployments.
+    Generic cell rate algorithm (token bucket equivalent): `limit` requests per
+    window with bursts up to `limit`. State per key: the theoretical arrival time.
     """
 
+    name = "gcra"
+
+    def allow(self, entries: dict, key: str, now: float, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        emission_interval = window_seconds / limit if limit > 0 else window_seconds
+        theoretical_arrival = entries.get(key, now)
+        if theoretical_arrival < now:
+            theoretical_arrival = now
+        new_theoretical_arrival = theoretical_arrival + emission_interval
+        if new_theoretical_arrival - now > window_seconds:
+            return False, int(max(1, new_theoretical_arrival - window_seconds - now))
+        entries[key] = new_theoretical_arrival
+        return True, 0
+
+    @staticmethod
+    def expires_at(state) -> float:
+        return state
+
+
+RATE_LIMIT_STRATEGIES = {
+    SlidingWindowCounterStrategy.name: SlidingWindowCounterStrategy,
+    GCRAStrategy.name: GCRAStrategy,
+}
+
+
+class _RateLimitShard:
+    __slots__ = ("lock", "entries", "next_sweep_at")
+
     def __init__(self) -> None:
-        self._events: dict[str, deque[float]] = defaultdict(deque)
-        self._lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.entries: dict = {}
+        self.next_sweep_at = 0.0
+
+
+class InMemoryRateLimiter:
+    """
+    In-process rate limiter with constant state per key.
+    Suitable for local/single-instance deployments and as the fallback tier.
+
+    Keys are spread over lock-striped shards, and each shard drops idle keys
+    at most once per sweep interval, so memory stays bounded by active keys.
+    """
+
+    def __init__(
+        self,
+        strategy: str = "sliding_window",
+        shards: int = 32,
+        sweep_interval_seconds: int = 60,
+    ) -> None:
+        strategy_cls = RATE_LIMIT_STRATEGIES.get(strategy)
+        if strategy_cls is None:
+            raise ValueError(f"Unknown rate limit strategy: {strategy}")
+        self._strategy = strategy_cls()
+        self._shards = [_RateLimitShard() for _ in range(max(1, shards))]
+        self._shard_count = len(self._shards)
+        self._sweep_interval_seconds = sweep_interval_seconds
+
+    def _sweep_locked(self, shard: _RateLimitShard, now: float) -> None:
+        expires_at = self._strategy.expires_at
+        expired = [key for key, state in shard.entries.items() if expires_at(state) <= now]
+        for key in expired:
+            del shard.entries[key]
+        shard.next_sweep_at = now + self._sweep_interval_seconds
 
     def allow(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        if window_seconds < 1:
+            window_seconds = 1
         now = time.time()
-        cutoff = now - window_seconds
+        shard = self._shards[hash(key) % self._shard_count]
+        with shard.lock:
+            if now >= shard.next_sweep_at:
+                self._sweep_locked(shard, now)
+            return self._strategy.allow(shard.entries, key, now, limit, window_seconds)
 
-        with self._lock:
-            events = self._events[key]
-            while events and events[0] <= cutoff:
-                events.popleft()
+    def key_count(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
 
-            if len(events) >= limit:
-                retry_after = int(max(1, window_seconds - (now - events[0])))
-                return False, retry_after
 
-            events.append(now)
-            return True, 0
+class _OverLimitShadow:
+    """Keys known to be over their limit, mapped to the end of their window (epoch seconds)."""
+
+    def __init__(self, max_keys: int) -> None:
+        self._max_keys = max_keys
+        self._entries: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def retry_after(self, key: str, now: int) -> int:
+        with self._lock:
+            window_end = self._entries.get(key)
+            if window_end is None:
+                return 0
+            if window_end <= now:
+                del self._entries[key]
+                return 0
+            return window_end - now
+
+    def remember(self, key: str, window_end: int, now: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self._max_keys:
+                self._entries = {k: v for k, v in self._entries.items() if v > now}
+                while len(self._entries) >= self._max_keys:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = window_end
+
+    def prune(self, now: int) -> None:
+        with self._lock:
+            self._entries = {k: v for k, v in self._entries.items() if v > now}
 
 
 class DatabaseRateLimiter:
     """
     DB-backed fixed-window rate limiter.
     Works across multiple app instances sharing the same DB.
+
+    Each check is a single upsert returning the new count. Keys this process
+    has already seen over their limit are rejected from an in-process shadow
+    table until the window ends, so a burst against one key does not turn
+    into one DB write per request. Expired buckets are deleted by a
+    background sweeper instead of on the request path.
     """
 
     def __init__(self) -> None:
         self._initialized = False
         self._lock = threading.Lock()
+        self._shadow = _OverLimitShadow(RATE_LIMIT_SHADOW_MAX_KEYS)
+        self._max_window_seconds = 0
 
     def _ensure_table(self) -> None:
         if self._initialized:
@@ -114,61 +268,221 @@ class DatabaseRateLimiter:
                     )
             self._initialized = True
 
+    def _supports_returning(self) -> bool:
+        if engine.dialect.name == "sqlite":
+            return sqlite3.sqlite_version_info >= (3, 35, 0)
+        return True
+
+    def _increment(self, key: str, window_start: int, now: int) -> int:
+        params = {"rate_key": key, "window_start": window_start, "updated_at": now}
+        upsert_sql = """
+            INSERT INTO rate_limit_buckets (rate_key, window_start, request_count, updated_at)
+            VALUES (:rate_key, :window_start, 1, :updated_at)
+            ON CONFLICT (rate_key, window_start)
+            DO UPDATE SET
+                request_count = rate_limit_buckets.request_count + 1,
+                updated_at = :updated_at
+        """
+        with engine.begin() as conn:
+            if self._supports_returning():
+                row = conn.execute(text(upsert_sql + " RETURNING request_count"), params).first()
+            else:
+                conn.execute(text(upsert_sql), params)
+                row = conn.execute(
+                    text(
+                        """
+                        SELECT request_count
+                        FROM rate_limit_buckets
+                        WHERE rate_key = :rate_key AND window_start = :window_start
+                        """
+                    ),
+                    {"rate_key": key, "window_start": window_start},
+                ).first()
+        return int(row[0] if row else 0)
+
     def allow(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
-        self._ensure_table()
         now = int(time.time())
-        window_start = now - (now % max(window_seconds, 1))
+        shadow_retry_after = self._shadow.retry_after(key, now)
+        if shadow_retry_after:
+            return False, max(1, shadow_retry_after)
 
-        # Best-effort cleanup (1% of requests) to prevent table growth.
-        do_cleanup = random.randint(1, 100) == 1
-        cleanup_before = window_start - (window_seconds * 4)
+        self._ensure_table()
+        window_seconds = max(window_seconds, 1)
+        window_start = now - (now % window_seconds)
+        window_end = window_start + window_seconds
+        if window_seconds > self._max_window_seconds:
+            self._max_window_seconds = window_seconds
 
-        with engine.begin() as conn:
-            if do_cleanup:
-                conn.execute(
-                    text("DELETE FROM rate_limit_buckets WHERE updated_at < :cleanup_before"),
-                    {"cleanup_before": cleanup_before},
+        request_count = self._increment(key, window_start, now)
+        if request_count > limit:
+            self._shadow.remember(key, window_end, now)
+            retry_after = int(max(1, window_end - now))
+            return False, retry_after
+
+        return True, 0
+
+    def sweep_expired(self) -> int:
+        """Delete buckets past the retention period in bounded batches. Returns rows deleted."""
+        if not self._initialized:
+            return 0
+        now = int(time.time())
+        cutoff = now - max(RATE_LIMIT_BUCKET_RETENTION_SECONDS, self._max_window_seconds * 2)
+        self._shadow.prune(now)
+
+        deleted = 0
+        while True:
+            with engine.begin() as conn:
+                result = conn.execute(
+                    text(
+                        """
+                        DELETE FROM rate_limit_buckets
+                        WHERE (rate_key, window_start) IN (
+                            SELECT rate_key, window_start
+                            FROM rate_limit_buckets
+                            WHERE updated_at < :cleanup_before
+                            LIMIT :batch_size
+                        )
+                        """
+                    ),
+                    {"cleanup_before": cutoff, "batch_size": RATE_LIMIT_SWEEP_BATCH_SIZE},
                 )
+            batch_deleted = result.rowcount or 0
+            deleted += batch_deleted
+            if batch_deleted < RATE_LIMIT_SWEEP_BATCH_SIZE:
+                return deleted
 
-            conn.execute(
-                text(
-                    """
-                    INSERT INTO rate_limit_buckets (rate_key, window_start, request_count, updated_at)
-                    VALUES (:rate_key, :window_start, 1, :updated_at)
-                    ON CONFLICT (rate_key, window_start)
-                    DO UPDATE SET
-                        request_count = rate_limit_buckets.request_count + 1,
-                        updated_at = :updated_at
-                    """
-                ),
-                {
-                    "rate_key": key,
-                    "window_start": window_start,
-                    "updated_at": now,
-                },
-            )
 
-            row = conn.execute(
-                text(
-                    """
-                    SELECT request_count
-                    FROM rate_limit_buckets
-                    WHERE rate_key = :rate_key AND window_start = :window_start
-                    """
-                ),
-                {"rate_key": key, "window_start": window_start},
-            ).first()
-            request_count = int(row[0] if row else 0)
+class RateLimitBucketSweeper:
+    def __init__(self, limiter: DatabaseRateLimiter) -> None:
+        self._limiter = limiter
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run_loop,
+            name="rate-limit-sweeper",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def _run_loop(self) -> None:
+        while not self._stop_event.wait(RATE_LIMIT_SWEEP_INTERVAL_SECONDS):
+            try:
+                self._limiter.sweep_expired()
+            except Exception as exc:  # noqa: BLE001
+                print(f"Rate limit sweeper error: {str(exc)}")
+
+
+class RedisRateLimiter:
+    """
+    Fixed-window rate limiter on a Redis-compatible server, shared by all app instances.
+
+    Each check is one round trip: an atomic Lua script (EVALSHA, re-sent on
+    NOSCRIPT) or, with RATE_LIMIT_REDIS_USE_LUA=false, a pipelined INCR + EXPIRE
+    for servers without scripting. Shares the in-process over-limit shadow tier
+    with the database backend.
+    """
+
+    _INCREMENT_SCRIPT = """
+        local count = redis.call('INCR', KEYS[1])
+        if count == 1 then
+            redis.call('EXPIRE', KEYS[1], ARGV[1])
+        end
+        return count
+    """
+
+    def __init__(self, client, prefix: str = "rilono:ratelimit", use_lua: bool = True) -> None:
+        self._client = client
+        self._prefix = prefix
+        self._increment = client.register_script(self._INCREMENT_SCRIPT) if use_lua else None
+        self._shadow = _OverLimitShadow(RATE_LIMIT_SHADOW_MAX_KEYS)
+
+    def _increment_count(self, bucket_key: str, ttl_seconds: int) -> int:
+        if self._increment is not None:
+            return int(self._increment(keys=[bucket_key], args=[ttl_seconds]))
+        pipeline = self._client.pipeline(transaction=True)
+        pipeline.incr(bucket_key)
+        pipeline.expire(bucket_key, ttl_seconds)
+        count, _ = pipeline.execute()
+        return int(count)
 
+    def allow(self, key: str, limit: int, window_seconds: int) -> Tuple[bool, int]:
+        now = int(time.time())
+        shadow_retry_after = self._shadow.retry_after(key, now)
+        if shadow_retry_after:
+            return False, max(1, shadow_retry_after)
+
+        window_seconds = max(window_seconds, 1)
+        window_start = now - (now % window_seconds)
+        window_end = window_start + window_seconds
+        # The bucket outlives its window slightly so clock skew between instances cannot reset it early.
+        request_count = self._increment_count(f"{self._prefix}:{key}:{window_start}", window_seconds + 60)
         if request_count > limit:
-            retry_after = int(max(1, (window_start + window_seconds) - now))
-            return False, retry_after
+            self._shadow.remember(key, window_end, now)
+            return False, int(max(1, window_end - now))
 
         return True, 0
 
 
-in_memory_rate_limiter = InMemoryRateLimiter()
+def _build_redis_rate_limiter() -> Optional[RedisRateLimiter]:
+    if RATE_LIMIT_BACKEND != "redis":
+        return None
+    if not RATE_LIMIT_REDIS_URL:
+        print("Warning: RATE_LIMIT_BACKEND=redis but RATE_LIMIT_REDIS_URL is not set; using in-memory rate limiting")
+        return None
+    try:
+        if RATE_LIMIT_REDIS_URL.startswith("fakeredis://"):
+            # Embedded stand-in for local runs and tests (pip install "fakeredis[lua]").
+            import fakeredis
+
+            client = fakeredis.FakeRedis()
+        else:
+            if redis is None:
+                print("Warning: RATE_LIMIT_BACKEND=redis but the redis package is not installed; using in-memory rate limiting")
+                return None
+            pool = redis.ConnectionPool.from_url(
+                RATE_LIMIT_REDIS_URL,
+                max_connections=RATE_LIMIT_REDIS_MAX_CONNECTIONS,
+                socket_timeout=RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+                socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT_SECONDS,
+            )
+            client = redis.Redis(connection_pool=pool)
+        return RedisRateLimiter(client, prefix=RATE_LIMIT_REDIS_PREFIX, use_lua=RATE_LIMIT_REDIS_USE_LUA)
+    except Exception as exc:  # noqa: BLE001
+        print(f"Warning: Failed to configure Redis rate limiting, using in-memory rate limiting: {str(exc)}")
+        return None
+
+
+in_memory_rate_limiter = InMemoryRateLimiter(
+    strategy=RATE_LIMIT_MEMORY_STRATEGY,
+    shards=RATE_LIMIT_MEMORY_SHARDS,
+    sweep_interval_seconds=RATE_LIMIT_SWEEP_INTERVAL_SECONDS,
+)
 database_rate_limiter = DatabaseRateLimiter()
+redis_rate_limiter = _build_redis_rate_limiter()
+_bucket_sweeper = RateLimitBucketSweeper(database_rate_limiter)
+
+
+def _use_database_backend() -> bool:
+    return RATE_LIMIT_BACKEND == "database" and engine.dialect.name in {"postgresql", "sqlite"}
+
+
+def start_rate_limit_sweeper() -> None:
+    if _use_database_backend():
+        _bucket_sweeper.start()
+
+
+def stop_rate_limit_sweeper() -> None:
+    _bucket_sweeper.stop()
 
 
 def _should_trust_proxy_headers(request: Request) -> bool:
@@ -216,8 +530,14 @@ def check_ip_rate_limit(
     if extra_key:
         key = f"{key}:{extra_key}"
 
-    use_database_backend = RATE_LIMIT_BACKEND == "database" and engine.dialect.name in {"postgresql", "sqlite"}
-    if use_database_backend:
+    if redis_rate_limiter is not None:
+        try:
+            return redis_rate_limiter.allow(key=key, limit=limit, window_seconds=window_seconds)
+        except Exception:
+            # Same fail-open policy as the database backend.
+            return in_memory_rate_limiter.allow(key=key, limit=limit, window_seconds=window_seconds)
+
+    if _use_database_backend():
         try:
             return database_rate_limiter.allow(key=key, limit=limit, window_seconds=window_seconds)
         except Exception:
@@ -1,42 +1,107 @@
 import base64
 import hashlib
 import os
+from typing import Iterable, Optional
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
 
+# V1 payloads carry no key id and are tried against every key in the keyring.
 ARTIFACT_PREFIX = b"RILONO_ARTIFACT_ENC_V1:"
+# V2 payloads are "RILONO_ARTIFACT_ENC_V2:<key id>:<fernet token>".
+ARTIFACT_PREFIX_V2 = b"RILONO_ARTIFACT_ENC_V2:"
 _ARTIFACT_SECRET = (
     os.getenv("ARTIFACT_ENCRYPTION_KEY", "").strip()
     or os.getenv("SECRET_KEY", "").strip()
 )
+# Previous secrets that may still be needed to read existing artifacts during a rotation.
+_ARTIFACT_OLD_SECRETS = [
+    secret.strip()
+    for secret in os.getenv("ARTIFACT_ENCRYPTION_OLD_KEYS", "").split(",")
+    if secret.strip()
+]
 
 if not _ARTIFACT_SECRET:
     raise RuntimeError(
         "ARTIFACT_ENCRYPTION_KEY or SECRET_KEY must be set to encrypt artifact data."
     )
 
-_artifact_key = base64.urlsafe_b64encode(hashlib.sha256(_ARTIFACT_SECRET.encode("utf-8")).digest())
-_artifact_fernet = Fernet(_artifact_key)
+
+def _derive_artifact_key(secret: str) -> bytes:
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest())
+
+
+class ArtifactKeyring:
+    """
+    Current artifact key plus older keys that can still decrypt.
+    New payloads are written as V2 and name the key that sealed them.
+    """
+
+    def __init__(self, current_secret: str, old_secrets: Iterable[str] = ()) -> None:
+        current_key = _derive_artifact_key(current_secret)
+        self.current_key_id = self.key_id(current_key)
+        self._current = Fernet(current_key)
+        self._by_id: dict[bytes, Fernet] = {self.current_key_id: self._current}
+        for secret in old_secrets:
+            key = _derive_artifact_key(secret)
+            self._by_id.setdefault(self.key_id(key), Fernet(key))
+        self._any = MultiFernet([self._current] + [f for key_id, f in self._by_id.items() if key_id != self.current_key_id])
+        self._current_prefix = ARTIFACT_PREFIX_V2 + self.current_key_id + b":"
+
+    @staticmethod
+    def key_id(key: bytes) -> bytes:
+        return hashlib.sha256(b"rilono-artifact-key-id:" + key).hexdigest()[:12].encode("ascii")
+
+    def encrypt(self, data: bytes) -> bytes:
+        return self._current_prefix + self._current.encrypt(data)
+
+    def decrypt(self, data: bytes) -> bytes:
+        if not data:
+            return data
+        try:
+            if data.startswith(ARTIFACT_PREFIX_V2):
+                key_id, separator, token = data[len(ARTIFACT_PREFIX_V2):].partition(b":")
+                fernet = self._by_id.get(key_id)
+                if not separator or fernet is None:
+                    raise ValueError("Encrypted artifact payload uses an unknown key")
+                return fernet.decrypt(token)
+            if data.startswith(ARTIFACT_PREFIX):
+                return self._any.decrypt(data[len(ARTIFACT_PREFIX):])
+        except InvalidToken as exc:
+            raise ValueError("Encrypted artifact payload could not be decrypted") from exc
+        # Legacy fallback: payloads without a prefix are plaintext.
+        return data
+
+    def needs_rotation(self, data: bytes) -> bool:
+        """True unless the payload is already V2 under the current key (legacy plaintext included)."""
+        return bool(data) and not data.startswith(self._current_prefix)
+
+    def rotate(self, data: bytes) -> bytes:
+        """Re-encrypt a payload under the current key. Raises ValueError if it cannot be read."""
+        return self.encrypt(self.decrypt(data))
+
+
+_keyring = ArtifactKeyring(_ARTIFACT_SECRET, _ARTIFACT_OLD_SECRETS)
+
+
+def get_artifact_keyring(
+    current_secret: Optional[str] = None,
+    old_secrets: Optional[Iterable[str]] = None,
+) -> ArtifactKeyring:
+    """The process keyring, or a separate one for explicit secrets (rotation tooling)."""
+    if current_secret is None and old_secrets is None:
+        return _keyring
+    return ArtifactKeyring(current_secret or _ARTIFACT_SECRET, old_secrets or ())
 
 
 def encrypt_artifact_bytes(data: bytes) -> bytes:
     """Encrypt derived artifact bytes before storing in object storage."""
-    return ARTIFACT_PREFIX + _artifact_fernet.encrypt(data)
+    return _keyring.encrypt(data)
 
 
 def decrypt_artifact_bytes(data: bytes) -> bytes:
     """
-    Decrypt derived artifact bytes.
+    Decrypt derived artifact bytes (V2, V1 with any known key).
     Legacy fallback: if payload is not prefixed, treat it as plaintext.
     """
-    if not data:
-        return data
-    if not data.startswith(ARTIFACT_PREFIX):
-        return data
-
-    token = data[len(ARTIFACT_PREFIX):]
-    try:
-        return _artifact_fernet.decrypt(token)
-    except InvalidToken as exc:
-        raise ValueError("Encrypted artifact payload could not be decrypted") from exc
+    return _keyring.decrypt(data)
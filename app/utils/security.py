@@ -5,10 +5,21 @@ derived from the user's password. Even admins cannot decrypt files.
 """
 import os
 import base64
-from cryptography.fernet import Fernet
+import hashlib
+import secrets
+import threading
+import time
+from itertools import chain
+from typing import Iterable, Iterator, Optional
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
+from app.utils.chunked_encryption import decrypt_chunks, encrypt_chunks, is_chunked_ciphertext
+
+DOCUMENT_UNLOCK_TTL_SECONDS = max(60, int(os.getenv("DOCUMENT_UNLOCK_TTL_SECONDS", "900") or "900"))
+DOCUMENT_UNLOCK_MAX_SESSIONS = max(1, int(os.getenv("DOCUMENT_UNLOCK_MAX_SESSIONS", "10000") or "10000"))
 
 def derive_key_from_password(password: str, salt: bytes) -> bytes:
     """
@@ -38,7 +49,7 @@ def encrypt_file_with_user_password(file_bytes: bytes, user_password: str, user_
     
     Workflow:
     1. Generate a random key for THIS specific file
-    2. Encrypt the file content with the file key
+    2. Encrypt the file content with the file key (chunked AES-GCM, see chunked_encryption)
     3. Encrypt the file key using a key derived from user's password
     4. Return encrypted file data and encrypted key
     
@@ -54,15 +65,13 @@ def encrypt_file_with_user_password(file_bytes: bytes, user_password: str, user_
     """
     # Step 1: Generate a random key for THIS specific file
     file_key = Fernet.generate_key()
-    f_file = Fernet(file_key)
     
     # Step 2: Encrypt the actual file content
-    encrypted_file_data = f_file.encrypt(file_bytes)
+    encrypted_file_data = b"".join(encrypt_chunks(file_key, [file_bytes]))
     
     # Step 3: Derive key from user's password and encrypt the file key
     user_key_bytes = derive_key_from_password(user_password, user_salt)
-    f_user = Fernet(user_key_bytes)
-    encrypted_file_key = f_user.encrypt(file_key)
+    encrypted_file_key = Fernet(user_key_bytes).encrypt(file_key)
     
     # Step 4: Return encrypted data and encrypted key
     # Note: file_key is now discarded from memory
@@ -104,8 +113,7 @@ def decrypt_file_with_user_password(
         file_key = f_user.decrypt(encrypted_file_key)
         
         # Step 3: Decrypt the file content using the decrypted file key
-        f_file = Fernet(file_key)
-        decrypted_file_bytes = f_file.decrypt(encrypted_file_data)
+        decrypted_file_bytes = _decrypt_file_data(file_key, encrypted_file_data)
         
         return decrypted_file_bytes
         
@@ -113,6 +121,244 @@ def decrypt_file_with_user_password(
         # Wrong password, corrupted data, or other decryption error
         raise ValueError(f"Decryption failed: {str(e)}. This may indicate incorrect password or corrupted data.")
 
+def _decrypt_file_data(file_key: bytes, encrypted_file_data: bytes) -> bytes:
+    # Documents uploaded before the chunked format are single Fernet tokens.
+    if is_chunked_ciphertext(encrypted_file_data):
+        return b"".join(decrypt_chunks(file_key, [encrypted_file_data]))
+    return Fernet(file_key).decrypt(encrypted_file_data)
+
+def encrypt_file_with_key_wrapping_key(file_bytes: bytes, key_wrapping_key: bytes) -> tuple:
+    """
+    Same as encrypt_file_with_user_password(), with an already derived key-wrapping key
+    (see derive_key_from_password() and UnlockSessionStore).
+    """
+    return encrypt_files_with_key_wrapping_key([file_bytes], key_wrapping_key)[0]
+
+def decrypt_file_with_key_wrapping_key(
+    encrypted_file_data: bytes,
+    encrypted_file_key: bytes,
+    key_wrapping_key: bytes,
+) -> bytes:
+    """
+    Same as decrypt_file_with_user_password(), with an already derived key-wrapping key.
+
+    Raises:
+        ValueError: If the key does not match or data is corrupted
+    """
+    return decrypt_files_with_key_wrapping_key([(encrypted_file_data, encrypted_file_key)], key_wrapping_key)[0]
+
+def encrypt_files_with_key_wrapping_key(files: Iterable[bytes], key_wrapping_key: bytes) -> list:
+    """Encrypt several files under one key-wrapping key. Returns [(encrypted_file_data, encrypted_file_key)]."""
+    f_user = Fernet(key_wrapping_key)
+    results = []
+    for file_bytes in files:
+        file_key = Fernet.generate_key()
+        results.append((b"".join(encrypt_chunks(file_key, [file_bytes])), f_user.encrypt(file_key)))
+    return results
+
+def decrypt_files_with_key_wrapping_key(
+    encrypted_files: Iterable[tuple],
+    key_wrapping_key: bytes,
+) -> list:
+    """
+    Decrypt several (encrypted_file_data, encrypted_file_key) pairs under one key-wrapping key.
+
+    Raises:
+        ValueError: If the key does not match or any file is corrupted
+    """
+    try:
+        f_user = Fernet(key_wrapping_key)
+        return [
+            _decrypt_file_data(f_user.decrypt(encrypted_file_key), encrypted_file_data)
+            for encrypted_file_data, encrypted_file_key in encrypted_files
+        ]
+    except Exception as e:
+        raise ValueError(f"Decryption failed: {str(e)}. This may indicate incorrect password or corrupted data.")
+
+def encrypt_stream_with_key_wrapping_key(plaintext_blocks: Iterable[bytes], key_wrapping_key: bytes) -> tuple:
+    """
+    Streaming encrypt: returns (encrypted block iterator, encrypted_file_key).
+    Blocks are produced lazily, so memory stays bounded by the chunk size.
+    """
+    file_key = Fernet.generate_key()
+    encrypted_file_key = Fernet(key_wrapping_key).encrypt(file_key)
+    return encrypt_chunks(file_key, plaintext_blocks), encrypted_file_key
+
+def decrypt_stream_with_key_wrapping_key(
+    encrypted_blocks: Iterable[bytes],
+    encrypted_file_key: bytes,
+    key_wrapping_key: bytes,
+) -> Iterator[bytes]:
+    """
+    Streaming decrypt of an encrypted document. The file key is unwrapped before
+    returning, so a wrong key raises here rather than mid-stream. Legacy Fernet
+    blobs are detected by their header and decrypted in one piece.
+
+    Raises:
+        ValueError: If the key does not match; errors in later blocks surface while iterating
+    """
+    try:
+        file_key = Fernet(key_wrapping_key).decrypt(encrypted_file_key)
+    except Exception as e:
+        raise ValueError(f"Decryption failed: {str(e)}. This may indicate incorrect password or corrupted data.")
+
+    blocks = iter(encrypted_blocks)
+    first = b""
+    for block in blocks:
+        first += block
+        if len(first) >= 4:
+            break
+    if is_chunked_ciphertext(first):
+        return decrypt_chunks(file_key, chain([first], blocks))
+    try:
+        return iter([Fernet(file_key).decrypt(first + b"".join(blocks))])
+    except Exception as e:
+        raise ValueError(f"Decryption failed: {str(e)}. This may indicate incorrect password or corrupted data.")
+
+def _wipe(buffer: bytearray) -> None:
+    """Overwrite a buffer in place so the secret does not linger until garbage collection."""
+    buffer[:] = bytes(len(buffer))
+
+class _UnlockSession:
+    __slots__ = ("user_id", "sealed_key", "expires_at")
+
+    def __init__(self, user_id: int, sealed_key: bytearray, expires_at: float) -> None:
+        self.user_id = user_id
+        self.sealed_key = sealed_key
+        self.expires_at = expires_at
+
+class UnlockSessionStore:
+    """
+    Short-lived document unlock sessions.
+
+    After one password check the user's key-wrapping key is held in memory for
+    DOCUMENT_UNLOCK_TTL_SECONDS, so repeated uploads/downloads skip bcrypt and
+    PBKDF2. The key is stored encrypted under a key derived from the unlock token,
+    and only a hash of the token is kept, so the server cannot use a session
+    without the client presenting its token. Nothing is persisted, and the
+    stored key is zeroed when the session expires or is revoked.
+    """
+
+    def __init__(self, ttl_seconds: int, max_sessions: int, sweep_interval_seconds: int = 30) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._lock = threading.Lock()
+        # token hash -> session, in creation order
+        self._sessions: dict[str, _UnlockSession] = {}
+        self._next_sweep = 0.0
+
+    @staticmethod
+    def _token_id(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _token_cipher(token: str) -> Fernet:
+        token_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"rilono-document-unlock",
+            backend=default_backend(),
+        ).derive(token.encode("utf-8"))
+        return Fernet(base64.urlsafe_b64encode(token_key))
+
+    def _discard_locked(self, token_id: str) -> None:
+        session = self._sessions.pop(token_id, None)
+        if session is not None:
+            _wipe(session.sealed_key)
+
+    def _sweep_locked(self, now: float, force: bool = False) -> None:
+        if not force and now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval_seconds
+        for token_id in [key for key, session in self._sessions.items() if session.expires_at <= now]:
+            self._discard_locked(token_id)
+
+    def create(self, user_id: int, key_wrapping_key: bytes) -> str:
+        token = secrets.token_urlsafe(32)
+        sealed_key = bytearray(self._token_cipher(token).encrypt(key_wrapping_key))
+        now = time.monotonic()
+        with self._lock:
+            self._sweep_locked(now, force=len(self._sessions) >= self.max_sessions)
+            while len(self._sessions) >= self.max_sessions:
+                self._discard_locked(next(iter(self._sessions)))
+            self._sessions[self._token_id(token)] = _UnlockSession(user_id, sealed_key, now + self.ttl_seconds)
+        return token
+
+    def open(self, user_id: int, password: str, salt: bytes) -> str:
+        """Derive the key-wrapping key once and start a session for it."""
+        return self.create(user_id, derive_key_from_password(password, salt))
+
+    def get_key(self, token: str, user_id: int) -> Optional[bytes]:
+        """Key-wrapping key for a live session owned by user_id, else None."""
+        if not token:
+            return None
+        token_id = self._token_id(token)
+        now = time.monotonic()
+        with self._lock:
+            self._sweep_locked(now)
+            session = self._sessions.get(token_id)
+            if session is None:
+                return None
+            if session.expires_at <= now:
+                self._discard_locked(token_id)
+                return None
+            if session.user_id != user_id:
+                return None
+            sealed_key = bytes(session.sealed_key)
+        try:
+            return self._token_cipher(token).decrypt(sealed_key)
+        except InvalidToken:
+            return None
+
+    def require_key(self, token: str, user_id: int) -> bytes:
+        key_wrapping_key = self.get_key(token, user_id)
+        if key_wrapping_key is None:
+            raise ValueError("Unlock session is invalid or has expired.")
+        return key_wrapping_key
+
+    def revoke(self, token: str) -> None:
+        with self._lock:
+            self._discard_locked(self._token_id(token))
+
+    def revoke_user(self, user_id: int) -> None:
+        with self._lock:
+            for token_id in [key for key, session in self._sessions.items() if session.user_id == user_id]:
+                self._discard_locked(token_id)
+
+    def sweep_expired(self) -> None:
+        with self._lock:
+            self._sweep_locked(time.monotonic(), force=True)
+
+    def active_sessions(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+unlock_sessions = UnlockSessionStore(DOCUMENT_UNLOCK_TTL_SECONDS, DOCUMENT_UNLOCK_MAX_SESSIONS)
+
+def open_unlock_session(user_id: int, password: str, salt: bytes) -> str:
+    """Run PBKDF2 once and return an unlock token for the batch helpers below."""
+    return unlock_sessions.open(user_id, password, salt)
+
+def encrypt_files_with_unlock_session(unlock_token: str, user_id: int, files: Iterable[bytes]) -> list:
+    """
+    encrypt_files_with_key_wrapping_key() using the key held by an unlock session.
+
+    Raises:
+        ValueError: If the session is invalid or has expired
+    """
+    return encrypt_files_with_key_wrapping_key(files, unlock_sessions.require_key(unlock_token, user_id))
+
+def decrypt_files_with_unlock_session(unlock_token: str, user_id: int, encrypted_files: Iterable[tuple]) -> list:
+    """
+    decrypt_files_with_key_wrapping_key() using the key held by an unlock session.
+
+    Raises:
+        ValueError: If the session is invalid or has expired, or decryption fails
+    """
+    return decrypt_files_with_key_wrapping_key(encrypted_files, unlock_sessions.require_key(unlock_token, user_id))
+
 def generate_user_salt() -> bytes:
     """
     Generate a random salt for a user.
@@ -0,0 +1,129 @@
+"""
+Benchmark: AI chat prompt assembly time vs. number of uploaded documents.
+
+Compares the old serial artifact loop (one GET + decrypt per document) with the
+parallel fetch used by get_user_document_files(). Object storage runs on the
+local filesystem backend with an injected per-request latency to mimic R2.
+
+Usage:
+    python benchmarks/bench_chat_document_fetch.py [--latency-ms 40] [--counts 1,5,15,30] [--rounds 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_TMP_DIR = tempfile.mkdtemp(prefix="rilono-bench-")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_TMP_DIR}/bench.db")
+os.environ["OBJECT_STORAGE_BACKEND"] = "local"
+os.environ["ARTIFACT_CACHE_ENABLED"] = "false"  # measure the storage path, not cache hits
+os.environ["LOCAL_OBJECT_STORAGE_ROOT"] = os.path.join(_TMP_DIR, "objects")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.routers import ai_chat  # noqa: E402
+from app.utils.object_storage import LocalObjectStorage  # noqa: E402
+from app.utils.secure_artifacts import decrypt_artifact_bytes, encrypt_artifact_bytes  # noqa: E402
+
+
+class LatencyObjectStorage(LocalObjectStorage):
+    """Local storage that sleeps on every read to simulate a network round trip."""
+
+    def __init__(self, bucket: str, root: str, latency_seconds: float) -> None:
+        super().__init__(bucket, root)
+        self.latency_seconds = latency_seconds
+
+    def get_bytes(self, key: str) -> bytes:
+        time.sleep(self.latency_seconds)
+        return super().get_bytes(key)
+
+
+def serial_document_files(user_id: int, db) -> list[dict]:
+    """The pre-change implementation: one blocking GET per document."""
+    document_files = []
+    documents = db.query(models.Document).filter(
+        models.Document.user_id == user_id,
+        models.Document.extracted_text_file_url.isnot(None),
+    ).all()
+    for doc in documents:
+        encrypted_blob = ai_chat.document_storage.get_bytes(doc.extracted_text_file_url)
+        content = json.dumps(json.loads(decrypt_artifact_bytes(encrypted_blob).decode("utf-8")), indent=2)
+        document_files.append({
+            "document_type": doc.document_type or "document",
+            "filename": doc.original_filename,
+            "is_valid": doc.is_valid,
+            "validation_message": doc.validation_message,
+            "content": content,
+        })
+    return document_files
+
+
+def seed_user(db, storage, document_count: int) -> int:
+    user = models.User(
+        email=f"bench-{document_count}-{time.time_ns()}@example.edu",
+        hashed_password="x",
+        is_active=True,
+    )
+    db.add(user)
+    db.flush()
+    for index in range(document_count):
+        key = f"user_{user.id}/bench_{index}_extracted.txt"
+        payload = {"Document Validation": "Yes", "Message": "ok", "Index": index, "Notes": "x" * 2000}
+        storage.put_bytes(key, encrypt_artifact_bytes(json.dumps(payload).encode("utf-8")))
+        db.add(models.Document(
+            user_id=user.id,
+            filename=f"bench_{index}.pdf",
+            original_filename=f"bench_{index}.pdf",
+            file_url=f"user_{user.id}/bench_{index}.pdf",
+            file_size=1,
+            file_type="application/pdf",
+            document_type="other",
+            is_valid=True,
+            is_processed=True,
+            extracted_text_file_url=key,
+        ))
+    db.commit()
+    return user.id
+
+
+def time_call(fn, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--counts", default="1,5,15,30")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    storage = LatencyObjectStorage("documents", os.environ["LOCAL_OBJECT_STORAGE_ROOT"], args.latency_ms / 1000)
+    ai_chat.document_storage = storage
+
+    print(f"Simulated storage latency: {args.latency_ms:.0f} ms per GET, median of {args.rounds} rounds")
+    print(f"{'documents':>10} {'serial ms':>12} {'parallel ms':>12} {'speedup':>9}")
+    db = SessionLocal()
+    try:
+        for count in [int(value) for value in args.counts.split(",") if value.strip()]:
+            user_id = seed_user(db, storage, count)
+            serial_ms = time_call(lambda: serial_document_files(user_id, db), args.rounds)
+            parallel_ms = time_call(lambda: ai_chat.get_user_document_files(user_id, db), args.rounds)
+            speedup = serial_ms / parallel_ms if parallel_ms else float("inf")
+            print(f"{count:>10} {serial_ms:>12.1f} {parallel_ms:>12.1f} {speedup:>8.1f}x")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
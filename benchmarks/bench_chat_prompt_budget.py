@@ -0,0 +1,155 @@
+"""
+Benchmark: AI chat prompt size and assembly time vs. number of uploaded documents.
+
+Builds the chat prompt for synthetic users with 5, 20 and 50 document extracts,
+a full profile snapshot and 10 history messages. It compares the previous
+assembly (pretty-printed JSON, everything attached) with build_chat_prompt(),
+which applies the token budget. Gemini latency grows with input tokens, so the
+token estimate is the number that matters for end-to-end chat latency.
+
+Usage:
+    python benchmarks/bench_chat_prompt_budget.py [--counts 5,20,50] [--rounds 20] [--budget 32000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routers import ai_chat  # noqa: E402
+from app.services import chat_context  # noqa: E402
+
+DOCUMENT_TYPES = [
+    "passport", "i20", "bank_statement", "sponsor_letter", "transcript", "degree_certificate",
+    "toefl_score", "gre_score", "admission_letter", "ds160_confirmation", "sevis_fee_receipt",
+    "visa_appointment", "income_tax_return", "loan_sanction_letter", "resume", "photo",
+]
+
+
+def make_extract(index: int, document_type: str) -> str:
+    fields = {
+        "Document Validation": "Yes" if index % 4 else "No",
+        "Message": f"{document_type.replace('_', ' ').title()} looks complete." if index % 4 else "Name does not match passport.",
+        "Name": "Aarav Sharma",
+        "Date of Birth": "2001-04-12",
+        "Issuing Authority": None,
+        "Document Number": f"DOC-{index:05d}",
+        "Issue Date": "2024-01-15",
+        "Expiry Date": None,
+        "Address": "221B MG Road, Bengaluru, Karnataka 560001, India",
+        "Amounts": [{"label": f"Entry {n}", "value": 1000 + n * 37, "currency": "INR", "note": ""} for n in range(12)],
+        "Remarks": "",
+        "Raw Notes": "Scanned copy, all pages legible. " * 6,
+    }
+    return json.dumps(fields)
+
+
+def make_inputs(count: int):
+    document_files = []
+    for index in range(count):
+        document_type = DOCUMENT_TYPES[index % len(DOCUMENT_TYPES)]
+        document_files.append({
+            "document_type": document_type,
+            "filename": f"{document_type}_{index}.pdf",
+            "is_valid": bool(index % 4),
+            "validation_message": None if index % 4 else "Name does not match passport.",
+            "content": make_extract(index, document_type),
+        })
+    profile = {
+        "student_profile": {"full_name": "Aarav Sharma", "email": "aarav@example.edu", "university": "Example State University", "phone": None},
+        "documentation_preferences": {"target_country": "United States", "intake_semester": "Fall", "intake_year": 2027},
+        "visa_journey": {"current_stage": 3, "total_stages": 7, "stage_name": "Financial Documents", "progress_percent": 42},
+        "documents_summary": {
+            "total_documents_uploaded": count,
+            "uploaded_document_types": sorted({doc["document_type"] for doc in document_files}),
+            "documents": [
+                {"type": doc["document_type"], "filename": doc["filename"], "valid": doc["is_valid"], "notes": None}
+                for doc in document_files
+            ],
+        },
+    }
+    history = [
+        {"role": "user" if n % 2 == 0 else "assistant", "content": f"Message {n} about my I-20 and bank statement. " * 8}
+        for n in range(10)
+    ]
+    documents_context = "\n".join(
+        [f"User's Uploaded Documents ({count} total):"]
+        + [f"- {doc['document_type']}: {doc['filename']} [{'Valid' if doc['is_valid'] else 'Needs Review'}]" for doc in document_files]
+    )
+    return json.dumps(profile, indent=2), documents_context, document_files, history
+
+
+def legacy_prompt(message, profile_text, documents_context, guide_text, document_files, history) -> str:
+    """The pre-change assembly: indented JSON, every document, last 10 messages verbatim."""
+    parts = [profile_text, documents_context]
+    for doc in document_files:
+        parts.append(f"--- DOCUMENT: {doc['document_type'].upper()} ({doc['filename']}) ---\n")
+        parts.append(json.dumps(json.loads(doc["content"]), indent=2))
+    parts.append(guide_text)
+    for msg in history[-10:]:
+        parts.append(f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}\n")
+    parts.append(message)
+    return "\n".join(parts)
+
+
+def timed(fn, rounds: int):
+    samples = []
+    result = None
+    for _ in range(rounds):
+        # The per-turn prompt log is noise here.
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = fn()
+            samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", default="5,20,50")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=chat_context.AI_CHAT_PROMPT_TOKEN_BUDGET)
+    args = parser.parse_args()
+    chat_context.AI_CHAT_PROMPT_TOKEN_BUDGET = args.budget
+
+    message = "Is my bank statement enough for the I-20 financial requirement?"
+    guide_text = ai_chat.get_user_navigation_guide_text()
+    print(f"token budget {args.budget}")
+    print(
+        f"{'documents':>10}{'legacy tok':>12}{'legacy ms':>11}{'budget tok':>12}{'budget ms':>11}"
+        f"{'saved':>8}{'attached':>10}{'truncated':>11}{'omitted':>9}"
+    )
+    for count in [int(value) for value in args.counts.split(",") if value.strip()]:
+        profile_text, documents_context, document_files, history = make_inputs(count)
+        legacy, legacy_ms = timed(
+            lambda: legacy_prompt(message, profile_text, documents_context, guide_text, document_files, history),
+            args.rounds,
+        )
+        budgeted, budget_ms = timed(
+            lambda: ai_chat.build_chat_prompt(
+                message, documents_context, profile_text, guide_text, document_files, history
+            ),
+            args.rounds,
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            context = chat_context.assemble_chat_context(
+                message, profile_text, documents_context, guide_text, document_files, history
+            )
+        # The budgeted prompt includes the system prompt instructions; count them for the legacy one too.
+        legacy_tokens = chat_context.estimate_tokens(legacy) + chat_context._SYSTEM_PROMPT_TOKENS
+        budget_tokens = chat_context.estimate_tokens(budgeted)
+        print(
+            f"{count:>10}{legacy_tokens:>12,}{legacy_ms:>11.2f}{budget_tokens:>12,}{budget_ms:>11.2f}"
+            f"{1 - budget_tokens / legacy_tokens:>8.0%}{context.documents_attached:>10}"
+            f"{context.documents_truncated:>11}{context.documents_omitted:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: per-document zero-knowledge crypto latency with and without an
+unlock session.
+
+"before" calls encrypt/decrypt_file_with_user_password for every document, so
+each one pays the 100,000-iteration PBKDF2 derivation. "after" opens one unlock
+session (a single derivation) and then runs the batch helpers against it.
+
+Usage:
+    python benchmarks/bench_document_crypto.py [--documents 10] [--sizes-kb 100,1024]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.security import (  # noqa: E402
+    decrypt_file_with_user_password,
+    decrypt_files_with_unlock_session,
+    encrypt_file_with_user_password,
+    encrypt_files_with_unlock_session,
+    generate_user_salt,
+    open_unlock_session,
+    unlock_sessions,
+)
+
+PASSWORD = "Benchmark-Passw0rd!"
+USER_ID = 1
+
+
+def run_before(files, salt):
+    started = time.perf_counter()
+    encrypted = [encrypt_file_with_user_password(data, PASSWORD, salt) for data in files]
+    encrypt_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for encrypted_data, encrypted_key in encrypted:
+        decrypt_file_with_user_password(encrypted_data, encrypted_key, PASSWORD, salt)
+    return encrypt_seconds, time.perf_counter() - started
+
+
+def run_after(files, salt):
+    started = time.perf_counter()
+    token = open_unlock_session(USER_ID, PASSWORD, salt)
+    unlock_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    encrypted = encrypt_files_with_unlock_session(token, USER_ID, files)
+    encrypt_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decrypt_files_with_unlock_session(token, USER_ID, encrypted)
+    decrypt_seconds = time.perf_counter() - started
+    unlock_sessions.revoke(token)
+    return unlock_seconds, encrypt_seconds, decrypt_seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--sizes-kb", default="100,1024")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    salt = generate_user_salt()
+
+    print(f"Per-document latency over {args.documents} documents, median of {args.repeat} runs (ms)")
+    print(f"{'size':>8}{'before enc':>12}{'before dec':>12}{'unlock':>10}{'after enc':>12}{'after dec':>12}")
+    for size_kb in [int(value) for value in args.sizes_kb.split(",") if value.strip()]:
+        files = [os.urandom(size_kb * 1024) for _ in range(args.documents)]
+        before = [run_before(files, salt) for _ in range(args.repeat)]
+        after = [run_after(files, salt) for _ in range(args.repeat)]
+        per_doc = lambda runs, index: statistics.median(run[index] for run in runs) * 1000 / args.documents
+        unlock_ms = statistics.median(run[0] for run in after) * 1000
+        print(
+            f"{size_kb:>6}KB"
+            f"{per_doc(before, 0):>12.2f}{per_doc(before, 1):>12.2f}"
+            f"{unlock_ms:>10.2f}{per_doc(after, 1):>12.2f}{per_doc(after, 2):>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: local pre-validation latency and the share of uploads that skip Gemini.
+
+Builds a mixed batch of uploads: valid scans, photos and PDFs plus the usual
+mistakes (empty files, renamed files, truncated images and PDFs, .txt or .docx
+for a passport, a PDF for the 2x2 photograph, a thumbnail-sized photo). Each
+upload is run through prevalidate_document() with the catalog's default rules.
+
+Gemini is not called. Time saved is modelled as --gemini-ms for every upload
+that pre-validation rejects or flags.
+
+Usage:
+    python benchmarks/bench_document_prevalidation.py [--rounds 50] [--gemini-ms 6000]
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from app.document_catalog import DEFAULT_PREVALIDATION_RULES  # noqa: E402
+from app.services.document_prevalidation import (  # noqa: E402
+    PREVALIDATION_PASS,
+    get_prevalidation_stats,
+    prevalidate_document,
+)
+
+
+def _image_bytes(width: int, height: int, fmt: str) -> bytes:
+    image = Image.effect_noise((width, height), 40).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=88)
+    return buffer.getvalue()
+
+
+def _pdf_bytes(pages: int, with_text: bool) -> bytes:
+    rng = random.Random(pages)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + index} 0 R" for index in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    resources = b"<< /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >>" if with_text else b"<< >>"
+    for _ in range(pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources " + resources + b" >>")
+    body = b"%PDF-1.7\n"
+    for number, obj in enumerate(objects, start=1):
+        body += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    # Padding stands in for page content streams.
+    body += bytes(rng.getrandbits(8) for _ in range(200_000))
+    return body + b"\ntrailer\n<< /Root 1 0 R >>\n%%EOF\n"
+
+
+def sample_uploads() -> list[tuple[str, bytes, str, str]]:
+    photo = _image_bytes(3024, 4032, "JPEG")
+    scan_pdf = _pdf_bytes(3, with_text=True)
+    return [
+        ("passport photo jpg", photo, "passport.jpg", "passport"),
+        ("passport pdf", scan_pdf, "passport.pdf", "passport"),
+        ("bank statement pdf (12 pages)", _pdf_bytes(12, with_text=True), "statement.pdf", "bank-statement"),
+        ("2x2 photo png", _image_bytes(600, 600, "PNG"), "photo.png", "photograph-2x2"),
+        ("resume txt", b"Jane Doe\nSoftware Engineer\n" * 40, "resume.txt", "resume"),
+        ("empty pdf", b"", "i20.pdf", "form-i20-signed"),
+        ("docx renamed to pdf", b"PK\x03\x04" + bytes(4000), "passport.pdf", "passport"),
+        ("truncated jpg", photo[: len(photo) // 3], "visa.jpg", "stamped-f1-visa"),
+        ("truncated pdf", scan_pdf[:-2000], "ds160.pdf", "ds-160-application"),
+        ("passport as txt", b"Passport No: X1234567", "passport.txt", "passport"),
+        ("passport as docx", b"PK\x03\x04" + bytes(4000), "passport.docx", "passport"),
+        ("2x2 photo as pdf", scan_pdf, "photo.pdf", "photograph-2x2"),
+        ("thumbnail jpg", _image_bytes(160, 120, "JPEG"), "i20.jpg", "form-i20-signed"),
+        ("sevis receipt (30 pages)", _pdf_bytes(30, with_text=True), "sevis.pdf", "i901-sevis-fee-confirmation"),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--gemini-ms", type=float, default=6000.0, help="Modelled Gemini validation latency")
+    args = parser.parse_args()
+
+    uploads = sample_uploads()
+    print(f"{'upload':<32}{'KB':>8}{'outcome':>9}  {'reason':<24}{'p50 ms':>8}{'max ms':>8}")
+    skipped = 0
+    for name, contents, filename, document_type in uploads:
+        rules = DEFAULT_PREVALIDATION_RULES.get(document_type)
+        samples = []
+        result = None
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            result = prevalidate_document(contents, filename, document_type, rules)
+            samples.append((time.perf_counter() - started) * 1000)
+        if result.outcome != PREVALIDATION_PASS:
+            skipped += 1
+        print(
+            f"{name:<32}{len(contents) / 1024:>8,.0f}{result.outcome:>9}  {result.reason:<24}"
+            f"{statistics.median(samples):>8.2f}{max(samples):>8.2f}"
+        )
+
+    stats = get_prevalidation_stats()
+    print(
+        f"\nskip rate {skipped}/{len(uploads)} = {skipped / len(uploads):.0%}; "
+        f"avg check {stats['avg_ms']} ms; "
+        f"modelled Gemini time saved {skipped * args.gemini_ms / 1000:,.0f}s per batch"
+    )
+
+
+if __name__ == "__main__":
+    main()
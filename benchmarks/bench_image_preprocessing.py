@@ -0,0 +1,152 @@
+"""
+Benchmark: bytes sent to Gemini and modelled validation latency for uploaded images.
+
+Generates sample document images: a 12 MP phone photo of a passport page
+(EXIF-rotated), an RGBA screenshot, an A4 300 dpi greyscale scan and a small
+JPEG. It compares the previous path (full-resolution JPEG re-encode) with
+prepare_image_for_gemini().
+
+Gemini is not called. End-to-end latency is modelled as pre-processing time
+plus upload time at --uplink-mbps plus image tokens at --ms-per-1k-tokens.
+Image tokens are counted as 258 per 768x768 tile. Pass --live to also time
+real validate_and_extract_document() calls when Gemini is configured.
+
+Usage:
+    python benchmarks/bench_image_preprocessing.py [--uplink-mbps 20] [--ms-per-1k-tokens 400] [--rounds 3] [--live]
+"""
+import argparse
+import io
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.utils.image_preprocessing import prepare_image_for_gemini  # noqa: E402
+
+TOKENS_PER_TILE = 258
+TILE_SIZE = 768
+
+
+def _document_canvas(width: int, height: int, mode: str, background) -> Image.Image:
+    image = Image.new(mode, (width, height), background)
+    draw = ImageDraw.Draw(image)
+    rng = random.Random(width * height)
+    line_height = max(12, height // 60)
+    for row in range(line_height * 2, height - line_height * 2, line_height * 2):
+        x = width // 12
+        while x < width - width // 12:
+            word = rng.randint(width // 80, width // 20)
+            draw.rectangle([x, row, x + word, row + line_height], fill=0 if mode == "L" else (20, 20, 40, 255)[: len(mode)])
+            x += word + line_height
+    return image
+
+
+def sample_images() -> list[tuple[str, bytes]]:
+    samples = []
+
+    photo = _document_canvas(4032, 3024, "RGB", (236, 228, 210))
+    noise = Image.effect_noise((4032, 3024), 24).convert("RGB")
+    photo = Image.blend(photo, noise, 0.15)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees, as phones store portrait shots
+    buffer = io.BytesIO()
+    photo.save(buffer, format="JPEG", quality=92, exif=exif)
+    samples.append(("phone photo 4032x3024 jpg", buffer.getvalue()))
+
+    screenshot = _document_canvas(1600, 2400, "RGBA", (255, 255, 255, 0))
+    buffer = io.BytesIO()
+    screenshot.save(buffer, format="PNG")
+    samples.append(("rgba screenshot png", buffer.getvalue()))
+
+    scan = _document_canvas(2480, 3508, "L", 250)
+    buffer = io.BytesIO()
+    scan.save(buffer, format="PNG")
+    samples.append(("a4 300dpi scan png", buffer.getvalue()))
+
+    small = _document_canvas(1000, 700, "RGB", (255, 255, 255))
+    buffer = io.BytesIO()
+    small.save(buffer, format="JPEG", quality=85)
+    samples.append(("small jpg 1000x700", buffer.getvalue()))
+    return samples
+
+
+def legacy_payload(file_contents: bytes) -> tuple[bytes, int, int]:
+    """The pre-change Vertex path: open and re-encode at full resolution as JPEG."""
+    image = Image.open(io.BytesIO(file_contents))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue(), image.width, image.height
+
+
+def image_tokens(width: int, height: int) -> int:
+    if width <= 384 and height <= 384:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE) * TOKENS_PER_TILE
+
+
+def modelled_ms(prep_ms: float, size: int, tokens: int, uplink_mbps: float, ms_per_1k_tokens: float) -> float:
+    return prep_ms + size * 8 / (uplink_mbps * 1000) + tokens / 1000 * ms_per_1k_tokens
+
+
+def timed(fn, rounds: int):
+    samples = []
+    result = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=400.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="Also time real Gemini validation calls")
+    args = parser.parse_args()
+
+    print(
+        f"{'image':<28}{'upload KB':>10}{'legacy KB':>10}{'legacy ms':>11}{'sent KB':>9}{'format':>12}"
+        f"{'prep ms':>9}{'tokens':>12}{'e2e ms':>16}"
+    )
+    for name, contents in sample_images():
+        try:
+            (legacy, legacy_w, legacy_h), legacy_prep = timed(lambda: legacy_payload(contents), args.rounds)
+            legacy_kb = f"{len(legacy) / 1024:,.0f}"
+            legacy_e2e = modelled_ms(
+                legacy_prep, len(legacy), image_tokens(legacy_w, legacy_h), args.uplink_mbps, args.ms_per_1k_tokens
+            )
+            legacy_tokens = image_tokens(legacy_w, legacy_h)
+        except OSError:
+            legacy_kb, legacy_e2e, legacy_tokens = "fails", None, None
+        prepared, prep_ms = timed(lambda: prepare_image_for_gemini(contents), args.rounds)
+        tokens = image_tokens(prepared.width, prepared.height)
+        e2e = modelled_ms(prep_ms, len(prepared.data), tokens, args.uplink_mbps, args.ms_per_1k_tokens)
+        print(
+            f"{name:<28}{len(contents) / 1024:>10,.0f}{legacy_kb:>10}"
+            f"{(f'{legacy_e2e:,.0f}' if legacy_e2e is not None else '-'):>11}"
+            f"{len(prepared.data) / 1024:>9,.0f}{prepared.mime_type.split('/')[1]:>12}{prep_ms:>9.0f}"
+            f"{(f'{legacy_tokens}->{tokens}' if legacy_tokens else str(tokens)):>12}{e2e:>16,.0f}"
+        )
+
+        if args.live:
+            from app.utils.gemini_service import gemini_client, validate_and_extract_document
+
+            if not gemini_client.is_configured():
+                print("  (--live skipped: Gemini is not configured)")
+                continue
+            started = time.perf_counter()
+            result = validate_and_extract_document(contents, "sample.jpg", "image/jpeg", "passport")
+            print(f"  live validation: {(time.perf_counter() - started) * 1000:,.0f} ms, result={bool(result)}")
+
+
+if __name__ == "__main__":
+    main()
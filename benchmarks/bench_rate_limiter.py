@@ -0,0 +1,111 @@
+"""
+Benchmark: in-process rate limiter throughput under thread contention and
+memory per distinct key.
+
+Compares the previous implementation (a deque of timestamps per key behind one
+global lock, never evicted) with the sharded sliding-window counter and GCRA
+strategies of InMemoryRateLimiter.
+
+Usage:
+    python benchmarks/bench_rate_limiter.py [--threads 1,4,16] [--ops 200000] [--keys 1000000]
+"""
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.rate_limiter import InMemoryRateLimiter  # noqa: E402
+
+
+class DequeRateLimiter:
+    """The pre-change implementation: every event timestamp per key, one global lock."""
+
+    def __init__(self) -> None:
+        self._events = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def allow(self, key: str, limit: int, window_seconds: int):
+        now = time.time()
+        cutoff = now - window_seconds
+        with self._lock:
+            events = self._events[key]
+            while events and events[0] <= cutoff:
+                events.popleft()
+            if len(events) >= limit:
+                return False, int(max(1, window_seconds - (now - events[0])))
+            events.append(now)
+            return True, 0
+
+
+LIMITERS = {
+    "deque (before)": DequeRateLimiter,
+    "sliding_window": lambda: InMemoryRateLimiter(strategy="sliding_window"),
+    "gcra": lambda: InMemoryRateLimiter(strategy="gcra"),
+}
+
+
+def measure_throughput(factory, threads: int, total_ops: int, hot_keys: int) -> float:
+    limiter = factory()
+    keys = [f"login:10.0.{i // 256}.{i % 256}" for i in range(hot_keys)]
+    per_thread = total_ops // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset: int) -> None:
+        barrier.wait()
+        for i in range(per_thread):
+            limiter.allow(keys[(offset + i) % hot_keys], 12, 300)
+
+    workers = [threading.Thread(target=worker, args=(n * 7919,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return (per_thread * threads) / (time.perf_counter() - started)
+
+
+def measure_memory(factory, key_count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    limiter = factory()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(key_count):
+        limiter.allow(f"register:{i}:user{i}@example.edu", 5, 900)
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del limiter
+    gc.collect()
+    return used
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", default="1,4,16")
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--hot-keys", type=int, default=10_000)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    args = parser.parse_args()
+    thread_counts = [int(value) for value in args.threads.split(",") if value.strip()]
+
+    print(f"Throughput ({args.ops} checks over {args.hot_keys} keys), ops/sec")
+    print(f"{'limiter':<16}" + "".join(f"{f'{n} thr':>14}" for n in thread_counts))
+    for name, factory in LIMITERS.items():
+        row = [measure_throughput(factory, n, args.ops, args.hot_keys) for n in thread_counts]
+        print(f"{name:<16}" + "".join(f"{value:>14,.0f}" for value in row))
+
+    print(f"\nMemory for {args.keys:,} distinct keys (keys themselves included)")
+    for name, factory in LIMITERS.items():
+        used = measure_memory(factory, args.keys)
+        print(f"{name:<16}{used / (1024 * 1024):>10.1f} MB{used / args.keys:>10.0f} B/key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark: Redis rate limiter correctness and per-check latency.
+
+Runs RedisRateLimiter in both modes: the Lua script (EVALSHA) and the
+MULTI/EXEC pipeline used when RATE_LIMIT_REDIS_USE_LUA=false. Each mode is
+checked for:
+- the limit and Retry-After
+- bucket TTL and window expiry, using a fake clock
+- reloading the script after SCRIPT FLUSH (NOSCRIPT)
+- failing open to the in-process limiter when the server is unreachable
+
+It then reports checks/sec. Uses an embedded fakeredis server by default, or a
+real server with --url. SCRIPT FLUSH affects the whole server, so do not point
+--url at a shared instance.
+
+Requires: pip install redis "fakeredis[lua]"
+
+Usage:
+    python benchmarks/bench_redis_rate_limiter.py [--url redis://localhost:6379/15] [--ops 20000]
+"""
+import argparse
+import os
+import sys
+import time
+import types
+import uuid
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.utils import rate_limiter  # noqa: E402
+from app.utils.rate_limiter import RedisRateLimiter  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the time module inside rate_limiter so windows can be advanced."""
+
+    def __init__(self, start: float) -> None:
+        self.now = start
+
+    def install(self):
+        original = rate_limiter.time
+        rate_limiter.time = types.SimpleNamespace(time=lambda: self.now)
+        return original
+
+
+def make_client(url: str):
+    if url:
+        return redis.Redis.from_url(url)
+    import fakeredis
+
+    return fakeredis.FakeRedis()
+
+
+def check_mode(client, use_lua: bool) -> None:
+    mode = "lua" if use_lua else "multi"
+    prefix = f"bench:{uuid.uuid4().hex[:8]}"
+    limiter = RedisRateLimiter(client, prefix=prefix, use_lua=use_lua)
+    # Start 20 seconds into a 60-second window.
+    clock = FakeClock(1_000_000_040.0)
+    original_time = clock.install()
+    try:
+        results = [limiter.allow("login:10.0.0.1", limit=5, window_seconds=60) for _ in range(7)]
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False] * 2, results
+        assert results[5][1] == 40, results[5]
+
+        window_start = int(clock.now) - int(clock.now) % 60
+        bucket_key = f"{prefix}:login:10.0.0.1:{window_start}"
+        assert int(client.get(bucket_key)) == 6, client.get(bucket_key)
+        assert 60 < client.ttl(bucket_key) <= 120, client.ttl(bucket_key)
+
+        clock.now += 60
+        assert limiter.allow("login:10.0.0.1", limit=5, window_seconds=60) == (True, 0)
+        assert limiter.allow("login:10.0.0.2", limit=5, window_seconds=60) == (True, 0)
+
+        if use_lua:
+            client.script_flush()
+            for _ in range(4):
+                assert limiter.allow("login:10.0.0.1", limit=5, window_seconds=60) == (True, 0)
+            assert limiter.allow("login:10.0.0.1", limit=5, window_seconds=60)[0] is False
+    finally:
+        rate_limiter.time = original_time
+        for key in client.scan_iter(f"{prefix}:*"):
+            client.delete(key)
+    print(f"{mode:<6} limit, window expiry{', NOSCRIPT reload' if use_lua else ''}: ok")
+
+
+def check_fail_open(use_lua: bool) -> None:
+    # Nothing listens on port 1; every command raises ConnectionError. Built like
+    # _build_redis_rate_limiter() so retry behaviour matches production.
+    pool = redis.ConnectionPool.from_url("redis://127.0.0.1:1/0", socket_timeout=0.2, socket_connect_timeout=0.2)
+    unreachable = redis.Redis(connection_pool=pool)
+    original = rate_limiter.redis_rate_limiter
+    rate_limiter.redis_rate_limiter = RedisRateLimiter(unreachable, use_lua=use_lua)
+    scope = f"bench-fail-open-{uuid.uuid4().hex[:8]}"
+    request = Request({"type": "http", "client": ("203.0.113.7", 50000), "headers": []})
+    try:
+        started = time.perf_counter()
+        results = [rate_limiter.check_ip_rate_limit(request, scope, limit=3, window_seconds=3600) for _ in range(4)]
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(results)
+    finally:
+        rate_limiter.redis_rate_limiter = original
+    # The in-process limiter still enforces the limit while Redis is down.
+    assert [allowed for allowed, _ in results] == [True, True, True, False], results
+    print(f"{'lua' if use_lua else 'multi':<6} fail-open to in-process limiter: ok ({elapsed_ms:.1f} ms per check)")
+
+
+def measure(client, use_lua: bool, ops: int) -> float:
+    prefix = f"bench:{uuid.uuid4().hex[:8]}"
+    limiter = RedisRateLimiter(client, prefix=prefix, use_lua=use_lua)
+    keys = [f"api:10.1.{i // 256}.{i % 256}" for i in range(1000)]
+    started = time.perf_counter()
+    for index in range(ops):
+        limiter.allow(keys[index % len(keys)], limit=1_000_000, window_seconds=60)
+    elapsed = time.perf_counter() - started
+    for key in client.scan_iter(f"{prefix}:*"):
+        client.delete(key)
+    return ops / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="Redis URL; defaults to an embedded fakeredis server")
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    client = make_client(args.url)
+    for use_lua in (True, False):
+        check_mode(client, use_lua)
+        check_fail_open(use_lua)
+
+    print(f"\n{'mode':<8}{'checks/sec':>12}")
+    for use_lua in (True, False):
+        print(f"{'lua' if use_lua else 'multi':<8}{measure(client, use_lua, args.ops):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
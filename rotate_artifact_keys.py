@@ -0,0 +1,73 @@
+"""
+Re-encrypt server artifacts under the current artifact key.
+
+Extracted-document artifacts in the documents bucket and student profile
+snapshots in the database are rewritten in the V2 format under
+ARTIFACT_ENCRYPTION_KEY (or SECRET_KEY). Payloads sealed with a previous key
+are read through ARTIFACT_ENCRYPTION_OLD_KEYS (comma separated), and legacy
+plaintext artifacts are encrypted. Uploaded documents are zero-knowledge and
+are only counted.
+
+To rotate: set the new key as ARTIFACT_ENCRYPTION_KEY, put the old one in
+ARTIFACT_ENCRYPTION_OLD_KEYS, deploy, run this script until it reports no
+failures, then drop the old key.
+
+Usage:
+    python rotate_artifact_keys.py [--dry-run] [--concurrency 8] [--checkpoint artifact_rotation.checkpoint]
+                                   [--prefix user_] [--limit-prefixes N] [--skip-db] [--reset]
+"""
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.database import SessionLocal  # noqa: E402
+from app.services.artifact_rotation import USER_PREFIX, ArtifactRotationJob  # noqa: E402
+from app.utils.object_storage import get_document_storage  # noqa: E402
+from app.utils.secure_artifacts import get_artifact_keyring  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    parser.add_argument("--concurrency", type=int, default=8, help="User prefixes processed in parallel")
+    parser.add_argument("--checkpoint", default="artifact_rotation.checkpoint", help="Progress file for resuming")
+    parser.add_argument("--prefix", default=USER_PREFIX, help="Only prefixes starting with this")
+    parser.add_argument("--limit-prefixes", type=int, default=None, help="Stop after this many prefixes")
+    parser.add_argument("--skip-db", action="store_true", help="Do not rotate student profile snapshots")
+    parser.add_argument("--reset", action="store_true", help="Ignore and remove an existing checkpoint")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    keyring = get_artifact_keyring()
+    job = ArtifactRotationJob(
+        get_document_storage(),
+        keyring,
+        checkpoint_path=args.checkpoint,
+        concurrency=args.concurrency,
+        dry_run=args.dry_run,
+        prefix=args.prefix,
+        limit_prefixes=args.limit_prefixes,
+    )
+    print(f"Rotating artifacts to key {keyring.current_key_id.decode()}{' (dry run)' if args.dry_run else ''}...")
+    if job.checkpoint.completed:
+        print(f"Resuming: {len(job.checkpoint.completed)} prefixes already done")
+
+    stats = job.run(session_factory=None if args.skip_db else SessionLocal)
+    print(json.dumps(stats.summary(), indent=2))
+    for key, error in stats.failures[:20]:
+        print(f"✗ {key}: {error}")
+    if len(stats.failures) > 20:
+        print(f"... and {len(stats.failures) - 20} more failures")
+    if stats.failures:
+        raise SystemExit(1)
+    print("✓ Rotation complete" if not args.dry_run else "✓ Dry run complete")
+
+
+if __name__ == "__main__":
+    main()
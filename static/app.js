@@ -14,6 +14,9 @@ let visaInterviewFiltersInitialized = false;
 let documentUploadInProgress = false;
 let documentUploadStatusTimer = null;
 let documentUploadScanStartedAt = 0;
+// Short-lived server-side document unlock session (see /api/documents/unlock).
+let documentUnlockToken = null;
+let documentUnlockExpiresAt = 0;
 let proUpgradeInFlight = false;
 let checkoutLaunchResolver = null;
 let currentVisaSubTab = 'prep';
@@ -57,6 +60,8 @@ let rilonoReelInitialized = false;
 const DOCUMENT_UPLOAD_ENCRYPTING_MS = 1200;
 const DOCUMENT_UPLOAD_UPLOADING_MS = 700;
 const DOCUMENT_UPLOAD_MIN_SCAN_MS = 8000;
+const DOCUMENT_VALIDATION_POLL_MS = 2000;
+const DOCUMENT_VALIDATION_POLL_TIMEOUT_MS = 180000;
 
 const PRICING_BASE_USD = {
     free: 0
@@ -5609,6 +5614,7 @@ async function logout() {
     }).catch(() => null);
     authToken = null;
     persistAuthToken(null);
+    clearDocumentUnlockSession();
     currentUser = null;
     currentSubscription = null;
     runtimeSubscriptionNotifyState = null;
@@ -7463,28 +7469,6 @@ async function jumpToDocumentInDocumentsTab(documentId, encodedDocumentType = ''
     setTimeout(() => target.classList.remove('document-focus-highlight'), 2200);
 }
 
-async function saveVisaStatusToR2() {
-    if (!authToken) return;
-
-    try {
-        // Use POST /refresh endpoint to actually write to R2
-        // GET /visa-status only reads (doesn't write)
-        const response = await fetch(`${API_BASE}/api/documents/visa-status/refresh`, {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${authToken}`
-            }
-        });
-
-        if (response.ok) {
-            const data = await response.json();
-            console.log('Visa status saved to R2:', data.r2_key);
-        }
-    } catch (error) {
-        console.error('Failed to save visa status to R2:', error);
-    }
-}
-
 function calculateProfileCompletion(profile, documents) {
     // Profile fields to check
     const profileFields = {
@@ -8078,9 +8062,6 @@ async function handleUpdateProfile(e) {
             renderUserInfo(currentUser);
             // Reload profile display if on dashboard
             displayProfile(data);
-
-            // Update R2 with new profile data
-            await saveVisaStatusToR2();
         } else {
             let errorMessage = 'Failed to update profile';
             if (data.detail) {
@@ -8604,9 +8585,6 @@ async function handleDocumentationForm(e) {
             localStorage.setItem('documentationPreferences', JSON.stringify(preferences));
 
             showMessage(`Preferences saved: ${intake} ${year}`, 'success');
-
-            // Refresh the R2 student profile file
-            await saveVisaStatusToR2();
         } else {
             const data = await response.json();
             showMessage(data.detail || 'Failed to save preferences', 'error');
@@ -8617,6 +8595,39 @@ async function handleDocumentationForm(e) {
     }
 }
 
+function isDocumentValidationInFlight(status) {
+    return status === 'pending' || status === 'processing';
+}
+
+async function waitForDocumentValidation(documentId, initialValidation) {
+    const deadline = Date.now() + DOCUMENT_VALIDATION_POLL_TIMEOUT_MS;
+    while (Date.now() < deadline) {
+        await new Promise((resolve) => setTimeout(resolve, DOCUMENT_VALIDATION_POLL_MS));
+        try {
+            const response = await fetch(`${API_BASE}/api/documents/${documentId}/validation-status`, {
+                headers: {
+                    'Authorization': `Bearer ${authToken}`
+                }
+            });
+            if (!response.ok) {
+                continue;
+            }
+            const statusData = await response.json();
+            if (!isDocumentValidationInFlight(statusData.validation_status)) {
+                return {
+                    is_valid: statusData.is_valid,
+                    status: statusData.validation_status,
+                    message: statusData.message,
+                    details: statusData.details
+                };
+            }
+        } catch (error) {
+            console.error('Document validation status error:', error);
+        }
+    }
+    return null;
+}
+
 async function handleDocumentUpload(e) {
     e.preventDefault();
     if (documentUploadInProgress) {
@@ -8668,6 +8679,8 @@ async function handleDocumentUpload(e) {
         const formData = new FormData();
         formData.append('file', file);
         formData.append('password', password);  // Required for Zero-Knowledge encryption
+        const unlockToken = getDocumentUnlockToken();
+        if (unlockToken) formData.append('unlock_token', unlockToken);  // Skips server-side key derivation
         formData.append('document_type', documentType);  // Required field
         if (country) formData.append('country', country);
         if (intake) formData.append('intake', intake);
@@ -8687,6 +8700,9 @@ async function handleDocumentUpload(e) {
         setDocumentUploadLoading(true, 'Rilono AI is scanning and validating...');
         const response = await uploadRequest;
         const data = await response.json();
+        if (response.ok && data.validation && isDocumentValidationInFlight(data.validation.status) && data.document) {
+            data.validation = await waitForDocumentValidation(data.document.id, data.validation);
+        }
         if (documentUploadScanStartedAt > 0) {
             const scanElapsed = Date.now() - documentUploadScanStartedAt;
             if (scanElapsed < DOCUMENT_UPLOAD_MIN_SCAN_MS) {
@@ -8749,8 +8765,6 @@ async function handleDocumentUpload(e) {
             await loadMyDocuments(true, 'Refreshing your uploaded documents...');
             setDocumentUploadLoading(false, 'Document is now visible in your list.');
 
-            // Refresh visa status after document upload
-            await saveVisaStatusToR2();
             await loadDashboardStats(); // Refresh the journey tracker
             void loadSubscriptionStatus(true);
         } else {
@@ -9253,22 +9267,64 @@ function displayDocuments(documents) {
     container.innerHTML = `${summaryLine}${cardsHtml}`;
 }
 
+function getDocumentUnlockToken() {
+    if (documentUnlockToken && Date.now() < documentUnlockExpiresAt) {
+        return documentUnlockToken;
+    }
+    clearDocumentUnlockSession();
+    return null;
+}
+
+function clearDocumentUnlockSession() {
+    documentUnlockToken = null;
+    documentUnlockExpiresAt = 0;
+}
+
+async function openDocumentUnlockSession(password) {
+    const formData = new FormData();
+    formData.append('password', password);
+    const response = await fetch(`${API_BASE}/api/documents/unlock`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${authToken}`
+        },
+        body: formData
+    });
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+        throw new Error(data.detail || 'Failed to unlock documents');
+    }
+    documentUnlockToken = data.unlock_token;
+    // Renew a little early so requests never race the server-side expiry.
+    documentUnlockExpiresAt = Date.now() + Math.max(0, data.expires_in - 30) * 1000;
+    return documentUnlockToken;
+}
+
 async function downloadEncryptedDocument(documentId) {
     if (!authToken) {
         showMessage('Please login to download documents', 'error');
         return;
     }
 
-    const password = prompt('Enter your password to decrypt and download this document:');
-    if (!password) {
-        return; // User cancelled
+    let unlockToken = getDocumentUnlockToken();
+    if (!unlockToken) {
+        const password = prompt('Enter your password to decrypt and download this document:');
+        if (!password) {
+            return; // User cancelled
+        }
+        try {
+            unlockToken = await openDocumentUnlockSession(password);
+        } catch (error) {
+            showMessage(error.message, 'error');
+            return;
+        }
     }
 
     try {
         showMessage('Decrypting document...', 'success');
 
         const formData = new FormData();
-        formData.append('password', password);
+        formData.append('unlock_token', unlockToken);
 
         const response = await fetch(`${API_BASE}/api/documents/${documentId}/download`, {
             method: 'POST',
@@ -9277,6 +9333,10 @@ async function downloadEncryptedDocument(documentId) {
             },
             body: formData
         });
+        if (response.status === 401) {
+            // Session expired or was revoked (e.g. password change); ask again next time.
+            clearDocumentUnlockSession();
+        }
 
         if (response.ok) {
             // Get the file blob
@@ -9344,8 +9404,6 @@ async function deleteDocument(documentId, filename) {
             // Reload documents list
             await loadMyDocuments();
 
-            // Refresh visa status after document deletion
-            await saveVisaStatusToR2();
             await loadDashboardStats();
         } else {
             const error = await response.json().catch(() => ({}));
@@ -9460,7 +9518,8 @@ function sendQuickMessage(message, triggerElement = null) {
 
 function addMessageToRilonoAiChat(message, isUser = false) {
     const messagesContainers = getMainChatContainers();
-    if (messagesContainers.length === 0) return;
+    const contentElements = [];
+    if (messagesContainers.length === 0) return contentElements;
 
     messagesContainers.forEach((messagesContainer) => {
         const messageDiv = document.createElement('div');
@@ -9485,7 +9544,64 @@ function addMessageToRilonoAiChat(message, isUser = false) {
 
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        if (!isUser) {
+            contentElements.push(messageDiv.querySelector('.ai-response-content'));
+        }
     });
+    return contentElements;
+}
+
+function updateRilonoAiStreamingMessage(contentElements, message) {
+    contentElements.forEach((contentElement) => {
+        contentElement.innerHTML = markdownToHtml(message);
+        const messagesContainer = contentElement.closest('.rilono-ai-messages');
+        if (messagesContainer) {
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    });
+}
+
+// Reads a Server-Sent Events response from /api/ai-chat/chat/stream.
+// Calls onToken with the accumulated text and resolves with the final response.
+async function readRilonoAiChatStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach((line) => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) continue;  // keep-alive comment
+
+            const payload = JSON.parse(data);
+            if (eventName === 'token') {
+                text += payload.text;
+                onToken(text);
+            } else if (eventName === 'done') {
+                return payload.response ?? text;
+            } else if (eventName === 'error') {
+                throw new Error(payload.detail || 'Failed to get response from Rilono AI');
+            }
+        }
+    }
+    throw new Error('The response stream ended unexpectedly');
 }
 
 function showRilonoAiTypingIndicator() {
@@ -9550,9 +9666,10 @@ async function handleRilonoAiChatSubmit(e) {
     // Show typing indicator
     showRilonoAiTypingIndicator();
 
+    let streamingElements = null;
     try {
-        // Call the AI chat API
-        const response = await fetch(`${API_BASE}/api/ai-chat/chat`, {
+        // Call the streaming AI chat API
+        const response = await fetch(`${API_BASE}/api/ai-chat/chat/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -9565,11 +9682,16 @@ async function handleRilonoAiChatSubmit(e) {
             })
         });
 
-        removeRilonoAiTypingIndicator();
-
         if (response.ok) {
-            const data = await response.json();
-            const aiResponse = data.response;
+            // Keep the typing indicator until the first token arrives, then render as it streams
+            const aiResponse = await readRilonoAiChatStream(response, (partialText) => {
+                if (!streamingElements) {
+                    removeRilonoAiTypingIndicator();
+                    streamingElements = addMessageToRilonoAiChat('', false);
+                }
+                updateRilonoAiStreamingMessage(streamingElements, partialText);
+            });
+            removeRilonoAiTypingIndicator();
 
             // Add AI response to shared conversation history
             rilonoAiConversationHistory.push({
@@ -9583,10 +9705,15 @@ async function handleRilonoAiChatSubmit(e) {
             }
 
             // Add to both chats
-            addMessageToRilonoAiChat(aiResponse, false);
+            if (streamingElements) {
+                updateRilonoAiStreamingMessage(streamingElements, aiResponse);
+            } else {
+                addMessageToRilonoAiChat(aiResponse, false);
+            }
             addMessageToFloatingChat(aiResponse, false);
             void loadSubscriptionStatus(true);
         } else {
+            removeRilonoAiTypingIndicator();
             const errorData = await response.json();
             const errorMsg = errorData.detail || 'Failed to get response from Rilono AI';
             addMessageToRilonoAiChat(`Sorry, I encountered an error: ${errorMsg}. Please try again.`, false);
@@ -9597,7 +9724,12 @@ async function handleRilonoAiChatSubmit(e) {
     } catch (error) {
         removeRilonoAiTypingIndicator();
         console.error('Rilono AI chat error:', error);
-        addMessageToRilonoAiChat('Sorry, I encountered an error. Please try again later.', false);
+        const errorMsg = 'Sorry, I encountered an error. Please try again later.';
+        if (streamingElements) {
+            updateRilonoAiStreamingMessage(streamingElements, errorMsg);
+        } else {
+            addMessageToRilonoAiChat(errorMsg, false);
+        }
     }
 }
 
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Settings the app reads at import time; tests never touch a real database or bucket.
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='rilono-tests-'), 'test.db')}")
+os.environ.setdefault("DAILY_AI_NOTIFIER_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+"""RedisRateLimiter against an embedded fakeredis server (pip install -r requirements-dev.txt)."""
+import types
+import uuid
+
+import pytest
+from starlette.requests import Request
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.utils import rate_limiter  # noqa: E402
+from app.utils.rate_limiter import InMemoryRateLimiter, RedisRateLimiter  # noqa: E402
+
+# 20 seconds into a 60-second window.
+START = 1_000_000_040.0
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock(START)
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(time=fake.time))
+    return fake
+
+
+def _build_fake_limiter(monkeypatch, use_lua: bool) -> RedisRateLimiter:
+    """Built the way the app builds it, from RATE_LIMIT_REDIS_URL=fakeredis://."""
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_BACKEND", "redis")
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_REDIS_URL", "fakeredis://")
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_REDIS_USE_LUA", use_lua)
+    monkeypatch.setattr(rate_limiter, "RATE_LIMIT_REDIS_PREFIX", f"test:{uuid.uuid4().hex}")
+    built = rate_limiter._build_redis_rate_limiter()
+    assert isinstance(built, RedisRateLimiter)
+    assert (built._increment is not None) is use_lua
+    return built
+
+
+@pytest.fixture(params=[True, False], ids=["lua", "multi"])
+def limiter(request, monkeypatch):
+    return _build_fake_limiter(monkeypatch, use_lua=request.param)
+
+
+def _bucket_key(limiter: RedisRateLimiter, key: str, now: float, window_seconds: int) -> str:
+    window_start = int(now) - int(now) % window_seconds
+    return f"{limiter._prefix}:{key}:{window_start}"
+
+
+def test_enforces_limit_with_retry_after(limiter, clock):
+    results = [limiter.allow("login:10.0.0.1", limit=5, window_seconds=60) for _ in range(7)]
+
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False] * 2
+    assert results[5] == (False, 40)
+    assert limiter.allow("login:10.0.0.2", limit=5, window_seconds=60) == (True, 0)
+
+
+def test_bucket_expires_after_window(limiter, clock):
+    limiter.allow("login:10.0.0.1", limit=5, window_seconds=60)
+
+    bucket = _bucket_key(limiter, "login:10.0.0.1", clock.now, 60)
+    assert int(limiter._client.get(bucket)) == 1
+    # Window plus the clock-skew margin.
+    assert 60 < limiter._client.ttl(bucket) <= 120
+
+
+def test_window_expiry_resets_count(limiter, clock):
+    for _ in range(6):
+        limiter.allow("login:10.0.0.1", limit=5, window_seconds=60)
+    assert limiter.allow("login:10.0.0.1", limit=5, window_seconds=60)[0] is False
+
+    clock.now += 60
+
+    assert limiter.allow("login:10.0.0.1", limit=5, window_seconds=60) == (True, 0)
+    assert int(limiter._client.get(_bucket_key(limiter, "login:10.0.0.1", clock.now, 60))) == 1
+
+
+def test_script_is_reloaded_after_noscript(monkeypatch, clock):
+    limiter = _build_fake_limiter(monkeypatch, use_lua=True)
+    for _ in range(2):
+        limiter.allow("login:10.0.0.1", limit=3, window_seconds=60)
+
+    limiter._client.script_flush()
+
+    assert limiter.allow("login:10.0.0.1", limit=3, window_seconds=60) == (True, 0)
+    assert limiter.allow("login:10.0.0.1", limit=3, window_seconds=60)[0] is False
+    assert limiter._client.script_exists(limiter._increment.sha) == [True]
+
+
+@pytest.mark.parametrize("use_lua", [True, False], ids=["lua", "multi"])
+def test_fails_open_to_in_memory_limiter(monkeypatch, use_lua):
+    server = fakeredis.FakeServer()
+    server.connected = False
+    monkeypatch.setattr(rate_limiter, "redis_rate_limiter", RedisRateLimiter(fakeredis.FakeRedis(server=server), use_lua=use_lua))
+    monkeypatch.setattr(rate_limiter, "in_memory_rate_limiter", InMemoryRateLimiter())
+    request = Request({"type": "http", "client": ("203.0.113.7", 50000), "headers": []})
+
+    results = [rate_limiter.check_ip_rate_limit(request, "login", limit=3, window_seconds=3600) for _ in range(4)]
+
+    # Redis is down, but the in-process tier still enforces the limit.
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert rate_limiter.in_memory_rate_limiter.key_count() == 1